@@ -0,0 +1,770 @@
+import numpy as np
+import pandas as pd
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Tuple
+
+import data_fetcher
+import draw_columns
+import matrix_engine
+import matrix_state
+import bitset
+import disk_cache
+
+# === PIPELINE PHÂN TÍCH DÀN NUÔI (KHÔNG PHỤ THUỘC STREAMLIT) ===
+# Cùng các bước với render_matrix_view: tải dữ liệu -> chọn cột so sánh ->
+# dòng hiển thị + nguồn kiểm tra -> dàn mỗi ngày -> ma trận -> thống kê.
+# Dùng chung cho app, grid search và các script chạy nền.
+
+WINDOW_ROWS = 20  # Số dàn (dòng) hiển thị
+CHECK_RANGE = 7   # Khung nuôi mặc định (ngày)
+SOURCES = ["Điện Toán", "Thần Tài", "Ghép TT+ĐT"]
+REGIONS = ["Miền Bắc", "Miền Nam", "Miền Trung"]
+WEEKDAY_NAMES = ["Thứ 2", "Thứ 3", "Thứ 4", "Thứ 5", "Thứ 6", "Thứ 7", "Chủ Nhật"]
+ALL = "Tất cả"
+
+
+def prize_options(region: str, mode_3d: bool) -> List[str]:
+    """Prize choices of the "So với"/"Giải" dropdown (G7 MB / G8 MN-MT only have 2 digits)."""
+    if region == "Miền Bắc":
+        return ["XSMB (ĐB)", "Giải Nhất", "Giải 6"] if mode_3d else ["XSMB (ĐB)", "Giải Nhất", "Giải 7", "Giải 6"]
+    return ["ĐB", "G1", "G7"] if mode_3d else ["ĐB", "G1", "G8", "G7"]
+
+
+# --- THAM SỐ ---
+# Tên ngắn cho CLI / API bên cạnh tên hiển thị trên app
+REGION_ALIASES = {"mb": "Miền Bắc", "mn": "Miền Nam", "mt": "Miền Trung"}
+SOURCE_ALIASES = {"dt": "Điện Toán", "tt": "Thần Tài", "ghep": "Ghép TT+ĐT"}
+PRIZE_ALIASES = {
+    "Miền Bắc": {"db": "XSMB (ĐB)", "g1": "Giải Nhất", "g7": "Giải 7", "g6": "Giải 6"},
+    "other": {"db": "ĐB", "g1": "G1", "g8": "G8", "g7": "G7"},
+}
+
+
+def resolve_region(value: str) -> str:
+    region = REGION_ALIASES.get(value.lower(), value)
+    if region not in REGIONS:
+        raise ValueError(f"unknown region {value!r} (use mb/mn/mt or {', '.join(REGIONS)})")
+    return region
+
+
+def resolve_prize(region: str, value: str, mode_3d: bool) -> str:
+    aliases = PRIZE_ALIASES["Miền Bắc" if region == "Miền Bắc" else "other"]
+    prize = aliases.get(value.lower(), value)
+    options = prize_options(region, mode_3d)
+    if prize not in options:
+        raise ValueError(f"prize {value!r} not available for {region} {'3D' if mode_3d else '2D'} "
+                         f"(choose from {', '.join(options)})")
+    return prize
+
+
+def resolve_source(value: str) -> str:
+    source = SOURCE_ALIASES.get(value.lower(), value)
+    if source not in SOURCES:
+        raise ValueError(f"unknown source {value!r} (use dt/tt/ghep or {', '.join(SOURCES)})")
+    return source
+
+
+def normalize_params(region: str = "mb", station: str = ALL, day: str = ALL, prize: str = "db",
+                     source: str = "dt", mode_3d: bool = False) -> Dict:
+    """
+    Validate a configuration given with short or display names.
+
+    Station and day only apply where the app shows them (Miền Nam/Trung;
+    the weekday only with station "Tất cả"), otherwise they become "Tất cả",
+    so equivalent requests normalize to the same values.
+
+    Returns:
+        Dict with region, station, day, src_mode, prize, mode_3d
+
+    Raises:
+        ValueError: unknown or unavailable value
+    """
+    region = resolve_region(region)
+    if region == "Miền Bắc":
+        station = ALL
+    elif station != ALL and station not in data_fetcher.get_all_stations_in_region(region):
+        raise ValueError(f"unknown station {station!r} for {region}")
+    if day != ALL and day not in data_fetcher.WEEKDAY_INDEX:
+        raise ValueError(f"unknown day {day!r} (use {', '.join(data_fetcher.WEEKDAY_INDEX)})")
+    if region == "Miền Bắc" or station != ALL:
+        day = ALL
+    return {
+        'region': region, 'station': station, 'day': day, 'src_mode': resolve_source(source),
+        'prize': resolve_prize(region, prize, mode_3d), 'mode_3d': bool(mode_3d),
+    }
+
+
+def comp_column(region: str, prize: str, mode_3d: bool) -> str:
+    """Name of the result column compared against the dàn."""
+    suffix = "_3so" if mode_3d else "_2so"
+    if region == "Miền Bắc":
+        if "ĐB" in prize:
+            return f"xsmb{suffix}"
+        if "Nhất" in prize:
+            return f"g1{suffix}"
+        if "Giải 7" in prize:
+            return f"g7{suffix}"
+        return f"g6{suffix}"
+    if prize == "ĐB":
+        return f"db{suffix}"
+    if prize == "G1":
+        return f"g1{suffix}"
+    if prize == "G8":
+        return f"g8{suffix}"
+    return f"g7{suffix}"
+
+
+# --- TẢI DỮ LIỆU ---
+def load_master_data(num_days: int) -> draw_columns.DrawColumns:
+    """Master columns: Điện Toán + Thần Tài + XSMB joined by date, newest first."""
+    # Tải song song tất cả các nguồn trên pool dùng chung của data_fetcher
+    executor = data_fetcher.get_fetch_executor()
+    f_dt = executor.submit(data_fetcher.fetch_dien_toan, num_days)
+    f_tt = executor.submit(data_fetcher.fetch_than_tai, num_days)
+    f_mb = executor.submit(data_fetcher.fetch_xsmb, num_days)
+
+    return draw_columns.from_master(f_dt.result(), f_tt.result(), f_mb.result())
+
+
+def _where(present: np.ndarray, values: List) -> List:
+    return [v if has else np.nan for v, has in zip(values, present.tolist())]
+
+
+def build_master_table(columns: draw_columns.DrawColumns) -> pd.DataFrame:
+    """
+    Master table of load_master_data columns, the rows the dàn pipeline reads.
+
+    Args:
+        columns: load_master_data output
+
+    Returns:
+        One row per Điện Toán draw, newest first: date, dt_numbers, tt_number,
+        xsmb/g1 full/2so/3so and g7/g6 list/2so/3so, NaN where that day has
+        no Thần Tài / XSMB draw (empty without data)
+    """
+    if not len(columns):
+        return pd.DataFrame()
+    tt = [cells[0] if cells else "" for cells in columns.prizes["tt"].texts()]
+    table = {
+        "date": columns.dates(),
+        "dt_numbers": columns.prizes["dt"].texts(),
+        "tt_number": _where(columns.sources["tt"], tt),
+    }
+    mb = columns.sources["xsmb"]
+    for name, prize in (("xsmb", "db"), ("g1", "g1")):
+        full = [cells[0] if cells else "" for cells in columns.prizes[prize].texts()]
+        table[f"{name}_full"] = _where(mb, full)
+        table[f"{name}_2so"] = _where(mb, [num[-2:] for num in full])
+        table[f"{name}_3so"] = _where(mb, [num[-3:] if len(num) >= 3 else "" for num in full])
+    for prize in ("g7", "g6"):
+        lists = columns.prizes[prize].texts()
+        table[f"{prize}_list"] = _where(mb, lists)
+        table[f"{prize}_2so"] = _where(mb, [[num[-2:] for num in nums] for nums in lists])
+        table[f"{prize}_3so"] = _where(mb, [[num[-3:] for num in nums if len(num) >= 3] for nums in lists])
+    return pd.DataFrame(table)
+
+
+def load_region_data(region: str, num_days: int) -> draw_columns.DrawColumns:
+    """Draws of every station in a Miền Nam/Trung region (empty for Miền Bắc)."""
+    if region == "Miền Bắc":
+        return draw_columns.from_station_records({})
+    stations = data_fetcher.get_all_stations_in_region(region)
+    # fetch_stations trả theo thứ tự tải xong: sắp lại theo danh sách đài
+    fetched = data_fetcher.fetch_stations(stations, num_days)
+    return draw_columns.from_station_records({s: fetched.get(s, []) for s in stations})
+
+
+# --- CACHE DỮ LIỆU TRÊN ĐĨA (dùng chung giữa các tiến trình) ---
+# Namespace theo nguồn: "master" (Điện Toán + Thần Tài + XSMB),
+# "region/<miền>" và "station/<đài>", để tải lại từng nguồn riêng.
+# Mục cache hết hạn ở giờ có kết quả kế tiếp theo lịch quay (data_fetcher.data_expiry),
+# không theo TTL cố định: ngày không quay thì không tải lại. Quá hạn chưa lâu thì
+# vẫn trả bản cũ và làm mới nền (prefetch.py thường đã làm mới trước đó).
+# Mỗi nguồn một mục giữ lịch sử sâu nhất đã tải; số ngày nhỏ hơn thì cắt từ đó.
+STALE_GRACE = 1800
+# Bảng tổng / miền lưu dạng DrawColumns (trước đây DataFrame / dict theo đài)
+COLUMNS_VERSION = 1
+
+
+def _newest_date(draws: List[Dict]) -> Optional[str]:
+    return draws[0].get('date') if draws else None
+
+
+def _master_expiry(created_at: float, columns: draw_columns.DrawColumns, num_days: int) -> float:
+    return data_fetcher.data_expiry(created_at, {"": columns.latest_dates().get(draw_columns.MASTER_STATION)})
+
+
+def _region_expiry(created_at: float, columns: draw_columns.DrawColumns, region: str, num_days: int) -> float:
+    latest = columns.latest_dates()
+    stations = data_fetcher.get_all_stations_in_region(region)
+    return data_fetcher.data_expiry(created_at, {s: latest.get(s) for s in stations})
+
+
+def _station_expiry(created_at: float, draws: List[Dict], station: str, num_days: int) -> float:
+    return data_fetcher.data_expiry(created_at, {station: _newest_date(draws)})
+
+
+@disk_cache.cached("master", expires=_master_expiry, stale_while_revalidate=STALE_GRACE, depth="num_days",
+                   take=draw_columns.DrawColumns.newest, version=COLUMNS_VERSION)
+def cached_master_data(num_days: int) -> draw_columns.DrawColumns:
+    """load_master_data through the shared disk cache."""
+    return load_master_data(num_days)
+
+
+@disk_cache.cached(lambda region, num_days: f"region/{region}", expires=_region_expiry,
+                   stale_while_revalidate=STALE_GRACE, depth="num_days",
+                   take=draw_columns.DrawColumns.newest, version=COLUMNS_VERSION)
+def cached_region_data(region: str, num_days: int) -> draw_columns.DrawColumns:
+    """load_region_data through the shared disk cache."""
+    return load_region_data(region, num_days)
+
+
+@disk_cache.cached(lambda station, num_days: f"station/{station}", expires=_station_expiry,
+                   stale_while_revalidate=STALE_GRACE, depth="num_days")
+def cached_station_data(station: str, num_days: int) -> List[Dict]:
+    """data_fetcher.fetch_station_data through the shared disk cache."""
+    return data_fetcher.fetch_station_data(station, num_days)
+
+
+def invalidate_data(source: Optional[str] = None) -> int:
+    """
+    Drop cached data of one source so the next load refetches it.
+
+    The draw store is told to download the full history again too, so
+    results first saved partial or later corrected are replaced.
+
+    Args:
+        source: "master", a region name (its grouped table and every
+            station of it), a station name, or None for everything
+
+    Returns:
+        Number of cache entries removed
+    """
+    cache = disk_cache.get_cache()
+    clear_grids()
+    try:
+        return _invalidate(cache, source)
+    finally:
+        # Báo cho mọi tiến trình dùng chung cache: bỏ lưới / trạng thái dựng từ dữ liệu cũ
+        cache.set(GENERATION_NAMESPACE, "generation", source)
+
+
+def _invalidate(cache: disk_cache.DiskCache, source: Optional[str]) -> int:
+    if source is None:
+        data_fetcher.force_refetch()
+        return cache.invalidate()
+    # Trạng thái ma trận dựng từ dữ liệu cũ: bỏ hết, lần sau dựng lại
+    removed = cache.invalidate(STATE_NAMESPACE)
+    if source == "master":
+        data_fetcher.force_refetch("")
+        return removed + cache.invalidate("master")
+    if source in REGIONS:
+        removed += cache.invalidate(f"region/{source}")
+        for station in data_fetcher.get_all_stations_in_region(source):
+            data_fetcher.force_refetch(station)
+            removed += cache.invalidate(f"station/{station}")
+        return removed
+    data_fetcher.force_refetch(source)
+    return removed + cache.invalidate(f"station/{source}")
+
+
+# Thế hệ dữ liệu dùng chung giữa các tiến trình: invalidate_data (ở bất kỳ tiến
+# trình nào) ghi lại mục này trong cache đĩa. Lưới đài, MatrixState và kết quả
+# API khóa theo nó, nên sửa một kỳ cũ cũng làm các tiến trình khác dựng lại.
+GENERATION_NAMESPACE = "data_generation"
+
+
+def data_generation() -> float:
+    """Time of the last invalidate_data by any process sharing the disk cache (0 if none)."""
+    entry = disk_cache.get_cache().get_entry(GENERATION_NAMESPACE, "generation")
+    return entry[0] if entry is not None else 0.0
+
+
+# --- DÒNG HIỂN THỊ + NGUỒN KIỂM TRA ---
+# Bảng tổng và lưới đài × ngày dựng một lần cho mỗi bộ dữ liệu: dữ liệu đọc lại
+# từ cache là object mới nên nhận diện theo nội dung (DrawColumns.fingerprint),
+# cùng data_generation để mọi tiến trình bỏ bản dựng từ dữ liệu đã invalidate.
+_BUILD_CACHE_SIZE = 8
+_build_cache: "OrderedDict[Tuple, object]" = OrderedDict()
+_build_lock = threading.Lock()
+
+
+def clear_grids() -> None:
+    with _build_lock:
+        _build_cache.clear()
+
+
+def _built(kind: str, columns: draw_columns.DrawColumns, build):
+    key = (kind, data_generation(), columns.fingerprint)
+    with _build_lock:
+        value = _build_cache.get(key)
+        if value is not None:
+            _build_cache.move_to_end(key)
+            return value
+    value = build(columns)
+    with _build_lock:
+        _build_cache[key] = value
+        while len(_build_cache) > _BUILD_CACHE_SIZE:
+            _build_cache.popitem(last=False)
+    return value
+
+
+def master_table(columns: draw_columns.DrawColumns) -> pd.DataFrame:
+    """build_master_table of the master columns, reused while the data is unchanged."""
+    return _built("master", columns, build_master_table)
+
+
+def station_grid(columns: draw_columns.DrawColumns) -> draw_columns.StationGrid:
+    """The StationGrid of a region's columns, reused while the data is unchanged."""
+    return _built("grid", columns, draw_columns.StationGrid)
+
+
+def region_check_source(region_data: draw_columns.DrawColumns, col_comp: str) -> Optional[pd.DataFrame]:
+    """
+    Group every station of a region by date ("Tất cả" mode).
+
+    Returns:
+        DataFrame with date, results (list of {station, val}) and day ordinal,
+        newest first; None if no station has a value for col_comp
+    """
+    grid = station_grid(region_data)
+    if not len(grid):
+        return None
+    # Chỉ chọn cột của giải đang so, không duyệt lại từng bản ghi
+    rows = np.flatnonzero((grid.column(col_comp) != -1).any(axis=1))
+    if not len(rows):
+        return None
+    return pd.DataFrame({
+        'date': [grid.dates[r] for r in rows],
+        'results': grid.results(col_comp, rows),
+        'day': grid.days[rows],
+    })
+
+
+def filter_weekday(df_check_source: pd.DataFrame, day: str) -> pd.DataFrame:
+    """Rows drawn on `day` ("Thứ 2".."Chủ Nhật"), or all rows for "Tất cả"."""
+    if day == ALL:
+        return df_check_source.copy()
+    target_weekday = data_fetcher.WEEKDAY_INDEX.get(day)
+    days_arr = df_check_source['day'].to_numpy()
+    is_target_day = (days_arr >= 0) & (draw_columns.weekday(days_arr) == target_weekday)
+    return df_check_source[is_target_day].copy()
+
+
+def station_check_source(station: str, columns: draw_columns.DrawColumns, col_comp: str) -> pd.DataFrame:
+    """Rows of a single station, shaped like region_check_source (without 'day')."""
+    rows = columns.station_rows(station)
+    vals = [""] * len(rows)
+    parsed = draw_columns.result_key(col_comp)
+    prize = columns.prizes.get(parsed[0]) if parsed else None
+    if prize is not None:
+        codes, widths = prize.last(parsed[1])
+        vals = [f"{code:0{width}d}" if code >= 0 else ""
+                for code, width in zip(codes[rows].tolist(), widths[rows].tolist())]
+    return pd.DataFrame({
+        'date': [draw_columns.format_day(d) for d in columns.days[rows]],
+        'results': [[{'station': station, 'val': val}] for val in vals],
+    })
+
+
+@dataclass
+class MatrixView:
+    """
+    Everything needed to build dàn rows and their hit matrix for one configuration.
+
+    Attributes:
+        region: "Miền Bắc", "Miền Nam" or "Miền Trung"
+        src_mode: One of SOURCES
+        mode_3d: Tam hợp (3 digits) instead of nhị hợp
+        col_comp: Result column (see comp_column)
+        date_mode: Check by date + k days ("Tất cả" in Miền Nam/Trung) instead of row i - k
+        df_region: Rows shown as dàn, newest first
+        df_check_source: Rows checked against (df_region itself outside date mode)
+        df_full: Master table (dàn source numbers)
+        max_cols: Number of N columns shown
+    """
+    region: str
+    src_mode: str
+    mode_3d: bool
+    col_comp: str
+    date_mode: bool
+    df_region: pd.DataFrame
+    df_check_source: pd.DataFrame
+    df_full: pd.DataFrame
+    max_cols: int = 20
+
+    @property
+    def num_digits(self) -> int:
+        return bitset.digits_for(self.mode_3d)
+
+    @property
+    def max_k(self) -> int:
+        return max(self.max_cols, WINDOW_ROWS)
+
+
+def make_view(region: str, src_mode: str, mode_3d: bool, prize: str, df_full: pd.DataFrame,
+              region_data: Optional[draw_columns.DrawColumns] = None,
+              station: str = ALL, day: str = ALL, max_cols: int = 20) -> Optional[MatrixView]:
+    """
+    Build the MatrixView of one configuration from already loaded data.
+
+    Args:
+        df_full: Master table (master_table of load_master_data)
+        region_data: load_region_data output (ignored for Miền Bắc); a single
+            station only needs its own draws
+        station: Station name, or "Tất cả" for the whole region
+        day: Weekday filter of the "Tất cả" rows
+
+    Returns:
+        MatrixView, or None when there is nothing to compare against
+    """
+    col_comp = comp_column(region, prize, mode_3d)
+    if region == "Miền Bắc":
+        df_region = df_check_source = df_full
+    elif region_data is None:
+        return None
+    elif station == ALL:
+        df_check_source = region_check_source(region_data, col_comp)
+        if df_check_source is None:
+            return None
+        df_region = filter_weekday(df_check_source, day)
+    else:
+        df_region = df_check_source = station_check_source(station, region_data, col_comp)
+        if df_region.empty:
+            return None
+
+    return MatrixView(
+        region=region, src_mode=src_mode, mode_3d=mode_3d, col_comp=col_comp,
+        date_mode=station == ALL and region != "Miền Bắc",
+        df_region=df_region, df_check_source=df_check_source, df_full=df_full, max_cols=max_cols,
+    )
+
+
+# --- DÀN + MA TRẬN ---
+def row_values(view: MatrixView, row) -> List[str]:
+    """
+    Result numbers of one check row.
+
+    Miền Bắc: row[col_comp] (G7/G6 là list, ĐB/G1 là 1 giá trị)
+    Miền Nam/Trung: row['results'] (list of dicts {station, val})
+    """
+    if view.region == "Miền Bắc":
+        val = row.get(view.col_comp, "")
+        if view.col_comp in ["g7_2so", "g6_2so", "g7_3so", "g6_3so"] and isinstance(val, list):
+            return [g_num for g_num in val if g_num and g_num != "nan"]
+        val_str = str(val)
+        return [val_str] if val_str and val_str != "nan" else []
+    res_list = row.get('results', [])
+    return [res['val'] for res in res_list] if isinstance(res_list, list) else []
+
+
+def source_string(row_src, src_mode: str) -> str:
+    """Digits the dàn is built from (Thần Tài, Điện Toán or both)."""
+    if src_mode == "Thần Tài":
+        return str(row_src.get('tt_number', ''))
+    if src_mode == "Điện Toán":
+        val = row_src.get('dt_numbers', [])
+        if isinstance(val, list):
+            return "".join(val)
+        return str(val) if pd.notna(val) else ""
+    tt_part = str(row_src.get('tt_number', ''))
+    dt_raw = row_src.get('dt_numbers', [])
+    if isinstance(dt_raw, list):
+        dt_part = "".join(dt_raw)
+    else:
+        dt_part = str(dt_raw) if pd.notna(dt_raw) else ""
+    return (tt_part if tt_part and tt_part != "nan" else "") + (dt_part if dt_part and dt_part != "nan" else "")
+
+
+def build_days_data(view: MatrixView, start: int, end: int) -> List[Dict]:
+    """
+    One dàn per row i in [start, end) of df_region that has a valid source.
+
+    Returns:
+        List of dicts with date, day, source, src_mask, combos, index
+    """
+    df_region = view.df_region
+    # Miền Nam/Trung: tìm dòng nguồn cùng ngày trong df_full
+    df_full_lookup = None
+    if view.region != "Miền Bắc":
+        df_full_lookup = view.df_full.set_index('date') if not view.df_full.empty else pd.DataFrame()
+
+    days_data = []
+    for i in range(start, end):
+        row = df_region.iloc[i]
+        date_val = row['date']
+
+        row_src = None
+        if df_full_lookup is None:
+            row_src = row
+        elif date_val in df_full_lookup.index:
+            row_src = df_full_lookup.loc[date_val]
+            # Xử lý trường hợp trùng ngày (nếu có)
+            if isinstance(row_src, pd.DataFrame):
+                row_src = row_src.iloc[0]
+
+        if row_src is None:
+            continue
+
+        src_str = source_string(row_src, view.src_mode)
+        if not src_str or src_str == "nan":
+            continue
+
+        # Dàn tra bảng theo bộ chữ số nguồn (Nhị hợp: 2 digits, Tam hợp: 3 digits)
+        src_mask = bitset.digit_mask(src_str)
+        days_data.append({
+            'date': date_val,
+            'day': draw_columns.parse_day(date_val),
+            'source': src_str,
+            'src_mask': src_mask,
+            'combos': bitset.combo_strings(src_mask, view.num_digits),
+            'index': i
+        })
+    return days_data
+
+
+def check_positions(view: MatrixView, days_data: List[Dict]) -> np.ndarray:
+    """(R, max_k) positions of the check row of each cell, -1 when there is none."""
+    max_k = view.max_k
+    if view.date_mode:
+        # Continuous Check: Date + k days
+        check_day_index = draw_columns.DayIndex.build(view.df_check_source['day'].to_numpy())
+        k_offsets = np.arange(1, max_k + 1)
+        check_pos = np.full((len(days_data), max_k), -1, dtype=np.int64)
+        for row_idx, day_data in enumerate(days_data):
+            if day_data['day'] >= 0:
+                check_pos[row_idx] = check_day_index.lookup(day_data['day'] + k_offsets)
+        return check_pos
+    # Index-based check (Next Draw): dàn của dòng i so với dòng i - k
+    return matrix_engine.index_positions([d['index'] for d in days_data], max_k, len(view.df_region))
+
+
+def build_matrix(view: MatrixView, days_data: List[Dict],
+                 backtest_offset: Optional[int] = 0) -> matrix_engine.MatrixResult:
+    """
+    Hit matrix of `days_data`.
+
+    Args:
+        backtest_offset: Rows of the window start here; checks on rows newer
+            than it do not count outside date mode. None counts every cell
+            (full-history matrix for sweep_offsets).
+    """
+    check_pos = check_positions(view, days_data)
+    if view.date_mode:
+        check_values = [row_values(view, row) for _, row in view.df_check_source.iterrows()]
+    else:
+        last_idx = max(d['index'] for d in days_data)
+        check_values = [row_values(view, view.df_region.iloc[j]) for j in range(last_idx)]
+
+    if backtest_offset is None:
+        counted = np.ones(check_pos.shape, dtype=bool)
+    else:
+        counted = matrix_engine.triangle_mask(len(days_data), view.max_k)
+        if not view.date_mode:
+            counted = counted & (check_pos >= backtest_offset)
+
+    combo_masks = bitset.combo_table(view.num_digits)[[d['src_mask'] for d in days_data]]
+    result_masks, result_counts = bitset.results_to_masks(check_values, view.num_digits)
+    return matrix_engine.compute_matrix(combo_masks, check_pos, result_masks, result_counts, counted)
+
+
+def sweep(view: MatrixView) -> Optional[matrix_engine.SweepResult]:
+    """Backtest stats for every offset of the view, None without any dàn."""
+    full_days_data = build_days_data(view, 0, len(view.df_region))
+    if not full_days_data:
+        return None
+    full_matrix = build_matrix(view, full_days_data, backtest_offset=None)
+    return matrix_engine.sweep_offsets(full_matrix, [d['index'] for d in full_days_data],
+                                       window=WINDOW_ROWS, index_cutoff=not view.date_mode)
+
+
+def update_state(view: MatrixView, state: Optional[matrix_state.MatrixState] = None) -> matrix_state.MatrixState:
+    """
+    Bring a MatrixState up to date with the view, feeding only the new draws.
+
+    The newest stored draw is always re-added, so a draw first seen with
+    partial results (or no source yet) is refreshed on the next call. A
+    missing state, or one that no longer lines up with the view (other
+    settings, more history loaded, a gap), is rebuilt from scratch.
+
+    Returns:
+        The updated state (a new object when rebuilt)
+    """
+    df_check = view.df_check_source
+    if 'day' in df_check.columns:
+        row_days = df_check['day'].to_numpy().astype(np.int64)
+    else:
+        row_days = draw_columns.parse_days(df_check['date'])
+    # Theo ngày: dòng không có ngày hợp lệ (xếp cuối) không vào state
+    fed_days = row_days[row_days >= 0] if view.date_mode else row_days
+
+    if state is not None and state.matches(view.num_digits, view.max_k, view.date_mode) and len(state):
+        # Lịch sử đã tải trượt qua ngày mới: bỏ các kỳ đã ra khỏi nguồn kiểm tra
+        # và các dàn không còn dòng nguồn trong df_full
+        dan_day = None
+        if view.region != "Miền Bắc" and not view.df_full.empty:
+            dan_day = draw_columns.parse_day(view.df_full['date'].iloc[-1])
+        state.trim(int(fed_days.min()) if len(fed_days) else -1, dan_day)
+    if state is not None and state.matches(view.num_digits, view.max_k, view.date_mode) and len(state):
+        state.pop_draw()
+        last_day = state.last_day if len(state) else -1
+        num_new = int(np.argmin(fed_days > last_day)) if (fed_days <= last_day).any() else len(fed_days)
+        # Các kỳ đã có phải trùng từng ngày (và số kết quả, khi một đài rời khỏi
+        # cửa sổ tải của nó) với nguồn kiểm tra hiện tại; lệch thì dựng lại
+        kept = len(state)
+        lined_up = len(fed_days) - num_new == kept and np.array_equal(
+            fed_days[num_new:][::-1], state.check_days[:kept])
+        if lined_up and view.date_mode:
+            sizes = df_check['results'].iloc[num_new:num_new + kept].map(len).to_numpy()
+            lined_up = np.array_equal(sizes[::-1], state.check_sizes[:kept])
+        if not lined_up:
+            state = None
+    else:
+        state = None
+    if state is None:
+        state = matrix_state.MatrixState(view.num_digits, view.max_k, view.date_mode)
+        num_new = len(fed_days)
+
+    # Dàn của các dòng mới trong df_region (cũng xếp mới -> cũ)
+    if view.date_mode:
+        region_days = view.df_region['day'].to_numpy()
+        num_region_new = int(np.searchsorted(-region_days, -(state.last_day if len(state) else -1), side="left"))
+        dan_by_day = {d['day']: d for d in build_days_data(view, 0, num_region_new)}
+        region_new = set(region_days[:num_region_new].tolist())
+    else:
+        dan_by_index = {d['index']: d for d in build_days_data(view, 0, num_new)}
+
+    for i in range(num_new - 1, -1, -1):
+        row = df_check.iloc[i]
+        day = int(row_days[i])
+        if view.date_mode:
+            state.add_draw(day, row_values(view, row), in_region=day in region_new, dan=dan_by_day.get(day))
+        else:
+            state.add_draw(day, row_values(view, row), dan=dan_by_index.get(i))
+    return state
+
+
+# Trạng thái giữ qua các lần khởi động lại trong cache đĩa (xóa cùng invalidate_data;
+# bên gọi đưa data_generation() vào khóa)
+STATE_NAMESPACE = "matrix_state"
+
+
+def load_state(key: Tuple) -> Optional[matrix_state.MatrixState]:
+    """MatrixState saved under `key` by save_state, None if there is none."""
+    state = disk_cache.get_cache().get(STATE_NAMESPACE, key)
+    return state if isinstance(state, matrix_state.MatrixState) else None
+
+
+def save_state(key: Tuple, state: matrix_state.MatrixState) -> bool:
+    """Store a MatrixState in the shared disk cache; False if it could not be written."""
+    return disk_cache.get_cache().set(STATE_NAMESPACE, key, state)
+
+
+# --- BẢNG KẾT QUẢ ---
+def pending_table(days_data: List[Dict], window: matrix_engine.WindowCounts, check_range: int) -> List[Dict]:
+    """
+    Rows of "Tổng hợp Dàn Chưa Ra": dàn not hit within the feeding window.
+
+    The raw combos are kept under 'combos'.
+    """
+    checks, _ = window.at(check_range)
+    status = window.status(check_range)
+    pending_by_date = []
+    for row_idx in np.flatnonzero(status != matrix_engine.WINDOW_HIT):
+        day_data = days_data[row_idx]
+        combos = day_data['combos']
+        date = day_data['date']
+        weekday = WEEKDAY_NAMES[draw_columns.weekday(day_data['day'])] if day_data['day'] >= 0 else ""
+        if status[row_idx] == matrix_engine.WINDOW_EXPIRED:
+            state = "❌ Trượt khung"
+        else:
+            state = f"⏳ Đang nuôi ({checks[row_idx]}/{check_range})"
+        pending_by_date.append({
+            'Ngày': f"{weekday} {date}" if weekday else date,
+            'Dàn số': ', '.join(sorted(combos)),
+            'Số lượng': len(combos),
+            'Trạng thái': state,
+            'combos': combos  # Giữ lại để phân tích tần suất
+        })
+    return pending_by_date
+
+
+def cycle_table(days_data: List[Dict], matrix: matrix_engine.MatrixResult) -> List[Dict]:
+    """
+    Rows of "Phân tích Chu kỳ & Nhận định", sorted by priority.
+
+    Hidden sort fields start with '_'.
+    """
+    cycle_analysis = []
+    for row_idx, day_data in enumerate(days_data):
+        # Vị trí các lần trúng / không trúng (1, 2, 3...)
+        hits, misses = matrix_engine.cycle_hits(matrix, row_idx)
+        cycle = matrix_engine.analyze_cycle(hits, misses)
+        cycle_analysis.append({
+            'Ngày': day_data['date'],
+            'Dàn': ', '.join(sorted(day_data['combos'])),
+            'Chu kỳ TB': cycle['avg_cycle_display'],
+            'Lần cuối ra': cycle['last_hit_display'],
+            'Đã kiểm tra': cycle['total_checks'],
+            'Trúng/Trượt': f"{cycle['hit_count']}/{cycle['miss_count']}",
+            'Nhận định': cycle['status'],
+            # Thêm các trường ẩn để sắp xếp
+            '_sort_priority': cycle['priority'],
+            '_overdue_days': cycle['overdue'],
+            '_total_checks': cycle['total_checks']
+        })
+    # Ưu tiên chưa ra (nhiều ngày nhất), sau đó quá chu kỳ nhiều nhất, sau đó trong chu kỳ
+    cycle_analysis.sort(key=lambda x: (x['_sort_priority'], -x['_overdue_days'], -x['_total_checks']))
+    return cycle_analysis
+
+
+def is_priority(status: str) -> bool:
+    """Dàn cần ưu tiên theo dõi (quá hạn hoặc chưa ra lần nào), theo nhận định chu kỳ."""
+    return "Ưu tiên cao" in status or "Chưa ra lần nào" in status
+
+
+def matrix_table(days_data: List[Dict], matrix: matrix_engine.MatrixResult, max_cols: int) -> pd.DataFrame:
+    """
+    "Bảng Theo Dõi" as data: Ngày, Mốc, then N1..N(max_cols).
+
+    Cells are 1 (trúng), 0 (có dữ liệu, không trúng) or NA (không có dữ liệu
+    hoặc ngoài tam giác).
+    """
+    num_rows = len(days_data)
+    num_cols = min(max_cols, matrix.shape[1])
+    shown = matrix_engine.triangle_mask(num_rows, num_cols) & matrix.has_data[:, :num_cols]
+    df = pd.DataFrame({'Ngày': [d['date'] for d in days_data], 'Mốc': [d['source'] for d in days_data]})
+    for k in range(num_cols):
+        column = pd.array(matrix.hit[:, k].astype(np.int8), dtype="Int8")
+        column[~shown[:, k]] = pd.NA
+        df[f"N{k + 1}"] = column
+    return df
+
+
+def result_tables(view: MatrixView, backtest_offset: int = 0,
+                  check_range: int = CHECK_RANGE) -> Optional[Dict[str, pd.DataFrame]]:
+    """
+    Every table of the matrix view for one configuration.
+
+    Returns:
+        Dict with 'matrix' (matrix_table), 'stats' (one row of
+        matrix_engine.summarize_window), 'pending' and 'cycle' (without the
+        helper fields); None when there is no dàn in the window
+    """
+    end = min(backtest_offset + WINDOW_ROWS, len(view.df_region))
+    days_data = build_days_data(view, backtest_offset, end)
+    if not days_data:
+        return None
+    matrix = build_matrix(view, days_data, backtest_offset)
+    window = matrix_engine.window_counts(matrix)
+    pending = pending_table(days_data, window, check_range)
+    cycle = cycle_table(days_data, matrix)
+    return {
+        'matrix': matrix_table(days_data, matrix, view.max_cols),
+        'stats': pd.DataFrame([matrix_engine.summarize_window(window, check_range)]),
+        'pending': pd.DataFrame([{k: v for k, v in item.items() if k != 'combos'} for item in pending],
+                                columns=['Ngày', 'Dàn số', 'Số lượng', 'Trạng thái']),
+        'cycle': pd.DataFrame([{k: v for k, v in item.items() if not k.startswith('_')} for item in cycle]),
+    }
@@ -0,0 +1,331 @@
+"""
+Local JSON API in front of the matrix analysis (Dàn Nuôi).
+
+Usage:
+    python api_server.py --port 8765
+
+Endpoints (GET, tham số qua query string):
+    /health
+    /stations?region=mn
+    /draws?station=TP.HCM&days=60
+    /master?days=60
+    /matrix?region=mn&station=Tất cả&day=Tất cả&prize=db&source=dt&3d=0&offset=0&days=60&check_range=7&max_cols=20
+
+Kết quả /matrix được cache theo bộ tham số đã chuẩn hóa + phiên bản dữ liệu
+(ngày mới nhất), nên mọi dashboard/script gọi cùng cấu hình trong một ngày
+quay chỉ tính một lần.
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+import analysis
+import data_fetcher
+import draw_columns
+
+MEMORY_TTL = 60          # giây giữ dữ liệu trong bộ nhớ trước khi đọc lại cache đĩa
+RESULT_CACHE_SIZE = 256  # số kết quả /matrix giữ lại
+DEFAULT_DAYS = 60
+
+
+# === NGUỒN DỮ LIỆU ===
+class LiveSource:
+    """
+    Data from the shared disk cache (analysis.cached_*), kept in memory for `ttl` seconds.
+
+    Every server process and the Streamlit app read the same warm dataset.
+    """
+
+    def __init__(self, ttl: float = MEMORY_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._cache: Dict[Tuple, Tuple[float, object]] = {}
+        self._key_locks: Dict[Tuple, threading.Lock] = {}
+
+    def _get(self, key: Tuple, load: Callable[[], object]):
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # Một luồng tải, các luồng cùng khóa chờ và dùng lại kết quả
+        try:
+            with key_lock:
+                with self._lock:
+                    hit = self._cache.get(key)
+                if hit is not None and time.monotonic() - hit[0] < self.ttl:
+                    return hit[1]
+                value = load()
+                with self._lock:
+                    self._cache[key] = (time.monotonic(), value)
+                return value
+        finally:
+            # Khóa theo key chỉ sống trong lúc tải (như ResultCache.get_or_compute)
+            with self._lock:
+                if self._key_locks.get(key) is key_lock:
+                    del self._key_locks[key]
+
+    def master(self, days: int) -> draw_columns.DrawColumns:
+        return self._get(('master', days), lambda: analysis.cached_master_data(days))
+
+    def region(self, region: str, days: int) -> draw_columns.DrawColumns:
+        return self._get(('region', region, days), lambda: analysis.cached_region_data(region, days))
+
+    def station(self, station: str, days: int) -> List[Dict]:
+        return self._get(('station', station, days), lambda: analysis.cached_station_data(station, days))
+
+
+class StaticSource:
+    """
+    Fixed, already loaded data (tests, offline use, a local stub).
+
+    Args:
+        master: Master columns (analysis.load_master_data shape)
+        region_data: Region -> station -> draws (fetch_station_data output)
+    """
+
+    def __init__(self, master: draw_columns.DrawColumns,
+                 region_data: Optional[Dict[str, Dict[str, List[Dict]]]] = None):
+        self.master_columns = master
+        self.region_data = region_data or {}
+
+    def master(self, days: int) -> draw_columns.DrawColumns:
+        return self.master_columns.newest(days)
+
+    def region(self, region: str, days: int) -> draw_columns.DrawColumns:
+        return draw_columns.from_station_records(
+            {s: draws[:days] for s, draws in self.region_data.get(region, {}).items()})
+
+    def station(self, station: str, days: int) -> List[Dict]:
+        for stations in self.region_data.values():
+            if station in stations:
+                return stations[station][:days]
+        return []
+
+
+def data_version(master: draw_columns.DrawColumns, region_data: draw_columns.DrawColumns) -> Tuple:
+    """
+    Newest draw date of the master table and of each station (changes once per
+    draw day), plus the shared data generation (changes on any process's reload).
+    """
+    newest = master.latest_dates().get(draw_columns.MASTER_STATION) or ""
+    stations = tuple(sorted((s, d) for s, d in region_data.latest_dates().items() if d))
+    return newest, stations, analysis.data_generation()
+
+
+# === CACHE KẾT QUẢ ===
+class ResultCache:
+    """
+    Thread-safe LRU cache with one computation per key.
+
+    Concurrent requests for a key that is being computed wait for that
+    computation instead of starting their own.
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, object]" = OrderedDict()
+        self._key_locks: Dict[Tuple, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_compute(self, key: Tuple, compute: Callable[[], object]):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key]
+                self.misses += 1
+            try:
+                value = compute()
+            finally:
+                with self._lock:
+                    self._key_locks.pop(key, None)
+            with self._lock:
+                self._entries[key] = value
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# === XỬ LÝ YÊU CẦU ===
+def _records(df: pd.DataFrame) -> List[Dict]:
+    """DataFrame -> JSON-ready records (NA -> null, numpy -> Python)."""
+    return json.loads(df.to_json(orient="records", force_ascii=False))
+
+
+def _int_param(query: Dict[str, str], name: str, default: int, minimum: int = 0) -> int:
+    value = query.get(name)
+    if value in (None, ""):
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer, got {value!r}")
+    if number < minimum:
+        raise ValueError(f"{name} must be >= {minimum}")
+    return number
+
+
+def _bool_param(query: Dict[str, str], name: str) -> bool:
+    return query.get(name, "").lower() in ("1", "true", "yes", "on")
+
+
+class MatrixService:
+    """
+    The API endpoints as plain methods: query dict in, JSON-ready dict out.
+
+    Args:
+        source: Data source (LiveSource by default, StaticSource for tests)
+        cache: Result cache shared by every request
+    """
+
+    def __init__(self, source=None, cache: Optional[ResultCache] = None):
+        self.source = source if source is not None else LiveSource()
+        self.cache = cache if cache is not None else ResultCache()
+
+    def health(self, query: Dict[str, str]) -> Dict:
+        return {'status': "ok", 'cached_results': len(self.cache),
+                'cache_hits': self.cache.hits, 'cache_misses': self.cache.misses}
+
+    def stations(self, query: Dict[str, str]) -> Dict:
+        region = analysis.resolve_region(query.get('region', "mn"))
+        return {'region': region, 'stations': data_fetcher.get_all_stations_in_region(region)}
+
+    def draws(self, query: Dict[str, str]) -> Dict:
+        station = query.get('station')
+        if not station:
+            raise ValueError("station is required")
+        days = _int_param(query, 'days', DEFAULT_DAYS, 1)
+        return {'station': station, 'draws': self.source.station(station, days)}
+
+    def master(self, query: Dict[str, str]) -> Dict:
+        days = _int_param(query, 'days', DEFAULT_DAYS, 1)
+        return {'days': days, 'rows': _records(analysis.master_table(self.source.master(days)))}
+
+    def matrix(self, query: Dict[str, str]) -> Dict:
+        params = analysis.normalize_params(
+            query.get('region', "mb"), query.get('station', analysis.ALL), query.get('day', analysis.ALL),
+            query.get('prize', "db"), query.get('source', "dt"), _bool_param(query, '3d'))
+        options = {
+            'offset': _int_param(query, 'offset', 0),
+            'days': _int_param(query, 'days', DEFAULT_DAYS, 1),
+            'check_range': _int_param(query, 'check_range', analysis.CHECK_RANGE, 1),
+            'max_cols': _int_param(query, 'max_cols', 20, 1),
+        }
+        master = self.source.master(options['days'])
+        if not len(master):
+            raise LookupError("no master data")
+        region_data = self.source.region(params['region'], options['days'])
+
+        key = tuple(params.values()) + tuple(options.values()) + data_version(master, region_data)
+        return self.cache.get_or_compute(key, lambda: self._compute(params, options, master, region_data))
+
+    def _compute(self, params: Dict, options: Dict, master: draw_columns.DrawColumns,
+                 region_data: draw_columns.DrawColumns) -> Dict:
+        view = analysis.make_view(params['region'], params['src_mode'], params['mode_3d'], params['prize'],
+                                  analysis.master_table(master), region_data,
+                                  station=params['station'], day=params['day'],
+                                  max_cols=options['max_cols'])
+        result = {'params': dict(params, **options), 'tables': None}
+        if view is None:
+            return result
+        tables = analysis.result_tables(view, options['offset'], options['check_range'])
+        if tables is not None:
+            result['tables'] = {name: _records(df) for name, df in tables.items()}
+        return result
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """Routes GET requests to the MatrixService of the server."""
+
+    routes = {'/health': 'health', '/stations': 'stations', '/draws': 'draws',
+              '/master': 'master', '/matrix': 'matrix'}
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        route = self.routes.get(url.path.rstrip("/") or "/")
+        if route is None:
+            self._send(404, {'error': f"unknown path {url.path}"})
+            return
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            self._send(200, getattr(self.server.service, route)(query))
+        except ValueError as e:
+            self._send(400, {'error': str(e)})
+        except LookupError as e:
+            self._send(503, {'error': str(e)})
+        except Exception as e:
+            logging.error(f"API {url.path} failed: {e}")
+            self._send(500, {'error': "internal error"})
+
+    def _send(self, status: int, payload: Dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        logging.info(f"{self.address_string()} {format % args}")
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8765, source=None,
+                cache: Optional[ResultCache] = None) -> ThreadingHTTPServer:
+    """
+    Build the HTTP server (call serve_forever() to run it).
+
+    Args:
+        host, port: Address to listen on (port 0 picks a free port)
+        source: Data source (default LiveSource); pass a StaticSource to
+            serve fixed data without network access
+        cache: Result cache (default: a new ResultCache)
+    """
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    server.daemon_threads = True
+    server.service = MatrixService(source, cache)
+    return server
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cache-size", type=int, default=RESULT_CACHE_SIZE, help="Số kết quả /matrix giữ lại")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    server = make_server(args.host, args.port, cache=ResultCache(args.cache_size))
+    logging.info(f"Serving on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Backfill years of draw history into the local draw store, page by page.
+
+Usage:
+    python backfill.py --days 1095                  # mọi nguồn, ~3 năm
+    python backfill.py --days 730 --sources mn dt   # chỉ Miền Nam + Điện Toán
+    python backfill.py --days 1095 --chunk 50 --workers 4
+
+Sau khi backfill, app/CLI/API đọc lịch sử sâu từ draw store và chỉ tải
+các kỳ mới hơn ngày đã lưu.
+"""
+import argparse
+import concurrent.futures
+import logging
+import math
+import sqlite3
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import data_fetcher
+import draw_store
+
+# === BACKFILL LỊCH SỬ SÂU ===
+# Một request limitNum=N khổng lồ chậm và hay lỗi; thay vào đó tải từng trang
+# `chunk` kỳ song song trên pool tải chung (data_fetcher.get_fetch_executor,
+# giới hạn HTTP_MAX_PER_HOST), rồi ghi cả lịch sử vào draw store.
+# Nếu nguồn bỏ qua tham số trang (trang 2 trùng trang 1) thì quay về một
+# request duy nhất cho nguồn đó. URL từng trang: data_fetcher.page_url.
+DEFAULT_CHUNK = 100
+
+
+@dataclass
+class BackfillSource:
+    """One draw history to backfill."""
+    store_source: str    # khóa source trong draw store
+    station: str         # "" cho nguồn một đài
+    download: Callable[[int, Optional[str]], List[Dict]]  # (limit, url) -> draws mới -> cũ
+    page_url: Callable[[int, int], str]                   # (page, chunk) -> URL của trang
+
+    @property
+    def name(self) -> str:
+        return f"{self.store_source}/{self.station}" if self.station else self.store_source
+
+
+def _pages(source: str, station: str = "") -> Callable[[int, int], str]:
+    return lambda page, chunk: data_fetcher.page_url(source, station, page, chunk)
+
+
+def _station_source(station: str) -> BackfillSource:
+    return BackfillSource(
+        "kqxs88", station,
+        lambda n, url=None: data_fetcher._download_station_data(station, n, url),
+        _pages("kqxs88", station),
+    )
+
+
+def backfill_sources(groups: Optional[List[str]] = None) -> List[BackfillSource]:
+    """
+    Sources of the given groups: mb (XSMB), dt (Điện Toán), tt (Thần Tài),
+    mn / mt (every station of the region); default all.
+    """
+    groups = groups or ["mb", "dt", "tt", "mn", "mt"]
+    sources = []
+    if "mb" in groups:
+        sources.append(BackfillSource("xsmb", "", data_fetcher._download_xsmb, _pages("xsmb")))
+    if "dt" in groups:
+        sources.append(BackfillSource("dien_toan", "", data_fetcher._download_dien_toan, _pages("dien_toan")))
+    if "tt" in groups:
+        sources.append(BackfillSource("than_tai", "", data_fetcher._download_than_tai, _pages("than_tai")))
+    for group, region in (("mn", "Miền Nam"), ("mt", "Miền Trung")):
+        if group in groups:
+            sources += [_station_source(s) for s in data_fetcher.get_all_stations_in_region(region)]
+    return sources
+
+
+def _oldest_day(draws: List[Dict]) -> Optional[int]:
+    days = [draw_store.date_to_day(d['date']) for d in draws if d.get('date')]
+    return min(days) if days else None
+
+
+def _newest_day(draws: List[Dict]) -> Optional[int]:
+    days = [draw_store.date_to_day(d['date']) for d in draws if d.get('date')]
+    return max(days) if days else None
+
+
+def fetch_history(source: BackfillSource, total: int, chunk: int = DEFAULT_CHUNK) -> List[Dict]:
+    """
+    Download the newest `total` draws of a source in pages of `chunk` draws.
+
+    Pages 1 and 2 go first to check that the source really pages (page 2
+    strictly older than page 1); the remaining pages then run in parallel
+    on the shared fetch pool and stop at the first empty page.
+
+    Returns:
+        Draws, newest first, without duplicate dates
+    """
+    executor = data_fetcher.get_fetch_executor()
+    pages = max(1, math.ceil(total / chunk))
+
+    def page(p: int) -> List[Dict]:
+        return source.download(chunk, source.page_url(p, chunk))
+
+    first = executor.submit(page, 1)
+    second = executor.submit(page, 2) if pages > 1 else None
+    results = {1: first.result()}
+    if second is not None:
+        results[2] = second.result()
+        oldest, newest = _oldest_day(results[1]), _newest_day(results[2])
+        if results[2] and (oldest is None or newest is None or newest >= oldest):
+            # Nguồn không phân trang: một request cho cả độ sâu
+            logging.warning(f"{source.name}: paging not supported, fetching {total} draws at once")
+            return source.download(total, None)
+        if results[2] and pages > 2:
+            futures = {p: executor.submit(page, p) for p in range(3, pages + 1)}
+            for p in sorted(futures):
+                results[p] = futures[p].result()
+            # Trang rỗng = hết lịch sử; bỏ các trang sau nó
+            for p in sorted(results):
+                if not results[p]:
+                    results = {q: r for q, r in results.items() if q < p}
+                    break
+
+    draws, seen = [], set()
+    for p in sorted(results):
+        for draw in results[p]:
+            if draw.get('date') and draw['date'] not in seen:
+                seen.add(draw['date'])
+                draws.append(draw)
+    return draws[:total]
+
+
+def backfill_source(source: BackfillSource, total: int, chunk: int = DEFAULT_CHUNK,
+                    path: Optional[str] = None) -> int:
+    """Fetch and store one source's history; returns the number of draws stored."""
+    try:
+        draws = fetch_history(source, total, chunk)
+    except Exception as e:
+        logging.error(f"Backfill of {source.name} failed: {e}")
+        return 0
+    if not draws:
+        logging.error(f"Backfill of {source.name}: no draws")
+        return 0
+    try:
+        saved = draw_store.save_draws(source.store_source, source.station, draws, path)
+        # Đã có đủ `total` kỳ gần nhất: sync sau chỉ tải phần mới hơn
+        draw_store.mark_synced(source.store_source, source.station, total if len(draws) >= total else len(draws), path)
+    except (sqlite3.Error, OSError) as e:
+        logging.error(f"Could not store backfill of {source.name}: {e}")
+        return 0
+    logging.info(f"Backfilled {source.name}: {saved} draws")
+    return saved
+
+
+def run_backfill(total: int, groups: Optional[List[str]] = None, chunk: int = DEFAULT_CHUNK,
+                 parallel_sources: int = 4, path: Optional[str] = None) -> Dict[str, int]:
+    """
+    Backfill every selected source.
+
+    Args:
+        total: Draws to keep per source (a weekly station draws ~52 times a year)
+        groups: See backfill_sources
+        chunk: Draws per page request
+        parallel_sources: Sources paged at the same time; their pages all
+            share the bounded fetch pool
+
+    Returns:
+        Source name -> draws stored
+    """
+    sources = backfill_sources(groups)
+    # Luồng điều phối chỉ chờ kết quả, trang tải trên pool tải chung (không lồng pool)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=parallel_sources,
+                                               thread_name_prefix="backfill") as coordinators:
+        futures = {s.name: coordinators.submit(backfill_source, s, total, chunk, path) for s in sources}
+        return {name: f.result() for name, f in futures.items()}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=1095, help="Số kỳ cần có cho mỗi nguồn")
+    parser.add_argument("--sources", nargs="+", choices=["mb", "dt", "tt", "mn", "mt"],
+                        help="Nhóm nguồn (mặc định: tất cả)")
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="Số kỳ mỗi trang")
+    parser.add_argument("--workers", type=int, help="Số request đồng thời (mặc định HTTP_MAX_PER_HOST)")
+    parser.add_argument("--parallel-sources", type=int, default=4, help="Số nguồn tải cùng lúc")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    if args.workers:
+        data_fetcher.set_max_per_host(args.workers)
+    stored = run_backfill(args.days, args.sources, args.chunk, args.parallel_sources)
+    for name, count in stored.items():
+        print(f"{name}: {count}")
+    return 0 if any(stored.values()) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,75 @@
+"""
+Benchmark fetch concurrency and retries against the local stand-in server (no live sites).
+
+Usage:
+    python http_replay.py record --dir recordings --days 60                     # một lần, cần mạng
+    python benchmarks/bench_fetch.py --dir recordings --latency 0.2 --jitter 0.05
+    python benchmarks/bench_fetch.py --dir recordings --error-rate 0.1 --pad-kb 256 --workers 1 4 8
+"""
+import argparse
+import concurrent.futures
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_fetcher
+import http_replay
+
+
+def recorded_stations(store: http_replay.ReplayStore, days: int):
+    """DAI_API stations the recording can answer for `days` draws."""
+    return [s for s, url in data_fetcher.DAI_API.items()
+            if store.lookup(url.replace("limitNum=60", f"limitNum={days}")) is not None]
+
+
+def run_once(stations, days: int, workers: int):
+    # Pool riêng bằng số worker để đo được cả mức cao hơn pool tải chung
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        t0 = time.perf_counter()
+        futures = [executor.submit(data_fetcher._download_station_data, s, days) for s in stations]
+        draws = sum(len(f.result()) for f in futures)
+        return time.perf_counter() - t0, draws
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default="recordings", help="Thư mục ghi của http_replay.py record")
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="Các mức HTTP_MAX_PER_HOST")
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--pad-kb", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0, help="Seed cho độ trễ/lỗi ngẫu nhiên")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    server = http_replay.make_server(args.dir, port=0, latency=args.latency, jitter=args.jitter,
+                                     error_rate=args.error_rate, pad_bytes=args.pad_kb * 1024)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    data_fetcher.set_standin(f"http://127.0.0.1:{server.server_address[1]}")
+
+    stations = recorded_stations(server.store, args.days)
+    if not stations:
+        print(f"No recorded stations in {args.dir}")
+        return
+    print(f"{len(stations)} stations, latency {args.latency}s ± {args.jitter}s, "
+          f"error rate {args.error_rate:.0%}, padding {args.pad_kb} KB")
+    print(f"{'workers':>7} {'best s':>8} {'req/s':>7} {'draws':>7}")
+    for workers in args.workers:
+        data_fetcher.set_max_per_host(workers)
+        best, draws = float("inf"), 0
+        for _ in range(args.repeat):
+            elapsed, draws = run_once(stations, args.days, workers)
+            best = min(best, elapsed)
+        print(f"{workers:>7} {best:>8.2f} {len(stations) / best:>7.1f} {draws:>7}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark the lxml and BeautifulSoup HTML parsing backends on saved pages.
+
+Usage:
+    python benchmarks/bench_html_parsers.py --save 365   # tải và lưu trang mẫu
+    python benchmarks/bench_html_parsers.py --save 365 --congcuxoso URL   # lưu thêm trang congcuxoso
+    python benchmarks/bench_html_parsers.py              # chạy benchmark trên trang đã lưu
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_fetcher
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages")
+
+PAGES = {
+    "dien_toan": "https://ketqua04.net/so-ket-qua-dien-toan-123/{days}",
+    "than_tai": "https://ketqua04.net/so-ket-qua-than-tai/{days}",
+}
+
+
+def save_pages(days: int, pages_dir: str, congcuxoso_url: Optional[str] = None) -> None:
+    os.makedirs(pages_dir, exist_ok=True)
+    urls = {kind: url.format(days=days) for kind, url in PAGES.items()}
+    # Trang congcuxoso không có URL cố định (bên gọi _parse_congcuxoso truyền vào)
+    if congcuxoso_url:
+        urls["congcuxoso"] = congcuxoso_url
+    for kind, url in urls.items():
+        text = data_fetcher.fetch_html(url)
+        if text is None:
+            print(f"{kind}: download failed")
+            continue
+        with open(os.path.join(pages_dir, f"{kind}.html"), "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"{kind}: saved {len(text) / 1024:.0f} KB")
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", default=PAGES_DIR, help="Thư mục chứa <kind>.html")
+    parser.add_argument("--save", type=int, metavar="DAYS", help="Tải trang mẫu DAYS ngày rồi thoát")
+    parser.add_argument("--congcuxoso", metavar="URL", help="Trang congcuxoso lưu cùng --save")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.save:
+        save_pages(args.save, args.pages, args.congcuxoso)
+        return
+
+    backends = ["bs4"] + (["lxml"] if data_fetcher.lxml_html is not None else [])
+    print(f"{'page':<12} {'KB':>7} {'rows':>6} " + " ".join(f"{b + ' ms':>10}" for b in backends) + "  speedup")
+    for kind in ("dien_toan", "than_tai", "congcuxoso"):
+        path = os.path.join(args.pages, f"{kind}.html")
+        if not os.path.exists(path):
+            print(f"{kind}: no saved page")
+            continue
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+
+        results = {b: data_fetcher.parse_html(kind, text, 10 ** 6, backend=b) for b in backends}
+        if len(backends) > 1 and results["bs4"] != results["lxml"]:
+            print(f"{kind}: WARNING backends disagree ({len(results['bs4'])} vs {len(results['lxml'])} rows)")
+
+        timings = {b: best_of(lambda b=b: data_fetcher.parse_html(kind, text, 10 ** 6, backend=b), args.repeat)
+                   for b in backends}
+        speedup = timings["bs4"] / timings["lxml"] if "lxml" in timings else 1.0
+        print(f"{kind:<12} {len(text) / 1024:>7.0f} {len(results['bs4']):>6} "
+              + " ".join(f"{timings[b] * 1000:>10.1f}" for b in backends)
+              + f"  {speedup:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark the matrix view pipeline on synthetic histories of growing depth.
+
+Times the steps render_matrix_view runs for one configuration (make_view,
+building the MatrixState from scratch, the window and the "Quét tất cả"
+sweep), plus analysis.result_tables (API / CLI), to show where it stops scaling.
+
+Usage:
+    python benchmarks/bench_matrix.py                                 # 60 ngày .. 10 năm
+    python benchmarks/bench_matrix.py --days 365 3650 --region mn --src "Ghép TT+ĐT" --3d
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analysis
+import matrix_engine
+import synth_data
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    value = fn()
+    return value, (time.perf_counter() - t0) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, nargs="+", default=[60, 180, 365, 1095, 3650],
+                        help="Số ngày tải (Miền Bắc: số kỳ; đài: số kỳ của mỗi đài)")
+    parser.add_argument("--region", default="mb", choices=["mb", "mn", "mt"])
+    parser.add_argument("--station", default=analysis.ALL)
+    parser.add_argument("--prize", default="db")
+    parser.add_argument("--src", default="dt", help="dt, tt, ghep")
+    parser.add_argument("--3d", dest="mode_3d", action="store_true")
+    parser.add_argument("--no-sweep", action="store_true", help="Bỏ qua bước Quét tất cả")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    params = analysis.normalize_params(args.region, args.station, analysis.ALL, args.prize, args.src, args.mode_3d)
+    print(f"{params['region']} / {params['station']} / {params['prize']} / {params['src_mode']}"
+          f"{' / 3D' if params['mode_3d'] else ''}")
+    print(f"{'days':>6} {'rows':>6} {'view ms':>9} {'state ms':>9} {'window ms':>10} "
+          f"{'tables ms':>10} {'sweep ms':>9}")
+    for days in args.days:
+        # Sinh dữ liệu không tính vào thời gian đo
+        df_full = analysis.build_master_table(synth_data.master_data(days, seed=args.seed))
+        region_data = synth_data.region_data(params['region'], days, seed=args.seed)
+
+        view, view_ms = timed(lambda: analysis.make_view(
+            params['region'], params['src_mode'], params['mode_3d'], params['prize'], df_full, region_data,
+            station=params['station'], day=params['day']))
+        if view is None:
+            print(f"{days:>6} no {analysis.comp_column(params['region'], params['prize'], params['mode_3d'])} data")
+            continue
+        limit = len(view.df_region)
+        # Lần đầu mở trang: dựng MatrixState từ đầu, rồi cắt cửa sổ như render_matrix_view
+        state, state_ms = timed(lambda: analysis.update_state(view))
+        _, window_ms = timed(lambda: matrix_engine.window_counts(
+            state.window(0, analysis.WINDOW_ROWS, limit=limit, index_cutoff=not view.date_mode)[1]))
+        # Đường API / CLI
+        _, tables_ms = timed(lambda: analysis.result_tables(view))
+        sweep_ms = float("nan")
+        if not args.no_sweep:
+            def run_sweep():
+                full_days_data, full_matrix = state.full(limit=limit)
+                return matrix_engine.sweep_offsets(full_matrix, [d['index'] for d in full_days_data],
+                                                   window=analysis.WINDOW_ROWS,
+                                                   index_cutoff=not view.date_mode).summary()
+            _, sweep_ms = timed(run_sweep)
+        print(f"{days:>6} {len(view.df_check_source):>6} {view_ms:>9.1f} {state_ms:>9.1f} {window_ms:>10.1f} "
+              f"{tables_ms:>10.1f} {sweep_ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import numpy as np
+import threading
+from functools import lru_cache
+from typing import List, Iterable, Sequence, Tuple
+
+# === BITSET DÀN ===
+# Nhị hợp (2D): mỗi dàn là một hàng bool dài 100 (bit n = số "nn" có trong dàn).
+# Tam hợp (3D): hàng bool dài 1000.
+# Kết quả được mã hóa thành int (0..99 hoặc 0..999), -1 = không hợp lệ
+# (rỗng, "nan", sai số chữ số) - không bao giờ trúng nhưng vẫn tính là "có dữ liệu".
+
+WIDTH = {2: 100, 3: 1000}
+
+# Bảng dàn theo bộ chữ số nguồn: chỉ có 2^10 = 1024 bộ chữ số khả dĩ,
+# nên dàn nhị hợp / tam hợp của mọi nguồn (TT, ĐT, Ghép TT+ĐT) được tính sẵn một lần.
+_combo_tables = {}
+_combo_tables_lock = threading.Lock()
+
+
+def digits_for(mode_3d: bool) -> int:
+    return 3 if mode_3d else 2
+
+
+def encode(nums: Iterable[str], digits: int) -> np.ndarray:
+    """Encode numbers as ints; anything that is not exactly `digits` digits becomes -1."""
+    return np.asarray(
+        [int(n) if isinstance(n, str) and len(n) == digits and n.isdigit() else -1 for n in nums],
+        dtype=np.int16,
+    )
+
+
+def combos_to_mask(combos: Iterable[str], digits: int) -> np.ndarray:
+    """Bool row of width 100/1000 with the dàn's numbers set."""
+    mask = np.zeros(WIDTH[digits], dtype=bool)
+    codes = encode(combos, digits)
+    mask[codes[codes >= 0]] = True
+    return mask
+
+
+def mask_to_combos(mask: np.ndarray, digits: int) -> List[str]:
+    """Sorted number strings of a dàn mask."""
+    return [f"{n:0{digits}d}" for n in np.flatnonzero(mask)]
+
+
+def flat_to_masks(values: np.ndarray, offsets: np.ndarray, digits: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Result bitsets from a flat value array with per-row offsets.
+
+    Args:
+        values: Flat int codes (-1 = invalid)
+        offsets: Row i owns values[offsets[i]:offsets[i + 1]]
+        digits: 2 or 3
+
+    Returns:
+        (masks, counts): (J, width) bool result sets and (J,) number of results per row
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    counts = np.diff(offsets)
+    masks = np.zeros((len(counts), WIDTH[digits]), dtype=bool)
+    owners = np.repeat(np.arange(len(counts)), counts)
+    values = np.asarray(values, dtype=np.int64)
+    valid = values >= 0
+    masks[owners[valid], values[valid]] = True
+    return masks, counts
+
+
+def results_to_masks(values_per_row: Sequence[Sequence[str]], digits: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Result bitsets from per-row lists of number strings (see flat_to_masks)."""
+    offsets = np.zeros(len(values_per_row) + 1, dtype=np.int64)
+    np.cumsum([len(v) for v in values_per_row], out=offsets[1:])
+    flat = encode((n for row in values_per_row for n in row), digits)
+    return flat_to_masks(flat, offsets, digits)
+
+
+def digit_mask(src: str) -> int:
+    """10-bit mask of the digits present in a source string (bit d = digit d)."""
+    mask = 0
+    for ch in src:
+        if "0" <= ch <= "9":
+            mask |= 1 << (ord(ch) - 48)
+    return mask
+
+
+def combo_table(digits: int) -> np.ndarray:
+    """
+    (1024, width) bool table: row m is the dàn built from digit mask m.
+
+    A number belongs to the dàn when every one of its digits is in the mask,
+    which is exactly {a+b} (2D) / {a+b+c} (3D) over the source digits.
+    Built on first use per width and shared by every caller.
+    """
+    table = _combo_tables.get(digits)
+    if table is None:
+        with _combo_tables_lock:
+            table = _combo_tables.get(digits)
+            if table is None:
+                numbers = np.arange(WIDTH[digits])
+                needed = np.zeros(len(numbers), dtype=np.int64)
+                for place in range(digits):
+                    needed |= 1 << ((numbers // 10 ** place) % 10)
+                masks = np.arange(1024)
+                table = (needed[None, :] & ~masks[:, None]) == 0
+                table.setflags(write=False)
+                _combo_tables[digits] = table
+    return table
+
+
+@lru_cache(maxsize=2048)
+def combo_strings(mask: int, digits: int) -> Tuple[str, ...]:
+    """Sorted dàn numbers for a digit mask, e.g. 0b11 -> ('00', '01', '10', '11')."""
+    return tuple(mask_to_combos(combo_table(digits)[mask], digits))
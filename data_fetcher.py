@@ -1,14 +1,147 @@
 import requests
+from requests.adapters import HTTPAdapter
+import asyncio
 import concurrent.futures
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 import logging
+import os
+import random
+import threading
 import time
-from typing import List, Dict, Tuple
+import sqlite3
+from datetime import datetime, timedelta, timezone, time as dtime
+from typing import List, Dict, Tuple, Callable, AsyncIterator, Optional
+from urllib.parse import urlsplit
 import json
+import draw_store
+
+try:
+    from lxml import html as lxml_html
+except ImportError:  # lxml không có thì dùng BeautifulSoup
+    lxml_html = None
 
 logging.basicConfig(level=logging.INFO)
 HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"}
 
+# === HTTP SESSION (dùng chung toàn process) ===
+HTTP_TIMEOUT = 10
+HTTP_MAX_RETRIES = 3
+HTTP_BACKOFF_BASE = 0.5  # giây, nhân đôi sau mỗi lần thử
+HTTP_BACKOFF_MAX = 8.0
+HTTP_MAX_PER_HOST = int(os.environ.get("HTTP_MAX_PER_HOST", "8"))
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+_host_slots: Dict[str, threading.BoundedSemaphore] = {}
+
+# Chạy offline (xem http_replay.py): gửi mọi request tới server thay thế và/hoặc ghi lại response
+_standin_url = (os.environ.get("HTTP_STANDIN_URL") or "").rstrip("/") or None
+_recorder = None
+
+def get_session() -> requests.Session:
+    """
+    Return the process-wide pooled session.
+    
+    Connections are kept alive and reused across calls and threads; the
+    adapter pool holds at most HTTP_MAX_PER_HOST connections per host.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                session.headers.update(HEADERS)
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_MAX_PER_HOST, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+def set_max_per_host(limit: int) -> None:
+    """Change the per-host connection cap; the pool is rebuilt on next use."""
+    global HTTP_MAX_PER_HOST, _session
+    with _session_lock:
+        HTTP_MAX_PER_HOST = max(1, int(limit))
+        if _session is not None:
+            _session.close()
+        _session = None
+        _host_slots.clear()
+
+def set_standin(base_url: Optional[str]) -> None:
+    """
+    Send every request to a local stand-in server instead of the live sites.
+    
+    https://host/path?query becomes {base_url}/host/path?query; None restores
+    the live sites. Also set by the HTTP_STANDIN_URL environment variable.
+    """
+    global _standin_url
+    _standin_url = base_url.rstrip("/") if base_url else None
+
+def set_recorder(recorder) -> None:
+    """Pass every successful response to recorder.save(url, response); None stops recording."""
+    global _recorder
+    _recorder = recorder
+
+def _route(url: str) -> str:
+    if not _standin_url:
+        return url
+    parts = urlsplit(url)
+    return f"{_standin_url}/{parts.netloc}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+
+def _host_slot(url: str) -> threading.BoundedSemaphore:
+    host = urlsplit(url).netloc
+    with _session_lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            slot = threading.BoundedSemaphore(HTTP_MAX_PER_HOST)
+            _host_slots[host] = slot
+        return slot
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt)))
+
+def http_get(url: str, timeout: float = HTTP_TIMEOUT, max_retries: int = HTTP_MAX_RETRIES) -> requests.Response:
+    """
+    GET a URL through the shared session with retry and per-host limits.
+    
+    Timeouts, connection errors and 429/5xx responses are retried with
+    exponential backoff; other HTTP errors are raised immediately.
+    
+    Args:
+        url: URL to fetch
+        timeout: Per-attempt timeout in seconds
+        max_retries: Maximum number of attempts
+        
+    Returns:
+        Successful response
+        
+    Raises:
+        requests.exceptions.RequestException: after the last failed attempt
+    """
+    session = get_session()
+    slot = _host_slot(url)  # giới hạn theo host gốc kể cả khi qua server thay thế
+    target = _route(url)
+    for attempt in range(max_retries):
+        try:
+            with slot:
+                r = session.get(target, timeout=timeout)
+            if r.status_code in RETRY_STATUS and attempt < max_retries - 1:
+                logging.warning(f"HTTP {r.status_code} from {url}, attempt {attempt + 1}/{max_retries}")
+                time.sleep(_backoff_delay(attempt))
+                continue
+            r.raise_for_status()
+            if _recorder is not None:
+                _recorder.save(url, r)
+            return r
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            logging.warning(f"{type(e).__name__} loading {url}, attempt {attempt + 1}/{max_retries}")
+            if attempt >= max_retries - 1:
+                raise
+            time.sleep(_backoff_delay(attempt))
+    raise requests.exceptions.RetryError(f"Giving up on {url} after {max_retries} attempts")
+
 # === MIỀN NAM & MIỀN TRUNG DATA ===
 DAI_API = {
     "An Giang": "https://www.kqxs88.live/api/front/open/lottery/history/list/game?limitNum=60&gameCode=angi",
@@ -68,6 +201,10 @@ LICH_QUAY_TRUNG = {
     "Thứ 7": ["Quảng Ngãi", "Đà Nẵng", "Đắk Nông"]
 }
 
+WEEKDAY_INDEX = {
+    "Thứ 2": 0, "Thứ 3": 1, "Thứ 4": 2, "Thứ 5": 3, "Thứ 6": 4, "Thứ 7": 5, "Chủ Nhật": 6
+}
+
 def get_stations_by_day(region: str, day: str) -> List[str]:
     """
     Get list of lottery stations for a specific region and day.
@@ -101,16 +238,17 @@ def get_all_stations_in_region(region: str) -> List[str]:
         
     return sorted(list(stations))
 
-def fetch_station_data(station_name: str, total_days: int = 60) -> List[Dict]:
+def _download_station_data(station_name: str, total_days: int, url: Optional[str] = None) -> List[Dict]:
     """
-    Fetch lottery data for a specific station from API.
+    Download the newest `total_days` draws for a station from the API.
     
     Args:
         station_name: Name of the station (e.g., "An Giang")
-        total_days: Number of days to fetch
+        total_days: Number of draws to request (limitNum)
+        url: Request URL override (e.g. one page of a backfill)
     
     Returns:
-        List of lottery results with date and prizes
+        List of lottery results with date and prizes, newest first
     """
     url_template = DAI_API.get(station_name)
     if not url_template:
@@ -118,11 +256,10 @@ def fetch_station_data(station_name: str, total_days: int = 60) -> List[Dict]:
         return []
     
     # Replace limitNum=60 with limitNum={total_days}
-    url = url_template.replace("limitNum=60", f"limitNum={total_days}")
+    url = url or url_template.replace("limitNum=60", f"limitNum={total_days}")
     
     try:
-        response = requests.get(url, headers=HEADERS, timeout=10)
-        response.raise_for_status()
+        response = http_get(url)
         data = response.json()
         
         if not data.get("success"):
@@ -179,6 +316,421 @@ def fetch_station_data(station_name: str, total_days: int = 60) -> List[Dict]:
         logging.error(f"Unexpected error for {station_name}: {e}")
         return []
 
+def _station_draw_weekdays(station_name: str) -> set:
+    """Weekday indexes (Mon=0) on which a station draws, per LICH_QUAY_*."""
+    weekdays = set()
+    for schedule in (LICH_QUAY_NAM, LICH_QUAY_TRUNG):
+        for day, stations in schedule.items():
+            if station_name in stations:
+                weekdays.add(WEEKDAY_INDEX[day])
+    return weekdays
+
+# === LỊCH CÓ KẾT QUẢ ===
+# Kết quả cũ không bao giờ đổi; chỉ cần tải lại sau giờ quay của đài vào
+# đúng ngày đài quay. Giờ Việt Nam (UTC+7, không đổi giờ mùa hè):
+# Miền Nam quay 16:15, Miền Trung 17:15, Miền Bắc (cùng Điện Toán, Thần Tài) 18:15.
+VN_TZ = timezone(timedelta(hours=7))
+RESULT_READY = {"Miền Nam": dtime(16, 45), "Miền Trung": dtime(17, 45), "Miền Bắc": dtime(18, 45)}
+LATE_RESULT_WINDOW = 2 * 3600  # giây sau giờ có kết quả vẫn kiểm tra lại (trang đăng trễ)
+LATE_RESULT_RECHECK = 600      # giây giữa các lần kiểm tra lại trong khoảng đó
+MISSING_RESULT_RECHECK = 1800  # quá khoảng đó mà vẫn thiếu kỳ mới nhất (trang lỗi/đăng rất trễ)
+
+def station_region(station_name: str) -> str:
+    """Region of a station; "" (Miền Bắc, Điện Toán, Thần Tài) is Miền Bắc."""
+    if any(station_name in stations for stations in LICH_QUAY_NAM.values()):
+        return "Miền Nam"
+    if any(station_name in stations for stations in LICH_QUAY_TRUNG.values()):
+        return "Miền Trung"
+    return "Miền Bắc"
+
+def _result_times(station_name: str, around: datetime, step: int):
+    """Scheduled result times of a station, walking from `around`'s date by `step` days."""
+    ready = RESULT_READY[station_region(station_name)]
+    # Đài không có lịch (Miền Bắc, Điện Toán, Thần Tài) quay hằng ngày
+    weekdays = _station_draw_weekdays(station_name) or set(range(7))
+    day = around.astimezone(VN_TZ).date()
+    for n in range(8):
+        d = day + timedelta(days=n * step)
+        if d.weekday() in weekdays:
+            yield datetime.combine(d, ready, VN_TZ)
+
+def last_result_time(station_name: str, now: Optional[datetime] = None) -> datetime:
+    """Newest scheduled result time of a station at or before `now` (default: now)."""
+    now = now or datetime.now(VN_TZ)
+    return next(t for t in _result_times(station_name, now, -1) if t <= now)
+
+def next_result_time(station_name: str, after: datetime) -> datetime:
+    """First scheduled result time of a station strictly after `after`."""
+    return next(t for t in _result_times(station_name, after, 1) if t > after)
+
+def has_latest_draw(station_name: str, newest_date: Optional[str], at: Optional[datetime] = None) -> bool:
+    """True when `newest_date` ('dd/mm/YYYY') is the station's last draw due at `at` (default: now)."""
+    if not newest_date:
+        return False
+    try:
+        newest = draw_store.date_to_day(newest_date)
+    except (ValueError, TypeError):
+        return False
+    return newest >= last_result_time(station_name, at).date().toordinal()
+
+def data_expiry(created_at: float, newest: Dict[str, Optional[str]]) -> float:
+    """
+    Time (epoch seconds) until which data fetched at `created_at` stays current.
+    
+    That is the next scheduled result of any of the stations. Data that
+    still lacks a station's latest due draw is rechecked sooner instead:
+    every LATE_RESULT_RECHECK seconds within LATE_RESULT_WINDOW after the
+    result time (results published late), every MISSING_RESULT_RECHECK
+    seconds after that (page down or very late), never waiting for the
+    station's next draw.
+    
+    Args:
+        created_at: Fetch time (epoch seconds)
+        newest: Station -> newest date in the data ("" for Miền Bắc /
+            Điện Toán / Thần Tài; None when the station has no draws)
+    """
+    created = datetime.fromtimestamp(created_at, VN_TZ)
+    expiry = min(next_result_time(s, created) for s in newest).timestamp()
+    recheck = None
+    for station, newest_date in newest.items():
+        if has_latest_draw(station, newest_date, created):
+            continue
+        late = created_at - last_result_time(station, created).timestamp() < LATE_RESULT_WINDOW
+        interval = LATE_RESULT_RECHECK if late else MISSING_RESULT_RECHECK
+        recheck = interval if recheck is None else min(recheck, interval)
+    return expiry if recheck is None else min(expiry, created_at + recheck)
+
+def _draws_since(station_name: str, last_day: int) -> int:
+    """
+    Count scheduled draws after `last_day` whose results are due by now.
+    
+    Today's draw only counts once its result time has passed, so the store
+    is not re-checked against the network before the draw.
+    Stations without a schedule (Miền Bắc, Điện Toán, Thần Tài) draw daily.
+    """
+    due = last_result_time(station_name).date().toordinal()
+    if last_day >= due:
+        return 0
+    weekdays = _station_draw_weekdays(station_name) if station_name else set()
+    if not weekdays:
+        return due - last_day
+    # date.toordinal() == 1 is a Monday, so weekday = (ordinal - 1) % 7
+    return sum(1 for d in range(last_day + 1, due + 1) if (d - 1) % 7 in weekdays)
+
+# === GỘP CÁC LẦN TẢI TRÙNG (SINGLE-FLIGHT) ===
+# Nhiều phiên cùng thiếu cache sẽ cùng gọi một (source, station): chỉ lần đầu
+# thực sự đồng bộ, các lần sau chờ và dùng chung kết quả. Lần cần sâu hơn
+# lần đang chạy thì chờ xong rồi tự chạy (lúc đó store đã gần đủ).
+class _Flight:
+    def __init__(self, total_days: int):
+        self.total_days = total_days
+        self.done = threading.Event()
+        self.result: Optional[List[Dict]] = None
+
+_flights: Dict[Tuple[str, str], _Flight] = {}
+_flights_lock = threading.Lock()
+
+def _sync_from_store(source: str, station: str, total_days: int,
+                     download: Callable[..., List[Dict]]) -> List[Dict]:
+    """
+    Serve `total_days` draws of (source, station), sharing identical in-flight fetches.
+    
+    See _sync_from_store_once; a caller finding a fetch of at least
+    `total_days` for the same source and station already running waits for
+    it and gets a slice of its result instead of fetching again.
+    """
+    key = (source, station)
+    while True:
+        with _flights_lock:
+            flight = _flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _flights[key] = _Flight(total_days)
+        if leader:
+            try:
+                flight.result = _sync_from_store_once(source, station, total_days, download)
+            finally:
+                with _flights_lock:
+                    del _flights[key]
+                flight.done.set()
+            return flight.result
+        flight.done.wait()
+        if flight.result is not None and flight.total_days >= total_days:
+            return flight.result[:total_days]
+
+def _sync_from_store_once(source: str, station: str, total_days: int,
+                          download: Callable[..., List[Dict]]) -> List[Dict]:
+    """
+    Serve `total_days` draws from the local store, downloading only what is missing.
+    
+    A full download happens only when the store has never been synced;
+    otherwise only draws newer than the last stored date are requested, and
+    a request deeper than the synced depth fetches just the older draws
+    below it, page by page (see _download_older). Falls back to a plain
+    download if the store is unusable.
+    
+    Args:
+        source: Store source key
+        station: Station name ("" for single-station sources)
+        total_days: Number of draws wanted
+        download: Function (N, url=None) fetching the newest N draws, or
+            the page at `url`, from the network
+    
+    Returns:
+        List of draws, newest first
+    """
+    try:
+        depth = draw_store.synced_depth(source, station)
+        last_day = draw_store.latest_day(source, station)
+    except (sqlite3.Error, OSError) as e:
+        logging.error(f"Draw store unavailable for {source}/{station}: {e}")
+        return download(total_days)
+    
+    full = last_day is None or depth <= 0
+    missing = _draws_since(station, last_day) if last_day is not None else 0
+    limit = total_days if full else min(total_days, missing)
+    
+    if limit > 0:
+        fresh = download(limit)
+        if fresh:
+            # Kỳ mới không nối tới kỳ đã lưu (còn khe giữa): chỉ `limit` kỳ
+            # mới nhất liền mạch
+            gap = missing > limit
+            try:
+                draw_store.save_draws(source, station, fresh)
+                draw_store.mark_synced(source, station, limit, reset=gap)
+            except (sqlite3.Error, OSError) as e:
+                logging.error(f"Could not persist {source}/{station}: {e}")
+                return fresh[:total_days] if limit == total_days else download(total_days)
+            depth = limit if full or gap else max(depth, limit)
+    
+    if 0 < depth < total_days:
+        # Cần sâu hơn phần đã đồng bộ: chỉ tải các kỳ cũ hơn, không tải lại cả lịch sử
+        older = _download_older(source, station, depth, total_days, download)
+        if older is None:
+            older = download(total_days)
+        if older:
+            try:
+                draw_store.save_draws(source, station, older)
+                draw_store.mark_synced(source, station, total_days)
+            except (sqlite3.Error, OSError) as e:
+                logging.error(f"Could not persist {source}/{station}: {e}")
+                return download(total_days)
+    
+    try:
+        return draw_store.load_draws(source, station, total_days)
+    except (sqlite3.Error, OSError) as e:
+        logging.error(f"Could not read {source}/{station} from store: {e}")
+        return download(total_days)
+
+# === TẢI PHẦN CŨ HƠN THEO TRANG ===
+# kqxs88 (pageNum) và ketqua04 (?page=) chia lịch sử thành trang `chunk` kỳ,
+# mới -> cũ: trang p là các kỳ thứ (p-1)*chunk .. p*chunk-1. Dùng chung với backfill.py.
+KQXS88_PAGE = "&pageNum={page}"
+KETQUA04_PAGE = "?page={page}"
+OLDER_MAX_PAGES = 4  # số trang tối đa khi tải phần cũ hơn
+
+def page_url(source: str, station: str, page: int, chunk: int) -> Optional[str]:
+    """URL of page `page` (from 1) of a store source in pages of `chunk` draws; None if it has none."""
+    if source == "kqxs88":
+        base = DAI_API.get(station)
+        if not base:
+            return None
+        return base.replace("limitNum=60", f"limitNum={chunk}") + KQXS88_PAGE.format(page=page)
+    if source == "xsmb":
+        return ("https://www.kqxs88.live/api/front/open/lottery/history/list/game"
+                f"?limitNum={chunk}&gameCode=miba" + KQXS88_PAGE.format(page=page))
+    if source == "dien_toan":
+        return f"https://ketqua04.net/so-ket-qua-dien-toan-123/{chunk}" + KETQUA04_PAGE.format(page=page)
+    if source == "than_tai":
+        return f"https://ketqua04.net/so-ket-qua-than-tai/{chunk}" + KETQUA04_PAGE.format(page=page)
+    return None
+
+def _older_pages(depth: int, total_days: int) -> Optional[Tuple[int, List[int]]]:
+    """
+    (chunk, pages) covering draws depth .. total_days-1 with the fewest draws downloaded.
+    
+    None when every plan needs more than OLDER_MAX_PAGES pages or would
+    download as much as one full request.
+    """
+    best = None
+    for chunk in range(1, total_days + 1):
+        first, last = depth // chunk + 1, -(-total_days // chunk)
+        if first == 1 or last - first + 1 > OLDER_MAX_PAGES:
+            continue
+        cost = ((last - first + 1) * chunk, last - first + 1)
+        if best is None or cost < best[0]:
+            best = (cost, chunk, list(range(first, last + 1)))
+    if best is None or best[0][0] >= total_days:
+        return None
+    return best[1], best[2]
+
+def _download_older(source: str, station: str, depth: int, total_days: int,
+                    download: Callable[..., List[Dict]]) -> Optional[List[Dict]]:
+    """
+    Download draws depth .. total_days-1 (0 = newest) by page.
+    
+    Returns:
+        The older draws, newest first; None when the source cannot serve
+        them that way (no paging, a page ignored or short), so the caller
+        downloads the full history instead
+    """
+    plan = _older_pages(depth, total_days)
+    if plan is None or page_url(source, station, 1, 1) is None:
+        return None
+    chunk, pages = plan
+    try:
+        boundary = draw_store.day_at(source, station, depth - 1)
+    except (sqlite3.Error, OSError) as e:
+        logging.error(f"Draw store unavailable for {source}/{station}: {e}")
+        return None
+    if boundary is None:
+        return None
+    
+    older = []
+    # Đầu trang đầu tiên là các kỳ đã lưu; phần còn lại phải cũ hơn hẳn kỳ cũ nhất
+    # đã đồng bộ (nguồn bỏ qua tham số trang thì trả lại các kỳ mới nhất)
+    skip = depth - (pages[0] - 1) * chunk
+    for page in pages:
+        page_rows = download(chunk, page_url(source, station, page, chunk))
+        kept, skip = page_rows[skip:], 0
+        if len(page_rows) < chunk or not _all_before(kept, boundary):
+            logging.info(f"{source}/{station}: older draws not pageable, downloading {total_days} at once")
+            return None
+        older.extend(kept)
+    logging.info(f"{source}/{station}: fetched {len(pages)} page(s) of {chunk} below depth {depth}")
+    return older[:total_days - depth]
+
+def _all_before(records: List[Dict], day: int) -> bool:
+    try:
+        return all(draw_store.date_to_day(r['date']) < day for r in records)
+    except (KeyError, ValueError, TypeError):
+        return False
+
+def force_refetch(station_name: Optional[str] = None) -> None:
+    """
+    Make the next fetch download in full instead of trusting the draw store.
+    
+    Args:
+        station_name: A DAI_API station, "" for XSMB / Điện Toán / Thần Tài,
+            or None for every source
+    """
+    try:
+        if station_name is None:
+            draw_store.forget_synced()
+        elif station_name == "":
+            for source in ("xsmb", "dien_toan", "than_tai"):
+                draw_store.forget_synced(source, "")
+        else:
+            draw_store.forget_synced("kqxs88", station_name)
+    except (sqlite3.Error, OSError) as e:
+        logging.error(f"Could not reset draw store sync for {station_name!r}: {e}")
+
+def fetch_station_data(station_name: str, total_days: int = 60) -> List[Dict]:
+    """
+    Fetch lottery data for a specific station, backed by the local draw store.
+    
+    Args:
+        station_name: Name of the station (e.g., "An Giang")
+        total_days: Number of days to fetch
+    
+    Returns:
+        List of lottery results with date and prizes
+    """
+    if station_name not in DAI_API:
+        logging.error(f"No API URL found for station: {station_name}")
+        return []
+    return _sync_from_store("kqxs88", station_name, total_days,
+                            lambda n, url=None: _download_station_data(station_name, n, url))
+
+_fetch_executor = None
+
+def get_fetch_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """
+    Long-lived worker pool for blocking fetches, created once per process.
+    
+    Every fetch fan-out (master sources, region stations) shares these
+    HTTP_MAX_PER_HOST workers, so concurrent sessions queue instead of each
+    starting its own threads.
+    """
+    global _fetch_executor
+    if _fetch_executor is None:
+        with _session_lock:
+            if _fetch_executor is None:
+                _fetch_executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=HTTP_MAX_PER_HOST, thread_name_prefix="fetch")
+    return _fetch_executor
+
+async def fetch_stations_async(stations: List[str], days: int,
+                               concurrency: Optional[int] = None) -> AsyncIterator[Tuple[str, List[Dict]]]:
+    """
+    Fetch many stations concurrently on one event loop, yielding as they arrive.
+    
+    At most `concurrency` fetches are in flight (default HTTP_MAX_PER_HOST).
+    Each fetch goes through fetch_station_data, so the draw store and the
+    shared keep-alive session are used; blocking I/O runs on a long-lived
+    worker pool instead of a fresh executor per call.
+    
+    Args:
+        stations: Station names (keys of DAI_API)
+        days: Number of days to fetch per station
+        concurrency: Maximum number of simultaneous fetches
+    
+    Yields:
+        (station_name, draws) tuples in completion order
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_fetch_executor()
+    sem = asyncio.Semaphore(concurrency or HTTP_MAX_PER_HOST)
+    
+    async def fetch_one(station: str) -> Tuple[str, List[Dict]]:
+        async with sem:
+            try:
+                data = await loop.run_in_executor(executor, fetch_station_data, station, days)
+            except Exception as e:
+                logging.error(f"Error fetching data for {station}: {e}")
+                data = []
+            return station, data
+    
+    tasks = [asyncio.ensure_future(fetch_one(s)) for s in stations]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def fetch_stations(stations: List[str], days: int, concurrency: Optional[int] = None) -> Dict[str, List[Dict]]:
+    """
+    Blocking wrapper around fetch_stations_async.
+    
+    Returns:
+        Dict of station name -> draws; every requested station is a key,
+        with an empty list when its fetch failed or returned nothing
+    """
+    async def collect() -> Dict[str, List[Dict]]:
+        return {station: data async for station, data in fetch_stations_async(stations, days, concurrency)}
+    results = asyncio.run(collect())
+    failed = [station for station in stations if not results.get(station)]
+    for station in failed:
+        results[station] = []
+    if failed:
+        logging.warning(f"No draws for {len(failed)}/{len(stations)} stations: {', '.join(failed)}")
+    return results
+
+def fetch_html(url: str, max_retries: int = 3) -> Optional[str]:
+    """
+    Fetch a page's HTML text through the shared session.
+    
+    Returns:
+        Page text or None if failed
+    """
+    try:
+        return http_get(url, max_retries=max_retries).text
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Error loading {url}: {e}")
+        return None
+
 def fetch_url(url: str, max_retries: int = 3) -> BeautifulSoup:
     """
     Fetch URL with retry logic and better error handling.
@@ -190,22 +742,8 @@ def fetch_url(url: str, max_retries: int = 3) -> BeautifulSoup:
     Returns:
         BeautifulSoup object or None if failed
     """
-    for attempt in range(max_retries):
-        try:
-            r = requests.get(url, headers=HEADERS, timeout=10)
-            r.raise_for_status()
-            return BeautifulSoup(r.text, "html.parser")
-        except requests.exceptions.Timeout:
-            logging.warning(f"Timeout loading {url}, attempt {attempt + 1}/{max_retries}")
-            if attempt < max_retries - 1:
-                time.sleep(1)  # Wait before retry
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Error loading {url}: {e}")
-            if attempt < max_retries - 1:
-                time.sleep(1)
-            else:
-                return None
-    return None
+    text = fetch_html(url, max_retries=max_retries)
+    return BeautifulSoup(text, "html.parser") if text is not None else None
 
 def _normalize_date(date_str: str) -> str:
     """
@@ -222,129 +760,241 @@ def _normalize_date(date_str: str) -> str:
     except:
         return date_str
 
-def fetch_dien_toan(total_days: int) -> List[Dict]:
-    """Fetch Điện Toán 123 data with validation."""
-    soup = fetch_url(f"https://ketqua04.net/so-ket-qua-dien-toan-123/{total_days}")
+# === HTML PARSERS ===
+# "lxml": cây C + XPath nhắm thẳng vào result_div / result_tab_* / MainContent_dgv.
+# "bs4": BeautifulSoup + SoupStrainer, chỉ dựng các node cần thiết (dự phòng khi thiếu lxml).
+HTML_BACKEND = "lxml" if lxml_html is not None else "bs4"
+
+def _class_xpath(cls: str) -> str:
+    return f'contains(concat(" ", normalize-space(@class), " "), " {cls} ")'
+
+def _first_row(tbl) -> list:
+    """First <tr> of a table's <tbody> (or of the table itself when there is no tbody)."""
+    return (tbl.xpath("./tbody/tr") or tbl.xpath("./tr"))[:1]
+
+def _parse_dien_toan_lxml(text: str, total_days: int) -> List[Dict]:
     data = []
-    
-    if not soup:
-        logging.error("Failed to fetch Điện Toán data")
-        return data
+    tree = lxml_html.fromstring(text)
+    divs = tree.xpath(f'//div[@id="result_123" and {_class_xpath("result_div")}]')
+    for div in divs[:total_days]:
+        ds = div.xpath('.//span[@id="result_date"]')
+        date_raw = ds[0].text_content().strip() if ds else ""
         
-    try:
-        divs = soup.find_all("div", class_="result_div", id="result_123")
-        for div in divs[:total_days]:
-            ds = div.find("span", id="result_date")
-            date_raw = ds.text.strip() if ds else ""
+        if not date_raw:
+            continue
+        
+        date = _normalize_date(date_raw)
+        
+        tbl = div.xpath('.//table[@id="result_tab_123"]')
+        if tbl:
+            row = _first_row(tbl[0])
+            cells = row[0].xpath(".//td") if row else []
+            if len(cells) == 3:
+                nums = [c.text_content().strip() for c in cells]
+                # Validate numbers
+                if all(n.isdigit() for n in nums):
+                    data.append({"date": date, "dt_numbers": nums})
+    return data
+
+def _parse_dien_toan_soup(text: str, total_days: int) -> List[Dict]:
+    data = []
+    strainer = SoupStrainer("div", id="result_123")
+    soup = BeautifulSoup(text, "html.parser", parse_only=strainer)
+    divs = soup.find_all("div", class_="result_div", id="result_123")
+    for div in divs[:total_days]:
+        ds = div.find("span", id="result_date")
+        date_raw = ds.text.strip() if ds else ""
+        
+        if not date_raw:
+            continue
+        
+        date = _normalize_date(date_raw)
             
-            if not date_raw:
-                continue
+        tbl = div.find("table", id="result_tab_123")
+        if tbl:
+            body = tbl.find("tbody") or tbl
+            row = body.find("tr")
+            cells = row.find_all("td") if row else []
+            if len(cells) == 3:
+                nums = [c.text.strip() for c in cells]
+                # Validate numbers
+                if all(n.isdigit() for n in nums):
+                    data.append({"date": date, "dt_numbers": nums})
+    return data
+
+def _parse_than_tai_lxml(text: str, total_days: int) -> List[Dict]:
+    data = []
+    tree = lxml_html.fromstring(text)
+    divs = tree.xpath(f'//div[@id="result_tt4" and {_class_xpath("result_div")}]')
+    for div in divs[:total_days]:
+        ds = div.xpath('.//span[@id="result_date"]')
+        date_raw = ds[0].text_content().strip() if ds else ""
+        
+        if not date_raw:
+            continue
+        
+        date = _normalize_date(date_raw)
+        
+        tbl = div.xpath('.//table[@id="result_tab_tt4"]')
+        if tbl:
+            cell = tbl[0].xpath('.//td[@id="rs_0_0"]')
+            num = cell[0].text_content().strip() if cell else ""
+            # Validate: should be 4 digits
+            if num.isdigit() and len(num) == 4:
+                data.append({"date": date, "tt_number": num})
+    return data
+
+def _parse_than_tai_soup(text: str, total_days: int) -> List[Dict]:
+    data = []
+    strainer = SoupStrainer("div", id="result_tt4")
+    soup = BeautifulSoup(text, "html.parser", parse_only=strainer)
+    divs = soup.find_all("div", class_="result_div", id="result_tt4")
+    for div in divs[:total_days]:
+        ds = div.find("span", id="result_date")
+        date_raw = ds.text.strip() if ds else ""
+        
+        if not date_raw:
+            continue
+        
+        date = _normalize_date(date_raw)
             
-            date = _normalize_date(date_raw)
-                
-            tbl = div.find("table", id="result_tab_123")
-            if tbl:
-                row = tbl.find("tbody").find("tr")
-                cells = row.find_all("td") if row else []
-                if len(cells) == 3:
-                    nums = [c.text.strip() for c in cells]
-                    # Validate numbers
-                    if all(n.isdigit() for n in nums):
-                        data.append({"date": date, "dt_numbers": nums})
+        tbl = div.find("table", id="result_tab_tt4")
+        if tbl:
+            cell = tbl.find("td", id="rs_0_0")
+            num = cell.text.strip() if cell else ""
+            # Validate: should be 4 digits
+            if num.isdigit() and len(num) == 4:
+                data.append({"date": date, "tt_number": num})
+    return data
+
+def _clean_congcuxoso_cell(t: str) -> Optional[str]:
+    # Validate and clean data
+    if t and t not in ("-----", "\xa0") and t.replace(" ", "").isdigit():
+        return t.replace(" ", "").zfill(5)
+    return None
+
+def _parse_congcuxoso_lxml(text: str, total_days: int) -> List[str]:
+    nums = []
+    tree = lxml_html.fromstring(text)
+    tbl = tree.xpath('//table[@id="MainContent_dgv"]')
+    if tbl:
+        rows = tbl[0].xpath(".//tr")[1:]  # Skip header
+        for row in reversed(rows):
+            for cell in reversed(row.xpath(".//td")):
+                clean_num = _clean_congcuxoso_cell(cell.text_content().strip())
+                if clean_num:
+                    nums.append(clean_num)
+    return nums[:total_days]
+
+def _parse_congcuxoso_soup(text: str, total_days: int) -> List[str]:
+    nums = []
+    soup = BeautifulSoup(text, "html.parser", parse_only=SoupStrainer("table", id="MainContent_dgv"))
+    tbl = soup.find("table", id="MainContent_dgv")
+    if tbl:
+        rows = tbl.find_all("tr")[1:]  # Skip header
+        for row in reversed(rows):
+            for cell in reversed(row.find_all("td")):
+                clean_num = _clean_congcuxoso_cell(cell.text.strip())
+                if clean_num:
+                    nums.append(clean_num)
+    return nums[:total_days]
+
+_PARSERS = {
+    "dien_toan": {"lxml": _parse_dien_toan_lxml, "bs4": _parse_dien_toan_soup},
+    "than_tai": {"lxml": _parse_than_tai_lxml, "bs4": _parse_than_tai_soup},
+    "congcuxoso": {"lxml": _parse_congcuxoso_lxml, "bs4": _parse_congcuxoso_soup},
+}
+
+def parse_html(kind: str, text: str, total_days: int, backend: Optional[str] = None) -> list:
+    """
+    Parse a saved or downloaded ketqua04/congcuxoso page.
+    
+    Args:
+        kind: "dien_toan", "than_tai" or "congcuxoso"
+        text: Page HTML
+        total_days: Maximum number of results to return
+        backend: "lxml" or "bs4"; defaults to HTML_BACKEND
+    
+    Returns:
+        Parsed results (empty on parse error)
+    """
+    backend = backend or HTML_BACKEND
+    if backend == "lxml" and lxml_html is None:
+        backend = "bs4"
+    try:
+        return _PARSERS[kind][backend](text, total_days)
     except Exception as e:
-        logging.error(f"Error parsing Điện Toán data: {e}")
+        logging.error(f"Error parsing {kind} data ({backend}): {e}")
+        return []
+
+def fetch_dien_toan(total_days: int) -> List[Dict]:
+    """Fetch Điện Toán 123 data, backed by the local draw store."""
+    return _sync_from_store("dien_toan", "", total_days, _download_dien_toan)
+
+def _download_dien_toan(total_days: int, url: Optional[str] = None) -> List[Dict]:
+    """Download Điện Toán 123 data with validation (`url` overrides the page)."""
+    text = fetch_html(url or f"https://ketqua04.net/so-ket-qua-dien-toan-123/{total_days}")
     
-    return data
+    if not text:
+        logging.error("Failed to fetch Điện Toán data")
+        return []
+    
+    return parse_html("dien_toan", text, total_days)
 
 def fetch_than_tai(total_days: int) -> List[Dict]:
-    """Fetch Thần Tài data with validation."""
-    soup = fetch_url(f"https://ketqua04.net/so-ket-qua-than-tai/{total_days}")
-    data = []
+    """Fetch Thần Tài data, backed by the local draw store."""
+    return _sync_from_store("than_tai", "", total_days, _download_than_tai)
+
+def _download_than_tai(total_days: int, url: Optional[str] = None) -> List[Dict]:
+    """Download Thần Tài data with validation (`url` overrides the page)."""
+    text = fetch_html(url or f"https://ketqua04.net/so-ket-qua-than-tai/{total_days}")
     
-    if not soup:
+    if not text:
         logging.error("Failed to fetch Thần Tài data")
-        return data
-        
-    try:
-        divs = soup.find_all("div", class_="result_div", id="result_tt4")
-        for div in divs[:total_days]:
-            ds = div.find("span", id="result_date")
-            date_raw = ds.text.strip() if ds else ""
-            
-            if not date_raw:
-                continue
-            
-            date = _normalize_date(date_raw)
-                
-            tbl = div.find("table", id="result_tab_tt4")
-            if tbl:
-                cell = tbl.find("td", id="rs_0_0")
-                num = cell.text.strip() if cell else ""
-                # Validate: should be 4 digits
-                if num.isdigit() and len(num) == 4:
-                    data.append({"date": date, "tt_number": num})
-    except Exception as e:
-        logging.error(f"Error parsing Thần Tài data: {e}")
+        return []
     
-    return data
+    return parse_html("than_tai", text, total_days)
 
 def _parse_congcuxoso(url: str, total_days: int) -> List[str]:
     """Helper function to parse data from congcuxoso with validation."""
-    soup = fetch_url(url)
-    nums = []
+    text = fetch_html(url)
     
-    if not soup:
+    if not text:
         logging.error(f"Failed to fetch from {url}")
-        return nums
-        
-    try:
-        tbl = soup.find("table", id="MainContent_dgv")
-        if tbl:
-            rows = tbl.find_all("tr")[1:]  # Skip header
-            for row in reversed(rows):
-                cells = row.find_all("td")
-                for cell in reversed(cells):
-                    t = cell.text.strip()
-                    # Validate and clean data
-                    if t and t not in ("-----", "\xa0") and t.replace(" ", "").isdigit():
-                        clean_num = t.replace(" ", "").zfill(5)
-                        nums.append(clean_num)
-    except Exception as e:
-        logging.error(f"Error parsing congcuxoso data: {e}")
+        return []
     
-    return nums[:total_days]
+    return parse_html("congcuxoso", text, total_days)
 
 
-def fetch_xsmb_full(total_days: int) -> Tuple[List[str], List[str], List[List[str]], List[List[str]]]:
+def _download_xsmb(total_days: int, url: Optional[str] = None) -> List[Dict]:
     """
-    Fetch ĐB, G1, G7 and G6 from kqxs88.live API for Miền Bắc.
+    Download ĐB, G1, G7 and G6 for Miền Bắc from the kqxs88.live API.
+    
+    Args:
+        total_days: Number of draws to request (limitNum)
+        url: Request URL override (e.g. one page of a backfill)
     
     Returns:
-        Tuple of (ĐB numbers, G1 numbers, G7 numbers, G6 numbers)
-        G7 and G6 are lists of lists, where each inner list contains the numbers for that day
+        List of dicts with date, db, g1, g6 (list) and g7 (list), newest first
     """
-    url = f"https://www.kqxs88.live/api/front/open/lottery/history/list/game?limitNum={total_days}&gameCode=miba"
+    url = url or f"https://www.kqxs88.live/api/front/open/lottery/history/list/game?limitNum={total_days}&gameCode=miba"
     
     try:
-        response = requests.get(url, headers=HEADERS, timeout=10)
-        response.raise_for_status()
+        response = http_get(url)
         data = response.json()
         
         if not data.get("success"):
             logging.error("API returned error for Miền Bắc")
-            return [], [], []
+            return []
         
         issue_list = data.get("t", {}).get("issueList", [])
-        
-        db_numbers = []
-        g1_numbers = []
-        g7_numbers = []
-        g6_numbers = []
+        results = []
         
         for issue in issue_list[:total_days]:
+            turn_num = issue.get("turnNum", "")
             detail_str = issue.get("detail", "")
             
-            if not detail_str:
+            if not turn_num or not detail_str:
                 continue
             
             try:
@@ -370,20 +1020,44 @@ def fetch_xsmb_full(total_days: int) -> Tuple[List[str], List[str], List[List[st
                 if g6_str:
                     g6_list = [num.strip() for num in g6_str.split(",")]
                 
-                db_numbers.append(db)
-                g1_numbers.append(g1)
-                g7_numbers.append(g7_list)
-                g6_numbers.append(g6_list)
+                results.append({"date": turn_num, "db": db, "g1": g1, "g6": g6_list, "g7": g7_list})
                 
             except json.JSONDecodeError as e:
                 logging.error(f"Error parsing Miền Bắc detail: {e}")
                 continue
         
-        return db_numbers, g1_numbers, g7_numbers, g6_numbers
+        return results
         
     except requests.exceptions.RequestException as e:
         logging.error(f"Error fetching Miền Bắc data: {e}")
-        return [], [], []
+        return []
     except Exception as e:
         logging.error(f"Unexpected error for Miền Bắc: {e}")
-        return [], [], []
+        return []
+
+
+def fetch_xsmb(total_days: int) -> List[Dict]:
+    """
+    Fetch Miền Bắc draws, backed by the local draw store.
+    
+    Returns:
+        List of dicts with date, db, g1, g6 (list) and g7 (list), newest first
+    """
+    return _sync_from_store("xsmb", "", total_days, _download_xsmb)
+
+def fetch_xsmb_full(total_days: int) -> Tuple[List[str], List[str], List[List[str]], List[List[str]]]:
+    """
+    Fetch ĐB, G1, G7 and G6 for Miền Bắc, backed by the local draw store.
+    
+    Returns:
+        Tuple of (ĐB numbers, G1 numbers, G7 numbers, G6 numbers)
+        G7 and G6 are lists of lists, where each inner list contains the numbers for that day
+    """
+    records = fetch_xsmb(total_days)
+    
+    db_numbers = [r.get("db", "") for r in records]
+    g1_numbers = [r.get("g1", "") for r in records]
+    g7_numbers = [r.get("g7", []) for r in records]
+    g6_numbers = [r.get("g6", []) for r in records]
+    
+    return db_numbers, g1_numbers, g7_numbers, g6_numbers
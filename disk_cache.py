@@ -0,0 +1,334 @@
+import os
+import time
+import zlib
+import pickle
+import hashlib
+import logging
+import tempfile
+import threading
+import functools
+import inspect
+from typing import Callable, Optional, Tuple, Union
+
+# === CACHE TRÊN ĐĨA DÙNG CHUNG GIỮA CÁC TIẾN TRÌNH ===
+# Mỗi mục là một file <namespace>/<sha1 của khóa>.zpkl = zlib(pickle((created_at, value))).
+# - Ghi nguyên tử: ghi file tạm cùng thư mục rồi os.replace, tiến trình khác
+#   không bao giờ đọc phải file ghi dở.
+# - LRU: mtime là lần dùng cuối (chạm lại khi đọc trúng); khi tổng dung lượng
+#   vượt giới hạn thì xóa file cũ nhất trước.
+# - Namespace theo nguồn dữ liệu ("master", "station/An Giang", ...) để tải lại
+#   một nguồn chỉ xóa thư mục của nguồn đó.
+CACHE_DIR = os.environ.get(
+    "DISK_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cache"),
+)
+MAX_BYTES = int(os.environ.get("DISK_CACHE_MAX_MB", "256")) * 1024 * 1024
+COMPRESS_LEVEL = 6
+SUFFIX = ".zpkl"
+
+_MISSING = object()
+
+
+def _safe_part(part: str) -> str:
+    """Namespace part usable as a directory name."""
+    return "".join("_" if c in '\\:*?"<>|' else c for c in part).strip(". ") or "_"
+
+
+class DiskCache:
+    """
+    Compressed pickle cache in a directory shared by several processes.
+
+    Args:
+        directory: Cache root (default CACHE_DIR)
+        max_bytes: Total size above which the least recently used entries are removed
+        level: zlib compression level
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = MAX_BYTES,
+                 level: int = COMPRESS_LEVEL):
+        self.directory = directory or CACHE_DIR
+        self.max_bytes = max_bytes
+        self.level = level
+
+    def _namespace_dir(self, namespace: str) -> str:
+        return os.path.join(self.directory, *(_safe_part(p) for p in namespace.split("/") if p))
+
+    def _path(self, namespace: str, key) -> str:
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self._namespace_dir(namespace), digest + SUFFIX)
+
+    def get_entry(self, namespace: str, key) -> Optional[Tuple[float, object]]:
+        """(created_at, value) of `key` whether stale or not, None when missing or unreadable."""
+        path = self._path(namespace, key)
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.loads(zlib.decompress(f.read()))
+        except FileNotFoundError:
+            return None
+        except (OSError, zlib.error, pickle.UnpicklingError, EOFError, ValueError, TypeError) as e:
+            logging.warning(f"Disk cache entry {path} unreadable: {e}")
+            return None
+        try:
+            os.utime(path)  # đánh dấu vừa dùng (LRU)
+        except OSError:
+            pass
+        return entry
+
+    def get(self, namespace: str, key, ttl: Optional[float] = None, default=None,
+            expires: Optional[Callable[[float, object], float]] = None):
+        """
+        Cached value of `key`, or `default` when missing, stale or unreadable.
+
+        Args:
+            ttl: Entry is stale once older than `ttl` seconds
+            expires: Function (created_at, value) returning the time (epoch)
+                the entry becomes stale
+        """
+        entry = self.get_entry(namespace, key)
+        if entry is None or time.time() >= _stale_at(entry, ttl, expires):
+            return default
+        return entry[1]
+
+    def set(self, namespace: str, key, value) -> bool:
+        """Store `value` atomically; returns False if it could not be written."""
+        path = self._path(namespace, key)
+        tmp = None
+        try:
+            data = zlib.compress(pickle.dumps((time.time(), value), protocol=pickle.HIGHEST_PROTOCOL), self.level)
+            directory = os.path.dirname(path)
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            tmp = None
+        except (OSError, pickle.PicklingError, TypeError, AttributeError) as e:
+            logging.error(f"Could not write disk cache entry {path}: {e}")
+            return False
+        finally:
+            if tmp is not None:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+        self.evict()
+        return True
+
+    def _entries(self):
+        """(mtime, size, path) of every entry under the cache root."""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(SUFFIX):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue  # tiến trình khác vừa xóa
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def size(self) -> int:
+        """Total bytes of all entries."""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> int:
+        """Remove least recently used entries until the total fits max_bytes; returns entries removed."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def invalidate(self, namespace: Optional[str] = None) -> int:
+        """
+        Remove the entries of one namespace (and its sub-namespaces), or of all when None.
+
+        Returns:
+            Number of entries removed
+        """
+        directory = self.directory if namespace is None else self._namespace_dir(namespace)
+        removed = 0
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if name.endswith(SUFFIX):
+                    try:
+                        os.remove(os.path.join(root, name))
+                        removed += 1
+                    except OSError:
+                        pass
+        return removed
+
+
+_default_cache = None
+
+
+def get_cache() -> DiskCache:
+    """The process-wide DiskCache on CACHE_DIR."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = DiskCache()
+    return _default_cache
+
+
+def _stale_at(entry: Tuple[float, object], ttl: Optional[float],
+              expires: Optional[Callable[[float, object], float]]) -> float:
+    created_at, value = entry
+    stale_at = float("inf")
+    if ttl is not None:
+        stale_at = created_at + ttl
+    if expires is not None:
+        stale_at = min(stale_at, expires(created_at, value))
+    return stale_at
+
+
+# Khóa đang được làm mới nền (stale-while-revalidate), mỗi khóa một luồng
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _refresh_in_background(key: Tuple, refresh: Callable[[], object]) -> None:
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def run():
+        try:
+            refresh()
+        except Exception as e:
+            logging.error(f"Background refresh of {key[:2]} failed: {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    threading.Thread(target=run, name="cache-refresh", daemon=True).start()
+
+
+def _take_rows(value, n: int):
+    """First `n` rows of a history: list / DataFrame slice, or per key of a dict of histories."""
+    if isinstance(value, dict):
+        return {k: _take_rows(v, n) for k, v in value.items()}
+    return value[:n]
+
+
+def cached(namespace: Union[str, Callable[..., str]], ttl: Optional[float] = None,
+           cache: Optional[DiskCache] = None, expires: Optional[Callable[..., float]] = None,
+           stale_while_revalidate: Optional[float] = None, depth: Optional[str] = None,
+           take: Callable[[object, int], object] = _take_rows, version: int = 0) -> Callable:
+    """
+    Decorator caching a function's result on disk, keyed by its arguments.
+
+    Args:
+        namespace: Namespace name, or a function of the call arguments
+            returning it (e.g. one namespace per station)
+        ttl: Seconds an entry stays valid (None: until invalidated)
+        cache: DiskCache to use (default get_cache())
+        expires: Function (created_at, value, *args, **kwargs) -> epoch time
+            the entry becomes stale, for validity that depends on the
+            arguments or the data
+        stale_while_revalidate: Seconds after going stale during which the
+            old value is still returned while one background thread
+            recomputes it (callers never wait on a refresh)
+        depth: Name of a history-length argument (e.g. "num_days") left out
+            of the key: one entry holds the deepest history fetched so far
+            and shorter requests are served from it with `take`
+        take: Function (value, n) -> the newest n rows of a value (default:
+            slice lists / DataFrames, and each entry of a dict of them)
+        version: Format of the stored value; bump it when the function starts
+            returning another type so entries written before are not read back
+
+    Empty results (empty DataFrame / list / dict) are returned but not
+    stored, so a failed fetch is retried on the next call.
+    The wrapper's refresh(*args, **kwargs) recomputes and stores the value
+    unconditionally (used by the prefetch scheduler); with `depth` it keeps
+    at least the depth already stored.
+    """
+    def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func) if depth else None
+
+        def locate(args, kwargs):
+            """(namespace, key, requested depth, function of a depth computing the value)."""
+            ns = namespace(*args, **kwargs) if callable(namespace) else namespace
+            name = (func.__module__, func.__qualname__) + ((version,) if version else ())
+            if signature is None:
+                key = name + (args, tuple(sorted(kwargs.items())))
+                return ns, key, None, lambda n: func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            requested = int(bound.arguments[depth])
+            key = name + (tuple((k, v) for k, v in bound.arguments.items() if k != depth),)
+
+            def compute(n: int):
+                bound.arguments[depth] = n
+                return func(*bound.args, **bound.kwargs)
+            return ns, key, requested, compute
+
+        def store(ns, key, have, value) -> None:
+            if not _is_empty(value):
+                (cache or get_cache()).set(ns, key, value if have is None else (have, value))
+
+        def refresh(*args, **kwargs):
+            ns, key, requested, compute = locate(args, kwargs)
+            if requested is None:
+                value = compute(None)
+                store(ns, key, None, value)
+                return value
+            # Không làm nông lịch sử đã có
+            entry = (cache or get_cache()).get_entry(ns, key)
+            have = max(requested, entry[1][0]) if entry is not None else requested
+            value = compute(have)
+            store(ns, key, have, value)
+            return take(value, requested)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            ns, key, requested, compute = locate(args, kwargs)
+            entry = (cache or get_cache()).get_entry(ns, key)
+            if entry is not None:
+                created_at, value = entry
+                if requested is not None:
+                    have, value = value
+                    if have < requested:
+                        # Cần lịch sử sâu hơn bản đang giữ: tải lại ở độ sâu mới
+                        value = compute(requested)
+                        store(ns, key, requested, value)
+                        return value
+                    value = take(value, requested)
+                expiry = None if expires is None else \
+                    lambda created, val: expires(created, val, *args, **kwargs)
+                stale_at = _stale_at((created_at, value), ttl, expiry)
+                now = time.time()
+                if now < stale_at:
+                    return value
+                if stale_while_revalidate is not None and now < stale_at + stale_while_revalidate:
+                    _refresh_in_background((ns,) + key, lambda: refresh(*args, **kwargs))
+                    return value
+            return refresh(*args, **kwargs)
+
+        wrapper.refresh = refresh
+        return wrapper
+    return decorator
+
+
+def _is_empty(value) -> bool:
+    if value is None:
+        return True
+    if isinstance(value, dict):
+        return all(_is_empty(v) for v in value.values())
+    empty = getattr(value, "empty", None)
+    if isinstance(empty, bool):
+        return empty
+    try:
+        return len(value) == 0
+    except TypeError:
+        return False
@@ -0,0 +1,410 @@
+import hashlib
+import functools
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import List, Dict, Iterable, Optional, Tuple
+
+# === COLUMNAR DRAW HISTORY ===
+# Thay cho list[dict[str, str]] / DataFrame kiểu object:
+#   - days: int32 day ordinal (date.toordinal()), mỗi kỳ quay một dòng
+#   - station: int16 mã đài (index vào station_names)
+#   - mỗi giải: mảng phẳng numbers (int32) / widths (int8, số chữ số) + offsets
+#     (int32), kỳ thứ i sở hữu numbers[offsets[i]:offsets[i + 1]]; 2 / 3 số cuối
+#     là phép chia lấy dư, -1 = số ngắn hơn 3 chữ số.
+# load_master_data / load_region_data (và cache đĩa) trả DrawColumns; bảng tổng
+# (analysis.build_master_table) và StationGrid dựng từ đó.
+
+STATION_PRIZES = ["db", "g1", "g2", "g3", "g4", "g5", "g6", "g7", "g8"]
+# Khóa kết quả fetch_station_data tự suy ra (chỉ 2 số cuối): MN/MT không có *_3so
+STATION_RESULT_KEYS = ["db_2so", "g1_2so", "g8_2so", "g7_2so"]
+MASTER_PRIZES = ["db", "g1", "g7", "g6"]
+MASTER_STATION = "XSMB"
+
+
+def parse_day(date_str: str) -> int:
+    """Convert 'dd/mm/YYYY' to a day ordinal, -1 if unparseable."""
+    try:
+        return datetime.strptime(date_str, "%d/%m/%Y").toordinal()
+    except (ValueError, TypeError):
+        return -1
+
+
+def parse_days(dates: Iterable) -> np.ndarray:
+    """Vectorized parse_day: int64 day ordinals, -1 where unparseable."""
+    parsed = pd.to_datetime(pd.Series(list(dates), dtype=object), format="%d/%m/%Y", errors="coerce")
+    days = (parsed - pd.Timestamp("1970-01-01")).dt.days + date(1970, 1, 1).toordinal()
+    return days.fillna(-1).to_numpy(dtype=np.int64)
+
+
+def format_day(day: int) -> str:
+    """Convert a day ordinal back to 'dd/mm/YYYY'."""
+    return datetime.fromordinal(int(day)).strftime("%d/%m/%Y")
+
+
+def weekday(days) -> np.ndarray:
+    """Weekday (Mon=0 .. Sun=6) of day ordinals; ordinal 1 (01/01/0001) is a Monday."""
+    return (np.asarray(days) + 6) % 7
+
+
+@dataclass
+class DayIndex:
+    """
+    Dense day ordinal -> row position lookup.
+
+    rows[day - first] is the first row drawn on `day`, or -1 when there is
+    no draw that day, so "date + k days" is plain integer indexing.
+    """
+    first: int
+    rows: np.ndarray
+
+    @classmethod
+    def build(cls, days: np.ndarray) -> "DayIndex":
+        days = np.asarray(days, dtype=np.int64)
+        valid = days >= 0
+        if not valid.any():
+            return cls(first=0, rows=np.zeros(0, dtype=np.int32))
+        first = int(days[valid].min())
+        rows = np.full(int(days[valid].max()) - first + 1, -1, dtype=np.int32)
+        positions = np.flatnonzero(valid)
+        # Ghi ngược để dòng đầu tiên của mỗi ngày thắng (giống .iloc[0])
+        rows[days[positions[::-1]] - first] = positions[::-1]
+        return cls(first=first, rows=rows)
+
+    def lookup(self, days) -> np.ndarray:
+        """Row positions for an array of day ordinals, -1 where absent."""
+        offset = np.asarray(days, dtype=np.int64) - self.first
+        if not len(self.rows):
+            return np.full(offset.shape, -1, dtype=np.int32)
+        inside = (offset >= 0) & (offset < len(self.rows))
+        return np.where(inside, self.rows[np.clip(offset, 0, len(self.rows) - 1)], -1)
+
+
+def split_numbers(value) -> List[str]:
+    """Normalize a prize cell (string, comma-separated string or list) to a list of numbers."""
+    if isinstance(value, (list, tuple, np.ndarray)):
+        items = value
+    elif isinstance(value, str):
+        items = value.split(",")
+    else:
+        return []
+    return [str(v).strip() for v in items if isinstance(v, str) and v.strip() and v.strip().isdigit()]
+
+
+@dataclass
+class PrizeColumn:
+    """
+    One prize across all draws, stored flat with per-draw offsets.
+
+    Each number is kept as its value (int32) and digit count (int8), so the
+    last 2 / 3 digits are plain arithmetic and the full number, leading
+    zeros included, can be written back out.
+    """
+    numbers: np.ndarray
+    widths: np.ndarray
+    offsets: np.ndarray
+
+    @classmethod
+    def from_cells(cls, cells: Iterable) -> "PrizeColumn":
+        numbers, widths, offsets = [], [], [0]
+        for cell in cells:
+            for num in split_numbers(cell):
+                numbers.append(int(num))
+                widths.append(len(num))
+            offsets.append(len(numbers))
+        return cls(
+            numbers=np.asarray(numbers, dtype=np.int32),
+            widths=np.asarray(widths, dtype=np.int8),
+            offsets=np.asarray(offsets, dtype=np.int32),
+        )
+
+    @property
+    def last2(self) -> np.ndarray:
+        return self.numbers % 100
+
+    @property
+    def last3(self) -> np.ndarray:
+        """Last 3 digits, -1 for numbers shorter than 3 digits."""
+        return np.where(self.widths >= 3, self.numbers % 1000, -1)
+
+    def values(self, digits: int = 2) -> np.ndarray:
+        return self.last3 if digits == 3 else self.last2
+
+    def counts(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def owners(self) -> np.ndarray:
+        """Draw index of every flat value."""
+        return np.repeat(np.arange(len(self.offsets) - 1, dtype=np.int32), self.counts())
+
+    def row(self, i: int, digits: int = 2) -> np.ndarray:
+        return self.values(digits)[self.offsets[i]:self.offsets[i + 1]]
+
+    def texts(self) -> List[List[str]]:
+        """Full numbers of every draw as strings, leading zeros kept."""
+        flat = [f"{n:0{w}d}" for n, w in zip(self.numbers.tolist(), self.widths.tolist())]
+        bounds = self.offsets.tolist()
+        return [flat[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def last(self, digits: int = 2) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Last `digits` digits of the last number of every draw.
+
+        Returns:
+            (codes, widths): -1 / 0 for draws without a number; widths is the
+            number of digits the code is written with
+        """
+        has = self.counts() > 0
+        idx = self.offsets[1:][has] - 1
+        modulo = 10 ** digits
+        codes = np.full(len(has), -1, dtype=np.int32)
+        widths = np.zeros(len(has), dtype=np.int8)
+        codes[has] = self.numbers[idx] % modulo
+        widths[has] = np.minimum(self.widths[idx], digits)
+        return codes, widths
+
+    def take(self, idx: np.ndarray) -> "PrizeColumn":
+        """Gather the values of draws `idx` into a new column."""
+        idx = np.asarray(idx, dtype=np.int64)
+        counts = self.counts()[idx]
+        offsets = np.zeros(len(idx) + 1, dtype=np.int32)
+        np.cumsum(counts, out=offsets[1:])
+        gather = np.repeat(self.offsets[idx].astype(np.int64) - offsets[:-1], counts) + np.arange(offsets[-1])
+        return PrizeColumn(numbers=self.numbers[gather], widths=self.widths[gather], offsets=offsets)
+
+    @property
+    def nbytes(self) -> int:
+        return self.numbers.nbytes + self.widths.nbytes + self.offsets.nbytes
+
+
+@dataclass
+class DrawColumns:
+    """
+    Typed, columnar draw history for one region (or the Miền Bắc master table).
+
+    Rows are draws ordered newest first, ties broken by station order.
+    `sources` marks, for the master table, which rows have a Thần Tài /
+    XSMB record (a row without one is not the same as empty prizes).
+    """
+    days: np.ndarray
+    station: np.ndarray
+    station_names: List[str]
+    prizes: Dict[str, PrizeColumn]
+    sources: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    @property
+    def nbytes(self) -> int:
+        total = self.days.nbytes + self.station.nbytes
+        total += sum(p.nbytes for p in self.prizes.values())
+        total += sum(s.nbytes for s in self.sources.values())
+        return total
+
+    def dates(self) -> List[str]:
+        return [format_day(d) for d in self.days]
+
+    @functools.cached_property
+    def fingerprint(self) -> str:
+        """Digest of the whole content, to key what is built from it."""
+        digest = hashlib.sha1("\x1f".join(self.station_names).encode("utf-8"))
+        arrays = [self.days, self.station]
+        for name in sorted(self.prizes):
+            col = self.prizes[name]
+            digest.update(name.encode("utf-8"))
+            arrays += [col.numbers, col.widths, col.offsets]
+        for name in sorted(self.sources):
+            digest.update(name.encode("utf-8"))
+            arrays.append(self.sources[name])
+        for arr in arrays:
+            digest.update(np.ascontiguousarray(arr).tobytes())
+        return digest.hexdigest()
+
+    def station_rows(self, name: str) -> np.ndarray:
+        """Rows of one station, newest first (empty if unknown)."""
+        if name not in self.station_names:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(self.station == self.station_names.index(name))
+
+    def latest_dates(self) -> Dict[str, Optional[str]]:
+        """Newest draw date of every station (None without draws)."""
+        latest = {}
+        for code, name in enumerate(self.station_names):
+            rows = np.flatnonzero(self.station == code)
+            latest[name] = format_day(self.days[rows[0]]) if len(rows) else None
+        return latest
+
+    def newest(self, n: int) -> "DrawColumns":
+        """The newest `n` draws of every station."""
+        rank = np.zeros(len(self.days), dtype=np.int64)
+        for code in np.unique(self.station):
+            rows = np.flatnonzero(self.station == code)
+            rank[rows] = np.arange(len(rows))
+        return self.take(rank < n)
+
+    def take(self, idx: np.ndarray) -> "DrawColumns":
+        """Select draws by position (or boolean mask)."""
+        idx = np.asarray(idx)
+        if idx.dtype == bool:
+            idx = np.flatnonzero(idx)
+        return DrawColumns(
+            days=self.days[idx],
+            station=self.station[idx],
+            station_names=self.station_names,
+            prizes={name: col.take(idx) for name, col in self.prizes.items()},
+            sources={name: arr[idx] for name, arr in self.sources.items()},
+        )
+
+
+def result_key(key: str) -> Optional[Tuple[str, int]]:
+    """(prize, digits) of a fetch_station_data result key like 'db_2so', None for other keys."""
+    if key not in STATION_RESULT_KEYS:
+        return None
+    prize, digits = key.split("_")
+    return prize, int(digits[0])
+
+
+class StationGrid:
+    """
+    Per-day, per-station results of a region ("Tất cả" mode), built once per dataset.
+
+    A date index (unique dates, newest first) plus, for each result key
+    (e.g. 'db_2so'), a (days × stations) int32 code matrix, -1 = no value.
+    Codes are built on first use of a key, so switching the compared prize
+    is a column selection.
+    """
+
+    def __init__(self, columns: DrawColumns):
+        self.stations = list(columns.station_names)
+        self._draws = columns
+        self.days = np.unique(columns.days.astype(np.int64))[::-1]
+        self.dates = [format_day(d) for d in self.days]
+        # Dòng của từng kỳ trong lưới (ngày giảm dần)
+        self._row = np.searchsorted(-self.days, -columns.days.astype(np.int64))
+        self._columns: Dict[str, np.ndarray] = {}
+        self._widths: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def column(self, key: str) -> np.ndarray:
+        """(days × stations) codes of one result key."""
+        codes = self._columns.get(key)
+        if codes is None:
+            codes = np.full((len(self.dates), len(self.stations)), -1, dtype=np.int32)
+            widths = np.zeros(codes.shape, dtype=np.int8)
+            parsed = result_key(key)
+            prize = self._draws.prizes.get(parsed[0]) if parsed else None
+            if prize is not None:
+                draw_codes, draw_widths = prize.last(parsed[1])
+                has = draw_codes >= 0
+                rows, stations = self._row[has], self._draws.station[has]
+                codes[rows, stations] = draw_codes[has]
+                widths[rows, stations] = draw_widths[has]
+            self._widths[key] = widths
+            self._columns[key] = codes
+        return codes
+
+    def results(self, key: str, rows: np.ndarray) -> List[List[Dict]]:
+        """[{station, val}] of each row in `rows`, stations in input order (leading zeros kept)."""
+        codes = self.column(key)[rows]
+        widths = self._widths[key][rows]
+        r_idx, s_idx = np.nonzero(codes != -1)
+        out = [[] for _ in range(len(rows))]
+        for r, s, code, width in zip(r_idx.tolist(), s_idx.tolist(),
+                                     codes[r_idx, s_idx].tolist(), widths[r_idx, s_idx].tolist()):
+            out[r].append({'station': self.stations[s], 'val': f"{code:0{width}d}"})
+        return out
+
+
+def _empty(station_names: List[str], prizes: Iterable[str], sources: Iterable[str] = ()) -> DrawColumns:
+    return DrawColumns(
+        days=np.zeros(0, dtype=np.int32),
+        station=np.zeros(0, dtype=np.int16),
+        station_names=station_names,
+        prizes={p: PrizeColumn.from_cells([]) for p in prizes},
+        sources={s: np.zeros(0, dtype=bool) for s in sources},
+    )
+
+
+def from_station_records(records_by_station: Dict[str, List[Dict]],
+                         prizes: Optional[List[str]] = None) -> DrawColumns:
+    """
+    Build columns from fetch_station_data output for several stations.
+
+    Args:
+        records_by_station: Station name -> list of draw dicts
+        prizes: Prize keys to keep (default: all of STATION_PRIZES)
+
+    Returns:
+        DrawColumns with one row per (station, date) draw, stations in input order
+    """
+    prizes = prizes or STATION_PRIZES
+    station_names = list(records_by_station)
+
+    rows = []
+    for code, records in enumerate(records_by_station.values()):
+        for rec in records:
+            day = parse_day(rec.get("date", ""))
+            if day >= 0:
+                rows.append((day, code, rec))
+    rows.sort(key=lambda r: (-r[0], r[1]))
+    if not rows:
+        return _empty(station_names, prizes)
+
+    return DrawColumns(
+        days=np.asarray([r[0] for r in rows], dtype=np.int32),
+        station=np.asarray([r[1] for r in rows], dtype=np.int16),
+        station_names=station_names,
+        prizes={p: PrizeColumn.from_cells(r[2].get(p, "") for r in rows) for p in prizes},
+    )
+
+
+def from_master(dt: List[Dict], tt: List[Dict], xsmb: List[Dict]) -> DrawColumns:
+    """
+    Build the Miền Bắc master columns from fetched Điện Toán, Thần Tài and XSMB draws.
+
+    Rows follow the Điện Toán draws; Thần Tài and XSMB are joined by day
+    ordinal (first record of a day wins), so a draw missing from one source
+    only leaves that row empty instead of shifting the later rows.
+
+    Returns:
+        DrawColumns with prizes 'dt', 'tt' and MASTER_PRIZES and source masks
+        'tt' / 'xsmb'; empty if Điện Toán or XSMB has no draws
+    """
+    prizes = ["dt", "tt"] + MASTER_PRIZES
+    if not dt or not xsmb:
+        return _empty([MASTER_STATION], prizes, ["tt", "xsmb"])
+
+    def by_day(records: List[Dict]) -> Dict[int, Dict]:
+        joined = {}
+        for rec, day in zip(records, parse_days(rec.get("date", "") for rec in records).tolist()):
+            if day >= 0:
+                joined.setdefault(day, rec)
+        return joined
+
+    days = parse_days(rec.get("date", "") for rec in dt)
+    rows = [(day, rec) for day, rec in zip(days.tolist(), dt) if day >= 0]
+    tt_of, mb_of = by_day(tt), by_day(xsmb)
+    tt_rows = [tt_of.get(day) for day, _ in rows]
+    mb_rows = [mb_of.get(day) for day, _ in rows]
+
+    prize_columns = {
+        "dt": PrizeColumn.from_cells(rec.get("dt_numbers") for _, rec in rows),
+        "tt": PrizeColumn.from_cells(rec.get("tt_number") if rec else None for rec in tt_rows),
+    }
+    for prize in MASTER_PRIZES:
+        prize_columns[prize] = PrizeColumn.from_cells(rec.get(prize) if rec else None for rec in mb_rows)
+
+    return DrawColumns(
+        days=np.asarray([day for day, _ in rows], dtype=np.int32),
+        station=np.zeros(len(rows), dtype=np.int16),
+        station_names=[MASTER_STATION],
+        prizes=prize_columns,
+        sources={
+            "tt": np.asarray([rec is not None for rec in tt_rows], dtype=bool),
+            "xsmb": np.asarray([rec is not None for rec in mb_rows], dtype=bool),
+        },
+    )
@@ -0,0 +1,231 @@
+import sqlite3
+import json
+import os
+import threading
+import logging
+from datetime import datetime, date
+from typing import List, Dict, Optional
+
+# === LOCAL DRAW STORE ===
+# Một bảng SQLite duy nhất, khóa theo (source, station, day).
+# day = date.toordinal() để sort/so sánh bằng số nguyên thay vì chuỗi dd/mm/YYYY.
+STORE_PATH = os.environ.get(
+    "DRAW_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "draws.sqlite3"),
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS draws (
+    source  TEXT    NOT NULL,
+    station TEXT    NOT NULL,
+    day     INTEGER NOT NULL,
+    date    TEXT    NOT NULL,
+    payload TEXT    NOT NULL,
+    PRIMARY KEY (source, station, day)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    source    TEXT    NOT NULL,
+    station   TEXT    NOT NULL,
+    depth     INTEGER NOT NULL,
+    synced_at TEXT    NOT NULL,
+    PRIMARY KEY (source, station)
+);
+"""
+
+_init_lock = threading.Lock()
+_initialized = set()
+
+
+def date_to_day(date_str: str) -> int:
+    """Convert 'dd/mm/YYYY' to a day ordinal."""
+    return datetime.strptime(date_str, "%d/%m/%Y").toordinal()
+
+
+def today_day() -> int:
+    return date.today().toordinal()
+
+
+def ensure_store_dir(path: Optional[str] = None) -> None:
+    directory = os.path.dirname(path or STORE_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+
+def _connect(path: Optional[str] = None) -> sqlite3.Connection:
+    """
+    Open a connection to the store, creating the schema on first use.
+
+    A fresh connection per call keeps the store safe to use from the
+    fetcher thread pools; WAL mode lets readers run alongside a writer.
+    """
+    path = path or STORE_PATH
+    ensure_store_dir(path)
+    conn = sqlite3.connect(path, timeout=30)
+    if path not in _initialized:
+        with _init_lock:
+            if path not in _initialized:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+                conn.commit()
+                _initialized.add(path)
+    return conn
+
+
+def save_draws(source: str, station: str, records: List[Dict], path: Optional[str] = None) -> int:
+    """
+    Insert or replace draw records for one (source, station).
+
+    Args:
+        source: Data source key (e.g. "kqxs88", "xsmb", "dien_toan", "than_tai")
+        station: Station name, "" for single-station sources
+        records: Records with a 'date' key ('dd/mm/YYYY'); other keys go to payload
+
+    Returns:
+        Number of rows written
+    """
+    rows = []
+    for rec in records:
+        date_str = rec.get("date", "")
+        try:
+            day = date_to_day(date_str)
+        except (ValueError, TypeError):
+            logging.warning(f"Skipping record with bad date for {source}/{station}: {date_str!r}")
+            continue
+        payload = {k: v for k, v in rec.items() if k != "date"}
+        rows.append((source, station, day, date_str, json.dumps(payload, ensure_ascii=False)))
+
+    if not rows:
+        return 0
+
+    conn = _connect(path)
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO draws (source, station, day, date, payload) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+    finally:
+        conn.close()
+    return len(rows)
+
+
+def load_draws(source: str, station: str, limit: int, path: Optional[str] = None) -> List[Dict]:
+    """
+    Load the newest `limit` draws for one (source, station), newest first.
+
+    Matches the ordering returned by the kqxs88/ketqua04 sources.
+    """
+    conn = _connect(path)
+    try:
+        cur = conn.execute(
+            "SELECT date, payload FROM draws WHERE source = ? AND station = ? ORDER BY day DESC LIMIT ?",
+            (source, station, int(limit)),
+        )
+        records = []
+        for date_str, payload in cur:
+            rec = {"date": date_str}
+            rec.update(json.loads(payload))
+            records.append(rec)
+        return records
+    finally:
+        conn.close()
+
+
+def latest_day(source: str, station: str, path: Optional[str] = None) -> Optional[int]:
+    """Return the day ordinal of the newest stored draw, or None if empty."""
+    conn = _connect(path)
+    try:
+        row = conn.execute(
+            "SELECT MAX(day) FROM draws WHERE source = ? AND station = ?",
+            (source, station),
+        ).fetchone()
+        return row[0] if row and row[0] is not None else None
+    finally:
+        conn.close()
+
+
+def day_at(source: str, station: str, index: int, path: Optional[str] = None) -> Optional[int]:
+    """Day ordinal of the `index`-th newest stored draw (0 = newest), None if there are fewer."""
+    conn = _connect(path)
+    try:
+        row = conn.execute(
+            "SELECT day FROM draws WHERE source = ? AND station = ? ORDER BY day DESC LIMIT 1 OFFSET ?",
+            (source, station, int(index)),
+        ).fetchone()
+        return row[0] if row else None
+    finally:
+        conn.close()
+
+
+def synced_depth(source: str, station: str, path: Optional[str] = None) -> int:
+    """Return the deepest history (in draws) ever requested from the network."""
+    conn = _connect(path)
+    try:
+        row = conn.execute(
+            "SELECT depth FROM sync_state WHERE source = ? AND station = ?",
+            (source, station),
+        ).fetchone()
+        return row[0] if row else 0
+    finally:
+        conn.close()
+
+
+def mark_synced(source: str, station: str, depth: int, path: Optional[str] = None,
+                reset: bool = False) -> None:
+    """
+    Record a successful sync; depth only ever grows unless `reset`.
+
+    Args:
+        reset: Set depth to exactly `depth`, for a sync whose new draws do
+            not reach the stored ones (only the newest `depth` rows are
+            contiguous, older rows sit behind a gap)
+    """
+    conn = _connect(path)
+    try:
+        with conn:
+            conn.execute(
+                f"""INSERT INTO sync_state (source, station, depth, synced_at) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(source, station) DO UPDATE SET
+                       depth = {"excluded.depth" if reset else "MAX(depth, excluded.depth)"},
+                       synced_at = excluded.synced_at""",
+                (source, station, int(depth), datetime.now().isoformat(timespec="seconds")),
+            )
+    finally:
+        conn.close()
+
+
+def forget_synced(source: Optional[str] = None, station: Optional[str] = None,
+                  path: Optional[str] = None) -> None:
+    """
+    Reset the sync depth (all, one source, or one station of it) but keep the draws.
+
+    The next sync downloads the full requested history again and replaces
+    the stored rows, so late or corrected results are picked up; older
+    backfilled rows stay in the store.
+    """
+    conn = _connect(path)
+    try:
+        with conn:
+            if source is None:
+                conn.execute("DELETE FROM sync_state")
+            elif station is None:
+                conn.execute("DELETE FROM sync_state WHERE source = ?", (source,))
+            else:
+                conn.execute("DELETE FROM sync_state WHERE source = ? AND station = ?", (source, station))
+    finally:
+        conn.close()
+
+
+def clear(source: Optional[str] = None, path: Optional[str] = None) -> None:
+    """Drop stored draws (all, or for one source) so the next sync refetches."""
+    conn = _connect(path)
+    try:
+        with conn:
+            if source is None:
+                conn.execute("DELETE FROM draws")
+                conn.execute("DELETE FROM sync_state")
+            else:
+                conn.execute("DELETE FROM draws WHERE source = ?", (source,))
+                conn.execute("DELETE FROM sync_state WHERE source = ?", (source,))
+    finally:
+        conn.close()
@@ -0,0 +1,202 @@
+import os
+import logging
+import multiprocessing
+import concurrent.futures
+from dataclasses import dataclass, asdict
+from typing import List, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+import analysis
+import data_fetcher
+import draw_columns
+import matrix_engine
+
+# === DÒ THAM SỐ (GRID SEARCH) ===
+# Chạy mọi tổ hợp Nguồn × Giải × 2D/3D × Đài trên một process pool.
+# Dữ liệu được tải một lần (qua draw store) ở tiến trình cha rồi gửi cho
+# mỗi worker đúng một lần qua initializer, worker không tự tải lại.
+
+
+@dataclass(frozen=True)
+class GridConfig:
+    """One configuration of render_matrix_view (day filter is always "Tất cả")."""
+    region: str
+    station: str
+    src_mode: str
+    prize: str
+    mode_3d: bool
+
+
+def grid_configs(regions: Optional[List[str]] = None, per_station: bool = True) -> List[GridConfig]:
+    """
+    Every combination of source × prize × 2D/3D × station (3D only for
+    Miền Bắc, the only region whose records carry 3-digit results).
+
+    Args:
+        regions: Regions to search (default: all of analysis.REGIONS)
+        per_station: Also evaluate each Miền Nam/Trung station on its own,
+            not only the whole region ("Tất cả")
+
+    Returns:
+        List of GridConfig
+    """
+    configs = []
+    for region in regions or analysis.REGIONS:
+        if region == "Miền Bắc":
+            stations = [analysis.ALL]
+        else:
+            stations = [analysis.ALL]
+            if per_station:
+                stations += data_fetcher.get_all_stations_in_region(region)
+        # Bản ghi đài Miền Nam/Trung không có trường _3so: cấu hình 3D không bao giờ có dữ liệu
+        modes = (False, True) if region == "Miền Bắc" else (False,)
+        for station in stations:
+            for mode_3d in modes:
+                for prize in analysis.prize_options(region, mode_3d):
+                    for src_mode in analysis.SOURCES:
+                        configs.append(GridConfig(region, station, src_mode, prize, mode_3d))
+    return configs
+
+
+def evaluate(config: GridConfig, df_full: pd.DataFrame,
+             region_data: Dict[str, draw_columns.DrawColumns], max_cols: int = 20) -> Optional[Dict]:
+    """
+    Hit rates and cycle stats of one configuration.
+
+    Args:
+        config: Configuration to evaluate
+        df_full: Master table (analysis.build_master_table)
+        region_data: Region -> draws of its stations (analysis.load_region_data)
+
+    Returns:
+        Dict of the config fields plus rows, checks, hits, hit_rate (current
+        window), sweep_offsets, sweep_checks, sweep_hits, sweep_hit_rate (every
+        backtest offset), pending, priority and avg_cycle; None without data
+    """
+    view = analysis.make_view(config.region, config.src_mode, config.mode_3d, config.prize, df_full,
+                              region_data.get(config.region), station=config.station, max_cols=max_cols)
+    if view is None:
+        return None
+    days_data = analysis.build_days_data(view, 0, min(analysis.WINDOW_ROWS, len(view.df_region)))
+    if not days_data:
+        return None
+
+    matrix = analysis.build_matrix(view, days_data)
+    stats = matrix_engine.summarize(matrix)
+    priority, avg_cycles = 0, []
+    for r in range(matrix.shape[0]):
+        hits, misses = matrix_engine.cycle_hits(matrix, r)
+        priority += analysis.is_priority(matrix_engine.analyze_cycle(hits, misses)['status'])
+        if hits:
+            # Khoảng cách trung bình giữa các lần trúng (trúng 1 lần: chính mốc N đó)
+            avg_cycles.append(float(np.mean(np.diff(hits))) if len(hits) > 1 else hits[0])
+
+    df_sweep = analysis.sweep(view).summary()
+    df_sweep = df_sweep[df_sweep['checks'] > 0]
+    sweep_checks = int(df_sweep['checks'].sum())
+    sweep_hits = int(df_sweep['hits'].sum())
+
+    row = asdict(config)
+    row.update({
+        'rows': stats['total_days'],
+        'checks': stats['total_checks'],
+        'hits': stats['total_hits'],
+        'hit_rate': stats['hit_rate'],
+        'sweep_offsets': len(df_sweep),
+        'sweep_checks': sweep_checks,
+        'sweep_hits': sweep_hits,
+        'sweep_hit_rate': round(sweep_hits / sweep_checks * 100, 1) if sweep_checks > 0 else 0,
+        'pending': len(matrix_engine.pending_rows(matrix)),
+        'priority': priority,
+        'avg_cycle': round(float(np.mean(avg_cycles)), 1) if avg_cycles else None,
+    })
+    return row
+
+
+# Dữ liệu dùng chung của mỗi worker (gán một lần bởi _init_worker)
+_worker_data = {}
+
+
+def _init_worker(df_full: pd.DataFrame, region_data: Dict, max_cols: int) -> None:
+    _worker_data['df_full'] = df_full
+    _worker_data['region_data'] = region_data
+    _worker_data['max_cols'] = max_cols
+
+
+def _evaluate_in_worker(config: GridConfig) -> Optional[Dict]:
+    try:
+        return evaluate(config, _worker_data['df_full'], _worker_data['region_data'], _worker_data['max_cols'])
+    except Exception as e:
+        logging.error(f"Grid search failed for {config}: {e}")
+        return None
+
+
+def rank(rows: List[Dict]) -> pd.DataFrame:
+    """Ranked table: best sweep hit rate first, then current window hit rate."""
+    df = pd.DataFrame([r for r in rows if r])
+    if df.empty:
+        return df
+    df = df.sort_values(['sweep_hit_rate', 'hit_rate', 'sweep_checks'], ascending=False).reset_index(drop=True)
+    df.insert(0, 'rank', np.arange(1, len(df) + 1))
+    return df
+
+
+def run_grid(num_days: int, configs: Optional[List[GridConfig]] = None,
+             max_workers: Optional[int] = None, max_cols: int = 20,
+             df_full: Optional[pd.DataFrame] = None,
+             region_data: Optional[Dict[str, draw_columns.DrawColumns]] = None) -> pd.DataFrame:
+    """
+    Evaluate every configuration on a process pool and rank them.
+
+    Args:
+        num_days: Days of history to load (ignored for data passed in)
+        configs: Configurations to evaluate (default: grid_configs())
+        max_workers: Worker processes (default: all cores)
+        df_full: Already loaded master table
+        region_data: Already loaded region -> draws of its stations
+
+    Returns:
+        DataFrame ranked by hit rate (see rank), empty if nothing could be evaluated
+    """
+    configs = grid_configs() if configs is None else configs
+    if not configs:
+        return pd.DataFrame()
+
+    # Tải một lần cho cả lưới
+    if df_full is None:
+        df_full = analysis.build_master_table(analysis.load_master_data(num_days))
+    if df_full.empty:
+        logging.error("Grid search: no master data")
+        return pd.DataFrame()
+    if region_data is None:
+        region_data = {}
+    for region in {c.region for c in configs} - set(region_data) - {"Miền Bắc"}:
+        region_data[region] = analysis.load_region_data(region, num_days)
+
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1:
+        return rank([evaluate(c, df_full, region_data, max_cols) for c in configs])
+
+    # "spawn": không fork tiến trình đang chạy nhiều luồng (Streamlit server)
+    ctx = multiprocessing.get_context("spawn")
+    chunksize = max(1, len(configs) // (max_workers * 4))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx,
+                                                initializer=_init_worker,
+                                                initargs=(df_full, region_data, max_cols)) as executor:
+        rows = list(executor.map(_evaluate_in_worker, configs, chunksize=chunksize))
+    return rank(rows)
+
+
+_grid_runner = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="grid-search")
+
+
+def start_grid(num_days: int, **kwargs) -> concurrent.futures.Future:
+    """
+    Run run_grid in the background and return its Future.
+
+    The calling thread (e.g. the Streamlit script thread) returns at once;
+    only one grid runs at a time, later calls queue behind it.
+    """
+    return _grid_runner.submit(run_grid, num_days, **kwargs)
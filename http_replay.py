@@ -0,0 +1,248 @@
+"""
+Record live responses of the draw sources and replay them from a local stand-in server.
+
+Usage:
+    python http_replay.py record --dir recordings --days 60
+    python http_replay.py serve --dir recordings --port 8799 --latency 0.2 --jitter 0.1 --error-rate 0.05
+    HTTP_STANDIN_URL=http://127.0.0.1:8799 streamlit run streamlit_app.py   # dùng server thay thế
+
+Server thay thế nhận đường dẫn /<host>/<path>?<query> (xem data_fetcher.set_standin).
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+import data_fetcher
+
+# === GHI / PHÁT LẠI HTTP ===
+# Mỗi response lưu thành <sha1(url)>.body + một dòng trong index.json
+# (url, status, content_type, file). Khi phát lại, URL chỉ khác số kỳ
+# (limitNum=N, /so-ket-qua-.../N) dùng bản ghi có N gần nhất >= N yêu cầu:
+# các parser tự cắt về đúng số kỳ nên trả dư không làm sai kết quả.
+INDEX_FILE = "index.json"
+_COUNT_PATTERNS = [re.compile(r"(limitNum=)(\d+)"), re.compile(r"(/)(\d+)(?=$|\?)")]
+
+
+def count_key(url: str) -> Tuple[str, Optional[int]]:
+    """URL with its draw count replaced by '*', and that count (None if it has none)."""
+    for pattern in _COUNT_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            return url[:match.start(2)] + "*" + url[match.end(2):], int(match.group(2))
+    return url, None
+
+
+class Recorder:
+    """Save raw responses under `directory` (pass to data_fetcher.set_recorder)."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.index = load_index(directory)
+
+    def save(self, url: str, response) -> None:
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest() + ".body"
+        try:
+            _write_atomic(os.path.join(self.directory, name), response.content)
+            with self._lock:
+                self.index[url] = {
+                    'status': response.status_code,
+                    'content_type': response.headers.get("Content-Type", "application/octet-stream"),
+                    'file': name,
+                }
+                _write_atomic(os.path.join(self.directory, INDEX_FILE),
+                              json.dumps(self.index, ensure_ascii=False, indent=1).encode("utf-8"))
+        except OSError as e:
+            logging.error(f"Could not record {url}: {e}")
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError:
+        os.remove(tmp)
+        raise
+
+
+def load_index(directory: str) -> Dict[str, Dict]:
+    try:
+        with open(os.path.join(directory, INDEX_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def record(directory: str, days: int, stations: Optional[List[str]] = None,
+           congcuxoso_urls: Optional[List[str]] = None) -> Dict[str, int]:
+    """
+    Download every source once from the live sites with recording on.
+
+    Goes straight to the _download_* functions so the draw store does not
+    shorten the requests.
+
+    Args:
+        stations: Stations to record (default every DAI_API station)
+        congcuxoso_urls: congcuxoso pages to record as well (_parse_congcuxoso)
+
+    Returns:
+        Source name -> draws received
+    """
+    recorder = Recorder(directory)
+    data_fetcher.set_recorder(recorder)
+    try:
+        counts = {
+            'xsmb': len(data_fetcher._download_xsmb(days)),
+            'dien_toan': len(data_fetcher._download_dien_toan(days)),
+            'than_tai': len(data_fetcher._download_than_tai(days)),
+        }
+        executor = data_fetcher.get_fetch_executor()
+        names = stations if stations is not None else list(data_fetcher.DAI_API)
+        futures = {s: executor.submit(data_fetcher._download_station_data, s, days) for s in names}
+        counts.update({s: len(f.result()) for s, f in futures.items()})
+        for url in congcuxoso_urls or []:
+            counts[url] = len(data_fetcher._parse_congcuxoso(url, days))
+    finally:
+        data_fetcher.set_recorder(None)
+    return counts
+
+
+class ReplayStore:
+    """Recorded responses of a directory, looked up by original URL."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.index = load_index(directory)
+        self._by_shape: Dict[str, List[Tuple[int, str]]] = {}
+        for url in self.index:
+            shape, count = count_key(url)
+            if count is not None:
+                self._by_shape.setdefault(shape, []).append((count, url))
+        for entries in self._by_shape.values():
+            entries.sort()
+
+    def lookup(self, url: str) -> Optional[Tuple[Dict, bytes]]:
+        """(index entry, body) recorded for `url`, or for the same URL with the nearest larger draw count."""
+        entry = self.index.get(url)
+        if entry is None:
+            shape, count = count_key(url)
+            candidates = self._by_shape.get(shape, [])
+            if not candidates:
+                return None
+            larger = [u for n, u in candidates if n >= (count or 0)]
+            entry = self.index[larger[0] if larger else candidates[-1][1]]
+        with open(os.path.join(self.directory, entry['file']), "rb") as f:
+            return entry, f.read()
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """GET /<host>/<path>?<query> -> the recorded response of https://<host>/<path>?<query>."""
+
+    def do_GET(self) -> None:
+        server = self.server
+        delay = max(0.0, random.gauss(server.latency, server.jitter)) if server.jitter else server.latency
+        if delay:
+            time.sleep(delay)
+        if server.error_rate and random.random() < server.error_rate:
+            self._send(server.error_status, "text/plain", b"injected error")
+            return
+
+        host, _, rest = self.path.lstrip("/").partition("/")
+        url = f"https://{host}/{rest}"
+        found = server.store.lookup(url)
+        if found is None:
+            self._send(404, "text/plain", f"no recording for {url}".encode("utf-8"))
+            return
+        entry, body = found
+        # Đệm khoảng trắng ở cuối: JSON/HTML vẫn hợp lệ, chỉ tăng kích thước payload
+        self._send(entry['status'], entry['content_type'], body + b" " * server.pad_bytes)
+
+    def _send(self, status: int, content_type: str, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        logging.debug(f"replay {format % args}")
+
+
+def make_server(directory: str, host: str = "127.0.0.1", port: int = 8799, latency: float = 0.0,
+                jitter: float = 0.0, error_rate: float = 0.0, error_status: int = 503,
+                pad_bytes: int = 0) -> ThreadingHTTPServer:
+    """
+    Build the stand-in server (call serve_forever() to run it).
+
+    Args:
+        directory: Recording directory (see Recorder)
+        port: Port to listen on (0 picks a free port)
+        latency: Mean delay per response in seconds
+        jitter: Standard deviation of the delay (normal distribution, clipped at 0)
+        error_rate: Fraction of requests answered with `error_status`
+            (503 is retried by data_fetcher.http_get, 4xx is not)
+        pad_bytes: Extra bytes appended to every body
+    """
+    server = ThreadingHTTPServer((host, port), ReplayHandler)
+    server.daemon_threads = True
+    server.store = ReplayStore(directory)
+    server.latency = latency
+    server.jitter = jitter
+    server.error_rate = error_rate
+    server.error_status = error_status
+    server.pad_bytes = pad_bytes
+    return server
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record", help="Tải mọi nguồn từ trang thật và lưu response")
+    rec.add_argument("--dir", default="recordings")
+    rec.add_argument("--days", type=int, default=60)
+    rec.add_argument("--stations", nargs="+", help="Chỉ ghi các đài này (mặc định: mọi đài DAI_API)")
+    rec.add_argument("--congcuxoso", nargs="+", default=[], metavar="URL", help="Trang congcuxoso cần ghi thêm")
+    serve = sub.add_parser("serve", help="Phát lại response đã lưu")
+    serve.add_argument("--dir", default="recordings")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8799)
+    serve.add_argument("--latency", type=float, default=0.0, help="Độ trễ trung bình (giây)")
+    serve.add_argument("--jitter", type=float, default=0.0, help="Độ lệch chuẩn độ trễ (giây)")
+    serve.add_argument("--error-rate", type=float, default=0.0, help="Tỉ lệ request trả lỗi (0..1)")
+    serve.add_argument("--error-status", type=int, default=503)
+    serve.add_argument("--pad-kb", type=int, default=0, help="KB đệm thêm vào mỗi response")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    if args.command == "record":
+        counts = record(args.dir, args.days, args.stations, args.congcuxoso)
+        for name, count in counts.items():
+            print(f"{name}: {count}")
+        return 0 if any(counts.values()) else 1
+
+    server = make_server(args.dir, args.host, args.port, args.latency, args.jitter,
+                         args.error_rate, args.error_status, args.pad_kb * 1024)
+    logging.info(f"Replaying {len(server.store.index)} responses on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
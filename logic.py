@@ -1,4 +1,6 @@
 from itertools import combinations
+import numpy as np
+import pandas as pd
 
 # --- TỪ ĐIỂN DỮ LIỆU ---
 BO_DICT = {
@@ -31,41 +33,85 @@ ZODIAC_DICT = {
     "Hợi":  ["11","23","35","47","59","71","83","95"]
 }
 
+HIEU_DICT = {
+    0:  ["00","11","22","33","44","55","66","77","88","99"],
+    1:  ["09","10","21","32","43","54","65","76","87","98"],
+    2:  ["08","19","20","31","42","53","64","75","86","97"],
+    3:  ["07","18","29","30","41","52","63","74","85","96"],
+    4:  ["06","17","28","39","40","51","62","73","84","95"],
+    5:  ["05","16","27","38","49","50","61","72","83","94"],
+    6:  ["04","15","26","37","48","59","60","71","82","93"],
+    7:  ["03","14","25","36","47","58","69","70","81","92"],
+    8:  ["02","13","24","35","46","57","68","79","80","91"],
+    9:  ["01","12","23","34","45","56","67","78","89","90"],
+}
+
+# --- BẢNG TRA 100 PHẦN TỬ (dựng 1 lần khi import) ---
+# LUT[n] = mã nhóm của số n (00..99) = vị trí trong *_NAMES, -1 = không thuộc nhóm nào
+BO_NAMES = list(BO_DICT)
+KEP_NAMES = list(KEP_DICT)
+ZODIAC_NAMES = list(ZODIAC_DICT)
+
+def _build_lut(groups: dict) -> np.ndarray:
+    lut = np.full(100, -1, dtype=np.int8)
+    for code, nums in enumerate(groups.values()):
+        for n in nums:
+            lut[int(n)] = code
+    lut.setflags(write=False)
+    return lut
+
+BO_LUT = _build_lut(BO_DICT)
+KEP_LUT = _build_lut(KEP_DICT)
+ZODIAC_LUT = _build_lut(ZODIAC_DICT)
+HIEU_LUT = _build_lut(HIEU_DICT)  # mã = chính giá trị hiệu 0..9
+
+def _pair_index(s: str) -> int:
+    """Chuỗi 2 chữ số -> 0..99, -1 nếu không hợp lệ"""
+    s = s.zfill(2)
+    return int(s) if len(s) == 2 and s.isascii() and s.isdigit() else -1
+
 # --- CÁC HÀM TRA CỨU CƠ BẢN ---
 def bo(db: str) -> str:
-    db = db.zfill(2)
-    if db in BO_DICT: return db
-    for key, vals in BO_DICT.items():
-        if db in vals: return key
-    return "44"
+    n = _pair_index(db)
+    return BO_NAMES[BO_LUT[n]] if n >= 0 else "44"
 
 def kep(db: str) -> str:
-    db = db.zfill(2)
-    for key, vals in KEP_DICT.items():
-        if db in vals: return key
-    return "-"
+    n = _pair_index(db)
+    return KEP_NAMES[KEP_LUT[n]] if n >= 0 and KEP_LUT[n] >= 0 else "-"
 
 def hieu(pair: str) -> int:
-    p = pair.zfill(2)
-    hieu_map = {
-        0:  ["00","11","22","33","44","55","66","77","88","99"],
-        1:  ["09","10","21","32","43","54","65","76","87","98"],
-        2:  ["08","19","20","31","42","53","64","75","86","97"],
-        3:  ["07","18","29","30","41","52","63","74","85","96"],
-        4:  ["06","17","28","39","40","51","62","73","84","95"],
-        5:  ["05","16","27","38","49","50","61","72","83","94"],
-        6:  ["04","15","26","37","48","59","60","71","82","93"],
-        7:  ["03","14","25","36","47","58","69","70","81","92"],
-        8:  ["02","13","24","35","46","57","68","79","80","91"],
-        9:  ["01","12","23","34","45","56","67","78","89","90"],
-    }
-    for delay, nums in hieu_map.items():
-        if p in nums: return delay
-    return -1
+    n = _pair_index(pair)
+    return int(HIEU_LUT[n]) if n >= 0 else -1
 
 def zodiac(pair: str) -> str:
-    p = pair.zfill(2)
-    return next((a for a, lst in ZODIAC_DICT.items() if p in lst), "-")
+    n = _pair_index(pair)
+    return ZODIAC_NAMES[ZODIAC_LUT[n]] if n >= 0 else "-"
+
+# --- PHIÊN BẢN VECTOR (numpy array / pandas Series các số 0..99) ---
+def _lookup(lut: np.ndarray, values):
+    """Tra bảng cho cả mảng; số ngoài 0..99 trả về -1. Series vào thì Series ra (giữ index)."""
+    arr = np.asarray(values, dtype=np.int64)
+    valid = (arr >= 0) & (arr < 100)
+    codes = np.where(valid, lut[np.where(valid, arr, 0)], -1).astype(np.int8)
+    if isinstance(values, pd.Series):
+        return pd.Series(codes, index=values.index, name=values.name)
+    return codes
+
+def bo_codes(values):
+    """Mã bộ (index vào BO_NAMES) của từng số"""
+    return _lookup(BO_LUT, values)
+
+def kep_codes(values):
+    """Mã kép (index vào KEP_NAMES), -1 nếu không phải kép"""
+    return _lookup(KEP_LUT, values)
+
+def hieu_codes(values):
+    """Hiệu (0..9) của từng số"""
+    return _lookup(HIEU_LUT, values)
+
+def zodiac_codes(values):
+    """Mã con giáp (index vào ZODIAC_NAMES) của từng số"""
+    return _lookup(ZODIAC_LUT, values)
 
 # --- CÁC HÀM HỖ TRỢ HIỂN THỊ ---
 def doc_so_chu(so):
@@ -94,19 +140,7 @@ def get_tong_dan(tong_val):
 def get_hieu_dan(hieu_val):
     try:
         h = int(hieu_val)
-        hieu_map = {
-            0:  ["00","11","22","33","44","55","66","77","88","99"],
-            1:  ["09","10","21","32","43","54","65","76","87","98"],
-            2:  ["08","19","20","31","42","53","64","75","86","97"],
-            3:  ["07","18","29","30","41","52","63","74","85","96"],
-            4:  ["06","17","28","39","40","51","62","73","84","95"],
-            5:  ["05","16","27","38","49","50","61","72","83","94"],
-            6:  ["04","15","26","37","48","59","60","71","82","93"],
-            7:  ["03","14","25","36","47","58","69","70","81","92"],
-            8:  ["02","13","24","35","46","57","68","79","80","91"],
-            9:  ["01","12","23","34","45","56","67","78","89","90"]
-        }
-        return ", ".join(hieu_map.get(h, []))
+        return ", ".join(HIEU_DICT.get(h, []))
     except: return ""
 
 # --- CÁC HÀM MỚI THÊM (ĐẦU/ĐUÔI GAN) ---
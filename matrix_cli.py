@@ -0,0 +1,163 @@
+"""
+Run the matrix analysis (Dàn Nuôi) without Streamlit and write its tables to files.
+
+Usage:
+    python matrix_cli.py --region mn --prize db --source tt --days 90
+    python matrix_cli.py --region mb --prize g6 --3d --offset 2 --format json
+    python matrix_cli.py --all --format parquet --out /data/dan_nuoi   # mọi cấu hình (cron)
+
+Mỗi cấu hình ghi 4 bảng: <tên>_matrix, <tên>_stats, <tên>_pending, <tên>_cycle.
+Với --all thêm summary.<ext> gộp dòng thống kê của mọi cấu hình.
+"""
+import argparse
+import logging
+import os
+import sys
+import unicodedata
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+import analysis
+import draw_columns
+import grid_search
+
+SHORT_REGION = {v: k for k, v in analysis.REGION_ALIASES.items()}
+SHORT_SOURCE = {v: k for k, v in analysis.SOURCE_ALIASES.items()}
+FORMATS = ["csv", "parquet", "json"]
+
+
+def slug(text: str) -> str:
+    """ASCII file-name part: 'Tất cả' -> 'tat-ca', 'XSMB (ĐB)' -> 'xsmb-db'."""
+    text = unicodedata.normalize("NFKD", text.replace("Đ", "D").replace("đ", "d"))
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return "-".join("".join(c if c.isalnum() else " " for c in text).split())
+
+
+def config_name(config: grid_search.GridConfig, day: str, offset: int) -> str:
+    parts = [SHORT_REGION[config.region], slug(config.station), SHORT_SOURCE[config.src_mode],
+             slug(config.prize), "3d" if config.mode_3d else "2d"]
+    if day != analysis.ALL:
+        parts.append(slug(day))
+    parts.append(f"b{offset}")
+    return "_".join(parts)
+
+
+def write_table(df: pd.DataFrame, path: str, fmt: str) -> str:
+    """Write one table as <path>.<fmt> and return the file name."""
+    file_name = f"{path}.{fmt}"
+    if fmt == "csv":
+        df.to_csv(file_name, index=False)
+    elif fmt == "parquet":
+        df.to_parquet(file_name, index=False)  # cần pyarrow hoặc fastparquet
+    else:
+        df.to_json(file_name, orient="records", force_ascii=False, indent=1)
+    return file_name
+
+
+class DataCache:
+    """Load the master table once and each region once for a whole run."""
+
+    def __init__(self, days: int):
+        self.days = days
+        self._df_full = None
+        self._regions: Dict[str, draw_columns.DrawColumns] = {}
+
+    @property
+    def df_full(self) -> pd.DataFrame:
+        if self._df_full is None:
+            self._df_full = analysis.build_master_table(analysis.load_master_data(self.days))
+        return self._df_full
+
+    def region(self, region: str) -> draw_columns.DrawColumns:
+        if region not in self._regions:
+            self._regions[region] = analysis.load_region_data(region, self.days)
+        return self._regions[region]
+
+
+def run_config(config: grid_search.GridConfig, data: DataCache, args: argparse.Namespace,
+               day: str = analysis.ALL) -> Optional[pd.DataFrame]:
+    """Write the 4 tables of one configuration; return its stats row (None without data)."""
+    view = analysis.make_view(config.region, config.src_mode, config.mode_3d, config.prize, data.df_full,
+                              data.region(config.region), station=config.station, day=day,
+                              max_cols=args.max_cols)
+    if view is None:
+        logging.warning(f"No comparison data for {config}")
+        return None
+    tables = analysis.result_tables(view, args.offset, args.check_range)
+    if tables is None:
+        logging.warning(f"No dàn for {config}")
+        return None
+
+    stats = tables['stats']
+    for col, value in reversed([('region', config.region), ('station', config.station),
+                                ('src_mode', config.src_mode), ('prize', config.prize),
+                                ('mode_3d', config.mode_3d), ('day', day), ('offset', args.offset),
+                                ('check_range', args.check_range)]):
+        stats.insert(0, col, value)
+
+    base = os.path.join(args.out, config_name(config, day, args.offset))
+    for name, df in tables.items():
+        write_table(df, f"{base}_{name}", args.format)
+    print(f"{base}_*.{args.format}: {stats['total_days'].iloc[0]} dàn, hit rate {stats['hit_rate'].iloc[0]}%")
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--region", help="mb, mn, mt (hoặc tên miền), mặc định: mb; với --all: mọi miền")
+    parser.add_argument("--station", default=analysis.ALL, help="Tên đài (Miền Nam/Trung), mặc định: Tất cả")
+    parser.add_argument("--day", default=analysis.ALL, help="Lọc theo thứ khi --station là Tất cả, vd 'Thứ 7'")
+    parser.add_argument("--prize", default="db", help="db, g1, g6, g7, g8 (hoặc tên giải)")
+    parser.add_argument("--source", default="dt", help="dt, tt, ghep (hoặc tên nguồn)")
+    parser.add_argument("--3d", dest="mode_3d", action="store_true", help="Tam hợp (3 số) thay vì nhị hợp")
+    parser.add_argument("--offset", type=int, default=0, help="Backtest: lùi N kỳ")
+    parser.add_argument("--days", type=int, default=60, help="Số ngày tải")
+    parser.add_argument("--check-range", type=int, default=analysis.CHECK_RANGE, help="Khung nuôi (ngày)")
+    parser.add_argument("--max-cols", type=int, default=20, help="Số cột N")
+    parser.add_argument("--all", action="store_true",
+                        help="Chạy mọi Nguồn × Giải × 2D/3D × Đài (của --region nếu có)")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--out", default="output", help="Thư mục ghi kết quả")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(message)s")
+
+    try:
+        if args.all:
+            regions = [analysis.resolve_region(args.region)] if args.region else None
+            configs = grid_search.grid_configs(regions)
+            day = analysis.ALL
+        else:
+            params = analysis.normalize_params(args.region or "mb", args.station, args.day,
+                                               args.prize, args.source, args.mode_3d)
+            day = params.pop('day')
+            configs = [grid_search.GridConfig(**params)]
+    except ValueError as e:
+        parser.error(str(e))
+
+    os.makedirs(args.out, exist_ok=True)
+    data = DataCache(args.days)
+    if data.df_full.empty:
+        logging.error("No data. Check the network connection.")
+        return 1
+
+    summary = []
+    for config in configs:
+        try:
+            stats = run_config(config, data, args, day)
+        except ImportError as e:
+            logging.error(f"Cannot write {args.format}: {e}")
+            return 1
+        if stats is not None:
+            summary.append(stats)
+
+    if not summary:
+        logging.error("Nothing to write")
+        return 1
+    if args.all:
+        print(write_table(pd.concat(summary, ignore_index=True), os.path.join(args.out, "summary"), args.format))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,328 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from typing import List, Dict, Sequence, Optional, Tuple
+
+# === HIT-MATRIX ENGINE ===
+# Tính một lần ma trận (dàn r × cột N_k) cho cả 4 phần của render_matrix_view:
+# Bảng Theo Dõi, Thống kê, Tổng hợp Dàn Chưa Ra, Phân tích Chu kỳ.
+# Không phụ thuộc Streamlit.
+
+
+@dataclass
+class MatrixResult:
+    """
+    Hit matrix for R dàn rows × K offsets (column k-1 = N_k).
+
+    Attributes:
+        hit: (R, K) bool - the check row has a number in the dàn
+        has_row: (R, K) bool - a check row exists for this cell
+        has_data: (R, K) bool - the check row has at least one result
+        counted: (R, K) bool - cell is inside the triangle and the backtest window
+        matched: (R, width) bool - numbers of each dàn hit within counted cells
+    """
+    hit: np.ndarray
+    has_row: np.ndarray
+    has_data: np.ndarray
+    counted: np.ndarray
+    matched: np.ndarray
+
+    @property
+    def shape(self):
+        return self.hit.shape
+
+
+def triangle_mask(num_rows: int, num_cols: int) -> np.ndarray:
+    """Row r (0-based) covers columns N1..N(r+1)."""
+    return np.arange(num_cols)[None, :] < (np.arange(num_rows)[:, None] + 1)
+
+
+def index_positions(indexes: Sequence[int], num_cols: int, num_rows_total: int) -> np.ndarray:
+    """
+    Check positions for index-based checking (Miền Bắc / single station).
+
+    Dàn built from row i is checked against row i - k (newer draws come first).
+    """
+    pos = np.asarray(indexes, dtype=np.int64)[:, None] - np.arange(1, num_cols + 1)[None, :]
+    return np.where((pos >= 0) & (pos < num_rows_total), pos, -1)
+
+
+def compute_matrix(combo_masks: np.ndarray, check_pos: np.ndarray,
+                   result_masks: np.ndarray, result_counts: np.ndarray,
+                   counted: np.ndarray) -> MatrixResult:
+    """
+    Compute the full hit matrix once with bitset ANDs.
+
+    Args:
+        combo_masks: (R, width) bool dàn of each row (see bitset.combos_to_mask)
+        check_pos: (R, K) int positions into the result rows, -1 when there is no check row
+        result_masks: (J, width) bool result set of each check row (see bitset.results_to_masks)
+        result_counts: (J,) number of results of each check row
+        counted: (R, K) bool mask of cells that count for stats/pending/cycle
+
+    Returns:
+        MatrixResult
+    """
+    check_pos = np.asarray(check_pos)
+    counted = np.asarray(counted, dtype=bool)
+    num_results, width = result_masks.shape[0], combo_masks.shape[1]
+
+    # Dòng rỗng ở cuối làm sentinel cho các ô không có dòng kiểm tra
+    packed_results = np.packbits(result_masks, axis=1)
+    packed_results = np.vstack([packed_results, np.zeros((1, packed_results.shape[1]), dtype=np.uint8)])
+    counts = np.append(np.asarray(result_counts), 0)
+
+    has_row = check_pos >= 0
+    safe_pos = np.where(has_row, check_pos, num_results)
+    has_data = counts[safe_pos] > 0
+
+    # (R, K, bytes): dàn AND kết quả của từng ô
+    overlap = np.packbits(combo_masks, axis=1)[:, None, :] & packed_results[safe_pos]
+    hit = overlap.any(axis=2)
+
+    matched_packed = np.bitwise_or.reduce(np.where((hit & counted)[:, :, None], overlap, 0), axis=1)
+    matched = np.unpackbits(matched_packed, axis=1, count=width).astype(bool)
+
+    return MatrixResult(hit=hit, has_row=has_row, has_data=has_data, counted=counted, matched=matched)
+
+
+def summarize(m: MatrixResult) -> Dict:
+    """Totals for the "Thống kê" section."""
+    valid = m.has_row & m.counted
+    total_checks = int(valid.sum())
+    total_hits = int((m.hit & valid).sum())
+    return {
+        "total_days": m.shape[0],
+        "total_checks": total_checks,
+        "total_hits": total_hits,
+        "hit_rate": round(total_hits / total_checks * 100, 1) if total_checks > 0 else 0,
+    }
+
+
+def pending_rows(m: MatrixResult) -> List[int]:
+    """Rows whose dàn has not hit yet ("Dàn Chưa Ra")."""
+    return np.flatnonzero(~m.matched.any(axis=1)).tolist()
+
+
+def cycle_hits(m: MatrixResult, r: int):
+    """1-based offsets k where row r hit, and where it missed with data to check."""
+    counted = m.counted[r]
+    hits = (np.flatnonzero(counted & m.hit[r]) + 1).tolist()
+    misses = (np.flatnonzero(counted & ~m.hit[r] & m.has_data[r]) + 1).tolist()
+    return hits, misses
+
+
+# Trạng thái của dàn trong khung nuôi
+WINDOW_FEEDING = 0   # Đang nuôi: chưa trúng, chưa kiểm tra đủ khung
+WINDOW_HIT = 1       # Trúng trong khung
+WINDOW_EXPIRED = 2   # Trượt khung: kiểm tra đủ khung mà không trúng
+
+
+@dataclass
+class WindowCounts:
+    """
+    Cumulative per-row counts over N1..NK of the counted cells.
+
+    checks[r, k-1] / hits[r, k-1] are the valid checks / hits of row r within
+    N1..Nk, so any feeding window ("Khung nuôi") is a column lookup instead
+    of a new pass over the matrix.
+    """
+    checks: np.ndarray
+    hits: np.ndarray
+
+    def at(self, check_range: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(checks, hits) of every row within N1..N(check_range)."""
+        num_rows, num_cols = self.checks.shape
+        if num_cols == 0:
+            return np.zeros(num_rows, dtype=np.int32), np.zeros(num_rows, dtype=np.int32)
+        col = min(max(int(check_range), 1), num_cols) - 1
+        return self.checks[:, col], self.hits[:, col]
+
+    def status(self, check_range: int) -> np.ndarray:
+        """WINDOW_HIT, WINDOW_EXPIRED or WINDOW_FEEDING of every row."""
+        checks, hits = self.at(check_range)
+        status = np.full(len(checks), WINDOW_FEEDING, dtype=np.int8)
+        status[checks >= check_range] = WINDOW_EXPIRED
+        status[hits > 0] = WINDOW_HIT
+        return status
+
+
+def window_counts(m: MatrixResult) -> WindowCounts:
+    """Cumulative sums of valid checks and hits along N1..NK."""
+    valid = m.has_row & m.counted
+    return WindowCounts(
+        checks=np.cumsum(valid, axis=1, dtype=np.int32),
+        hits=np.cumsum(valid & m.hit, axis=1, dtype=np.int32),
+    )
+
+
+def summarize_window(wc: WindowCounts, check_range: int) -> Dict:
+    """
+    Totals for the "Thống kê" section within the feeding window.
+
+    Returns:
+        Dict with total_days, total_checks, total_hits, hit_rate (per cell) and
+        hit_days, expired_days, feeding_days, window_rate (per dàn, hit among
+        the dàn whose window is decided)
+    """
+    checks, hits = wc.at(check_range)
+    status = wc.status(check_range)
+    total_checks = int(checks.sum())
+    total_hits = int(hits.sum())
+    hit_days = int((status == WINDOW_HIT).sum())
+    expired_days = int((status == WINDOW_EXPIRED).sum())
+    decided = hit_days + expired_days
+    return {
+        "total_days": len(status),
+        "total_checks": total_checks,
+        "total_hits": total_hits,
+        "hit_rate": round(total_hits / total_checks * 100, 1) if total_checks > 0 else 0,
+        "hit_days": hit_days,
+        "expired_days": expired_days,
+        "feeding_days": int((status == WINDOW_FEEDING).sum()),
+        "window_rate": round(hit_days / decided * 100, 1) if decided > 0 else 0,
+    }
+
+
+@dataclass
+class SweepResult:
+    """
+    Backtest stats for every offset at once.
+
+    Attributes:
+        offsets: (B,) backtest offsets 0..B-1
+        checks: (B, K) number of valid checks per offset and column N1..NK
+        hits: (B, K) number of hits per offset and column
+    """
+    offsets: np.ndarray
+    checks: np.ndarray
+    hits: np.ndarray
+
+    def summary(self) -> pd.DataFrame:
+        """One row per offset: checks, hits and hit rate (%)."""
+        checks = self.checks.sum(axis=1)
+        hits = self.hits.sum(axis=1)
+        rate = np.round(np.divide(hits * 100, checks, out=np.zeros(len(checks)), where=checks > 0), 1)
+        return pd.DataFrame({"offset": self.offsets, "checks": checks, "hits": hits, "hit_rate": rate})
+
+    def rate_by_column(self) -> pd.DataFrame:
+        """(offset × N1..NK) hit rate (%) table, NaN where a column has no checks."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rate = np.round(self.hits * 100 / self.checks, 1)
+        columns = [f"N{k}" for k in range(1, self.checks.shape[1] + 1)]
+        return pd.DataFrame(rate, index=pd.Index(self.offsets, name="offset"), columns=columns)
+
+
+def sweep_offsets(m: MatrixResult, row_index: Sequence[int], window: int = 20,
+                  index_cutoff: bool = True, max_offset: Optional[int] = None) -> SweepResult:
+    """
+    Backtest stats for every offset from one full-history matrix.
+
+    `m` must hold every dàn row of the history (not just one window), ordered
+    by source row position; row_index[r] is that position i. For offset b the
+    view is rebuilt exactly as the single-offset path does it: rows with
+    b <= i < b + window take part, the j-th of them covers N1..N(j+1), and with
+    `index_cutoff` a check on row i - k only counts when i - k >= b.
+
+    Args:
+        m: MatrixResult over all rows (its counted mask is ignored)
+        row_index: Source row position of each dàn row, ascending
+        window: Number of source rows shown per offset (20 in the matrix view)
+        index_cutoff: Apply the i - k >= b rule (index-based checking)
+        max_offset: Last offset to evaluate (default: deepest row)
+
+    Returns:
+        SweepResult
+    """
+    row_index = np.asarray(row_index, dtype=np.int64)
+    num_rows, num_cols = m.shape
+    if max_offset is None:
+        max_offset = int(row_index.max()) if num_rows else 0
+    offsets = np.arange(max_offset + 1)
+
+    # Với mỗi offset b chỉ có tối đa `window` dòng tham gia: r = first[b] + j, j = 0..window-1
+    first = np.searchsorted(row_index, offsets)
+    rows = first[:, None] + np.arange(window)[None, :]                      # (B, W)
+    inside = rows < num_rows
+    rows = np.where(inside, rows, 0)
+    inside &= row_index[rows] < offsets[:, None] + window
+
+    k = np.arange(1, num_cols + 1)
+    counted = inside[:, :, None] & (k[None, None, :] <= np.arange(1, window + 1)[None, :, None])
+    if index_cutoff:
+        counted &= (row_index[rows][:, :, None] - k[None, None, :]) >= offsets[:, None, None]
+
+    valid = counted & m.has_row[rows]                                       # (B, W, K)
+    checks = valid.sum(axis=1)
+    hits = (valid & m.hit[rows]).sum(axis=1)
+    return SweepResult(offsets=offsets, checks=checks, hits=hits)
+
+
+def analyze_cycle(hits: List[int], misses: List[int]) -> Dict:
+    """
+    Cycle status of one dàn from its hit/miss offsets.
+
+    Returns:
+        Dict with status, avg_cycle_display, last_hit_display, priority, overdue,
+        total_checks, hit_count, miss_count
+    """
+    total_checks = len(hits) + len(misses)
+    hit_count = len(hits)
+    miss_count = len(misses)
+
+    if total_checks == 0:
+        status = "🆕 Mới tạo - Chưa có dữ liệu"
+        avg_cycle_display = "N/A"
+        last_hit_display = "N/A"
+        priority = 2
+        overdue = 0
+    elif hit_count == 0:
+        # Chưa ra lần nào
+        status = f"🔥 Chưa ra ({total_checks} ngày kiểm tra) - Ưu tiên cao"
+        avg_cycle_display = "Chưa ra"
+        last_hit_display = "Chưa bao giờ"
+        priority = 0
+        overdue = total_checks
+    else:
+        # Đã ra ít nhất 1 lần
+        # Tính chu kỳ giữa các lần trúng
+        if len(hits) > 1:
+            cycles = [hits[j-1] - hits[j] for j in range(1, len(hits))]
+            avg_cycle = round(sum(cycles) / len(cycles), 1)
+        else:
+            avg_cycle = hits[0]
+
+        avg_cycle_display = f"{avg_cycle} ngày"
+        last_hit_display = f"N{hits[0]}"
+
+        # Nhận định dựa trên chu kỳ
+        days_since_last = hits[0] - 1  # Số ngày từ lần trúng cuối
+
+        if days_since_last == 0:
+            status = "✅ Vừa trúng hôm qua"
+            priority = 2
+            overdue = 0
+        elif days_since_last < avg_cycle:
+            remaining = round(avg_cycle - days_since_last)
+            status = f"⏳ Trong chu kỳ (còn ~{remaining} ngày)"
+            priority = 2
+            overdue = 0
+        else:
+            overdue_days = days_since_last - avg_cycle
+            if overdue_days > avg_cycle * 0.5:
+                status = f"⚠️ Quá chu kỳ {round(overdue_days)} ngày - Ưu tiên cao"
+            else:
+                status = f"📍 Quá chu kỳ {round(overdue_days)} ngày"
+            priority = 1
+            overdue = overdue_days
+
+    return {
+        "status": status,
+        "avg_cycle_display": avg_cycle_display,
+        "last_hit_display": last_hit_display,
+        "priority": priority,
+        "overdue": overdue,
+        "total_checks": total_checks,
+        "hit_count": hit_count,
+        "miss_count": miss_count,
+    }
@@ -0,0 +1,292 @@
+import numpy as np
+from typing import List, Dict, Optional, Tuple
+
+import bitset
+import matrix_engine
+
+# === TRẠNG THÁI MA TRẬN TĂNG DẦN ===
+# Giữ ma trận (dàn × N1..NK) của toàn bộ lịch sử và cập nhật theo từng kỳ quay:
+#   - kỳ quay mới là một dòng kiểm tra, chỉ chạm tới tối đa K dàn trước nó
+#     (dàn có khóa = khóa mới - k nhận ô N_k): một đường chéo mới
+#   - nếu kỳ đó có nguồn thì thêm một dàn mới (chưa có ô nào)
+# Chi phí mỗi kỳ quay là O(K), không phụ thuộc độ dài lịch sử.
+# Khóa: vị trí dòng (kiểm tra theo chỉ số) hoặc day ordinal (kiểm tra theo ngày).
+# Các mảng lưu theo thứ tự cũ -> mới để chỉ thêm/bớt ở cuối; khi lịch sử đã tải
+# trượt qua ngày mới thì trim() cắt các kỳ cũ ở đầu.
+
+
+def _grow(arr: np.ndarray, size: int, fill=0) -> np.ndarray:
+    """Return `arr` with room for at least `size` rows (capacity doubles)."""
+    if size <= len(arr):
+        return arr
+    new = np.full((max(size, 2 * len(arr), 64),) + arr.shape[1:], fill, dtype=arr.dtype)
+    new[:len(arr)] = arr
+    return new
+
+
+class MatrixState:
+    """
+    Full-history hit matrix that grows one draw at a time.
+
+    Draws are added oldest first with add_draw; window() and full() give the
+    same days data and MatrixResult as analysis.build_days_data /
+    analysis.build_matrix over the newest rows, without a full rebuild.
+    """
+
+    def __init__(self, num_digits: int, max_k: int, date_mode: bool):
+        self.num_digits = num_digits
+        self.max_k = max_k
+        self.date_mode = date_mode
+        num_bytes = (bitset.WIDTH[num_digits] + 7) // 8
+
+        # Dòng kiểm tra (mọi kỳ quay); khóa theo chỉ số = key_base + vị trí
+        self.num_checks = 0
+        self.key_base = 0
+        self.check_keys = np.zeros(0, dtype=np.int64)
+        self.check_days = np.zeros(0, dtype=np.int64)
+        self.check_in_region = np.zeros(0, dtype=bool)
+        self.check_packed = np.zeros((0, num_bytes), dtype=np.uint8)
+        self.check_counts = np.zeros(0, dtype=np.int32)
+        self.check_sizes = np.zeros(0, dtype=np.int32)  # số kết quả của kỳ (len(results))
+
+        # Dàn (kỳ quay thuộc df_region và có nguồn)
+        self.num_region = 0
+        self.num_dan = 0
+        self.dan_keys = np.zeros(0, dtype=np.int64)
+        self.dan_region_pos = np.zeros(0, dtype=np.int64)
+        self.dan_packed = np.zeros((0, num_bytes), dtype=np.uint8)
+        self.check_idx = np.zeros((0, max_k), dtype=np.int32)
+        self.hit = np.zeros((0, max_k), dtype=bool)
+        self.has_row = np.zeros((0, max_k), dtype=bool)
+        self.has_data = np.zeros((0, max_k), dtype=bool)
+        self.dan_info: List[Dict] = []
+        self._dan_by_key: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return self.num_checks
+
+    @property
+    def first_day(self) -> Optional[int]:
+        """Day ordinal of the oldest draw, None when empty."""
+        return int(self.check_days[0]) if self.num_checks else None
+
+    @property
+    def last_day(self) -> Optional[int]:
+        """Day ordinal of the newest draw, None when empty."""
+        return int(self.check_days[self.num_checks - 1]) if self.num_checks else None
+
+    def signature(self) -> Tuple:
+        """Changes whenever the content does (to skip saving an unchanged state)."""
+        if not self.num_checks:
+            return (0,)
+        j = self.num_checks - 1
+        newest_dan = self.dan_info[-1]['source'] if self.dan_info else None
+        return (self.num_checks, self.key_base, self.num_dan, self.num_region, self.first_day, self.last_day,
+                self.check_packed[j].tobytes(), int(self.check_sizes[j]), newest_dan)
+
+    def matches(self, num_digits: int, max_k: int, date_mode: bool) -> bool:
+        return (self.num_digits, self.max_k, self.date_mode) == (num_digits, max_k, date_mode)
+
+    # --- CẬP NHẬT ---
+    def add_draw(self, day: int, results: List[str], in_region: bool = True,
+                 dan: Optional[Dict] = None) -> None:
+        """
+        Append the newest draw.
+
+        Args:
+            day: Day ordinal of the draw (must be newer than last_day in date mode)
+            results: Result numbers of the draw (see analysis.row_values)
+            in_region: The draw is a df_region row (always true outside date mode)
+            dan: Dàn built from this draw (date, day, source, src_mask, combos),
+                None when it has no source
+        """
+        key = day if self.date_mode else self.key_base + self.num_checks
+        if self.num_checks and key <= self.check_keys[self.num_checks - 1]:
+            raise ValueError("draws must be added oldest first")
+
+        masks, counts = bitset.results_to_masks([results], self.num_digits)
+        packed = np.packbits(masks[0])
+        j = self.num_checks
+        size = j + 1
+        self.check_keys = _grow(self.check_keys, size)
+        self.check_days = _grow(self.check_days, size)
+        self.check_in_region = _grow(self.check_in_region, size)
+        self.check_packed = _grow(self.check_packed, size)
+        self.check_counts = _grow(self.check_counts, size)
+        self.check_sizes = _grow(self.check_sizes, size)
+        self.check_keys[j] = key
+        self.check_days[j] = day
+        self.check_in_region[j] = in_region
+        self.check_packed[j] = packed
+        self.check_counts[j] = counts[0]
+        self.check_sizes[j] = len(results)
+        self.num_checks = size
+
+        # Đường chéo mới: dàn có khóa key - k được kiểm tra ở cột N_k
+        for k in range(1, self.max_k + 1):
+            d = self._dan_by_key.get(key - k)
+            if d is None:
+                continue
+            self.check_idx[d, k - 1] = j
+            self.has_row[d, k - 1] = True
+            self.has_data[d, k - 1] = counts[0] > 0
+            self.hit[d, k - 1] = bool((self.dan_packed[d] & packed).any())
+
+        if not in_region:
+            return
+        if dan is not None:
+            d = self.num_dan
+            size = d + 1
+            self.dan_keys = _grow(self.dan_keys, size)
+            self.dan_region_pos = _grow(self.dan_region_pos, size)
+            self.dan_packed = _grow(self.dan_packed, size)
+            self.check_idx = _grow(self.check_idx, size, fill=-1)
+            self.hit = _grow(self.hit, size)
+            self.has_row = _grow(self.has_row, size)
+            self.has_data = _grow(self.has_data, size)
+            # Dòng có thể còn giá trị cũ sau pop_draw
+            self.check_idx[d] = -1
+            self.hit[d] = self.has_row[d] = self.has_data[d] = False
+            self.dan_keys[d] = key
+            self.dan_region_pos[d] = self.num_region
+            self.dan_packed[d] = np.packbits(bitset.combo_table(self.num_digits)[dan['src_mask']])
+            self.dan_info.append({f: dan[f] for f in ('date', 'day', 'source', 'src_mask', 'combos')})
+            self._dan_by_key[key] = d
+            self.num_dan = size
+        self.num_region += 1
+
+    def pop_draw(self) -> None:
+        """Remove the newest draw (e.g. to re-add it once its results are complete)."""
+        if not self.num_checks:
+            return
+        j = self.num_checks - 1
+        key = int(self.check_keys[j])
+
+        for k in range(1, self.max_k + 1):
+            d = self._dan_by_key.get(key - k)
+            if d is None:
+                continue
+            self.check_idx[d, k - 1] = -1
+            self.has_row[d, k - 1] = False
+            self.has_data[d, k - 1] = False
+            self.hit[d, k - 1] = False
+
+        d = self._dan_by_key.pop(key, None)
+        if d is not None:
+            self.dan_info.pop()
+            self.num_dan = d
+        if self.check_in_region[j]:
+            self.num_region -= 1
+        self.num_checks = j
+
+    def trim(self, check_day: int, dan_day: Optional[int] = None) -> None:
+        """
+        Drop draws older than `check_day`, and dàn older than `dan_day`.
+
+        Keeps the state equal to a rebuild once the loaded history slides:
+        old draws leave the check source, and dàn of old rows lose their
+        source row when the master table no longer reaches back to them.
+        """
+        days = self.check_days[:self.num_checks]
+        c = int(np.argmax(days >= check_day)) if (days >= check_day).any() else self.num_checks
+        first_key = int(self.check_keys[c]) if c < self.num_checks else None
+        dan_day = check_day if dan_day is None else max(check_day, dan_day)
+        u = 0
+        while u < self.num_dan and (first_key is None or self.dan_keys[u] < first_key
+                                    or self.dan_info[u]['day'] < dan_day):
+            u += 1
+        if not c and not u:
+            return
+
+        removed_region = int(self.check_in_region[:c].sum())
+        for name in ("check_keys", "check_days", "check_in_region", "check_packed", "check_counts",
+                     "check_sizes"):
+            setattr(self, name, getattr(self, name)[c:].copy())
+        for name in ("dan_keys", "dan_region_pos", "dan_packed", "check_idx", "hit", "has_row", "has_data"):
+            setattr(self, name, getattr(self, name)[u:].copy())
+        self.num_checks -= c
+        if not self.date_mode:
+            self.key_base += c
+        self.num_dan -= u
+        self.num_region -= removed_region
+        self.dan_region_pos[:self.num_dan] -= removed_region
+        live = self.check_idx[:self.num_dan]
+        live[live >= 0] -= c
+        self.dan_info = self.dan_info[u:]
+        self._dan_by_key = {int(key): d for d, key in enumerate(self.dan_keys[:self.num_dan])}
+
+    # --- ĐỌC ---
+    def _region_index(self, rows: np.ndarray) -> np.ndarray:
+        """df_region position (newest first) of dàn rows."""
+        return self.num_region - 1 - self.dan_region_pos[rows]
+
+    def _view(self, rows: np.ndarray, counted: np.ndarray) -> Tuple[List[Dict], matrix_engine.MatrixResult]:
+        hit = self.hit[rows]
+        check_idx = self.check_idx[rows]
+        # Các số trúng trong ô được tính: OR của (dàn AND kết quả)
+        overlap = self.dan_packed[rows][:, None, :] & self.check_packed[np.maximum(check_idx, 0)]
+        matched_packed = np.bitwise_or.reduce(np.where((hit & counted)[:, :, None], overlap, 0), axis=1)
+        matched = np.unpackbits(matched_packed, axis=1, count=bitset.WIDTH[self.num_digits]).astype(bool)
+
+        index = self._region_index(rows)
+        days_data = [dict(self.dan_info[d], index=int(i)) for d, i in zip(rows, index)]
+        return days_data, matrix_engine.MatrixResult(
+            hit=hit, has_row=self.has_row[rows], has_data=self.has_data[rows],
+            counted=counted, matched=matched,
+        )
+
+    def _rows_between(self, first: int, end: int) -> np.ndarray:
+        """Dàn rows with df_region position in [first, end), newest first."""
+        region_pos = self.dan_region_pos[:self.num_dan]
+        newest = self.num_region - 1
+        lo = np.searchsorted(region_pos, newest - end + 1, side="left")
+        hi = np.searchsorted(region_pos, newest - first, side="right")
+        return np.arange(hi - 1, lo - 1, -1, dtype=np.int64)
+
+    def window(self, offset: int, size: int, limit: Optional[int] = None,
+               index_cutoff: bool = True) -> Tuple[List[Dict], matrix_engine.MatrixResult]:
+        """
+        Dàn of df_region rows [offset, offset + size) and their matrix.
+
+        Args:
+            offset: Backtest offset (first df_region row of the window)
+            size: Number of df_region rows (WINDOW_ROWS)
+            limit: Number of df_region rows currently loaded; older rows kept
+                by the state are left out
+            index_cutoff: Only count checks on rows >= offset (index-based mode)
+
+        Returns:
+            (days_data, MatrixResult) as analysis.build_days_data / build_matrix
+        """
+        end = offset + size if limit is None else min(offset + size, limit)
+        rows = self._rows_between(offset, end)
+        counted = matrix_engine.triangle_mask(len(rows), self.max_k)
+        if index_cutoff and not self.date_mode:
+            k = np.arange(1, self.max_k + 1)
+            # Giống check_pos >= offset với check_pos = -1 ở ô không có dòng kiểm tra
+            counted = counted & self.has_row[rows] & ((self._region_index(rows)[:, None] - k[None, :]) >= offset)
+        return self._view(rows, counted)
+
+    def full(self, limit: Optional[int] = None) -> Tuple[List[Dict], matrix_engine.MatrixResult]:
+        """Every dàn (of the first `limit` df_region rows) with all cells counted, for sweep_offsets."""
+        rows = self._rows_between(0, self.num_region if limit is None else limit)
+        return self._view(rows, np.ones((len(rows), self.max_k), dtype=bool))
+
+    # --- LƯU / NẠP (pickle, xem analysis.save_state) ---
+    def __getstate__(self) -> Dict:
+        """Pickle only the used rows; combos and the key index are rebuilt on load."""
+        state = dict(self.__dict__)
+        c, d = self.num_checks, self.num_dan
+        for name in ("check_keys", "check_days", "check_in_region", "check_packed", "check_counts", "check_sizes"):
+            state[name] = state[name][:c].copy()
+        for name in ("dan_keys", "dan_region_pos", "dan_packed", "check_idx", "hit", "has_row", "has_data"):
+            state[name] = state[name][:d].copy()
+        state['dan_info'] = [{f: info[f] for f in ('date', 'day', 'source', 'src_mask')} for info in self.dan_info]
+        del state['_dan_by_key']
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        self.dan_info = [dict(d, combos=bitset.combo_strings(d['src_mask'], self.num_digits))
+                         for d in self.dan_info]
+        self._dan_by_key = {int(key): d for d, key in enumerate(self.dan_keys[:self.num_dan])}
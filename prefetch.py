@@ -0,0 +1,166 @@
+"""
+Warm the shared data cache right after each regional draw.
+
+Usage (sidecar, next to one or more app / API processes):
+    python prefetch.py --days 60
+
+Trong app Streamlit, prefetch.start() chạy cùng tiến trình (một luồng nền).
+"""
+import argparse
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+import analysis
+import data_fetcher
+import draw_columns
+
+# === LÀM NÓNG CACHE THEO LỊCH QUAY ===
+# Sau giờ có kết quả của mỗi miền chỉ tải lại các đài quay hôm đó
+# (LICH_QUAY_NAM / LICH_QUAY_TRUNG; Miền Bắc = bảng master Điện Toán + Thần Tài + XSMB),
+# ghi vào draw store và cache đĩa, rồi dựng lại bảng "Tất cả" của miền.
+# Trang đăng trễ thì thử lại mỗi LATE_RESULT_RECHECK giây trong LATE_RESULT_WINDOW.
+# Mỗi nguồn chỉ có một mục cache giữ lịch sử sâu nhất đã tải và refresh() giữ
+# nguyên độ sâu đó, nên chỉ cần làm mới một lần mỗi nguồn, không theo từng số
+# ngày người dùng nhập.
+DEFAULT_DAYS = 60
+START_DELAY = 60  # giây sau giờ có kết quả mới bắt đầu tải
+
+
+def drawn_stations(region: str, day: datetime) -> List[str]:
+    """Stations of a region drawing on `day` ("" for Miền Bắc)."""
+    if region == "Miền Bắc":
+        return [""]
+    name = analysis.WEEKDAY_NAMES[day.weekday()]
+    return data_fetcher.get_stations_by_day(region, name)
+
+
+def next_draw(region: str, after: datetime) -> datetime:
+    """First result time of a region strictly after `after` (every region draws daily)."""
+    after = after.astimezone(data_fetcher.VN_TZ)
+    when = datetime.combine(after.date(), data_fetcher.RESULT_READY[region], data_fetcher.VN_TZ)
+    return when if when > after else when + timedelta(days=1)
+
+
+class PrefetchScheduler(threading.Thread):
+    """
+    Background thread refreshing the cached loaders after every draw.
+
+    Args:
+        days: Minimum history length (Số ngày tải) to keep warm; sources
+            already cached deeper are refreshed at their stored depth
+        warm_on_start: Load everything once at start so the first user
+            never waits on a cold cache
+    """
+
+    def __init__(self, days: int = DEFAULT_DAYS, warm_on_start: bool = True):
+        super().__init__(name="prefetch", daemon=True)
+        self.days = days
+        self._stop_event = threading.Event()
+        self._wake = threading.Event()
+        self._warm_pending = warm_on_start
+        # (thời điểm chạy, miền, hạn thử lại; None = lần chính theo lịch)
+        self._queue: List[Tuple[datetime, str, Optional[datetime]]] = []
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self._wake.set()
+
+    def _warm(self) -> None:
+        try:
+            analysis.cached_master_data(self.days)
+            for region in ("Miền Nam", "Miền Trung"):
+                analysis.cached_region_data(region, self.days)
+        except Exception as e:
+            logging.error(f"Prefetch warm-up ({self.days} days) failed: {e}")
+
+    def refresh_region(self, region: str, now: Optional[datetime] = None) -> bool:
+        """
+        Refetch the stations of `region` that drew on `now`'s date.
+
+        Returns:
+            True when every one of them has its latest draw
+        """
+        now = now or datetime.now(data_fetcher.VN_TZ)
+        stations = drawn_stations(region, now)
+        complete = True
+        if region == "Miền Bắc":
+            columns = analysis.cached_master_data.refresh(self.days)
+            newest = columns.latest_dates().get(draw_columns.MASTER_STATION)
+            complete &= data_fetcher.has_latest_draw("", newest, now)
+        else:
+            for station in stations:
+                draws = analysis.cached_station_data.refresh(station, self.days)
+                complete &= data_fetcher.has_latest_draw(station, draws[0]['date'] if draws else None, now)
+            # Bảng cả miền: các đài không quay hôm nay đọc thẳng từ draw store
+            analysis.cached_region_data.refresh(region, self.days)
+        logging.info(f"Prefetched {region} {stations}: {'complete' if complete else 'waiting for results'}")
+        return complete
+
+    def _schedule(self, now: datetime) -> None:
+        for region in data_fetcher.RESULT_READY:
+            heapq.heappush(self._queue, (next_draw(region, now) + timedelta(seconds=START_DELAY), region, None))
+
+    def run(self) -> None:
+        self._schedule(datetime.now(data_fetcher.VN_TZ))
+        while not self._stop_event.is_set():
+            if self._warm_pending:
+                self._warm_pending = False
+                self._warm()
+                continue
+            when, region, deadline = self._queue[0]
+            wait = (when - datetime.now(data_fetcher.VN_TZ)).total_seconds()
+            if wait > 0:
+                self._wake.wait(wait)
+                self._wake.clear()
+                continue
+            heapq.heappop(self._queue)
+            now = datetime.now(data_fetcher.VN_TZ)
+            if deadline is None:
+                # Lần chính: hẹn luôn kỳ quay ngày mai
+                heapq.heappush(self._queue, (next_draw(region, now) + timedelta(seconds=START_DELAY), region, None))
+                deadline = now + timedelta(seconds=data_fetcher.LATE_RESULT_WINDOW)
+            try:
+                complete = self.refresh_region(region, now)
+            except Exception as e:
+                logging.error(f"Prefetch of {region} failed: {e}")
+                complete = False
+            retry = now + timedelta(seconds=data_fetcher.LATE_RESULT_RECHECK)
+            if not complete and retry < deadline:
+                heapq.heappush(self._queue, (retry, region, deadline))
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def start(days: int = DEFAULT_DAYS) -> PrefetchScheduler:
+    """Start the process-wide scheduler once (later calls return it unchanged)."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = PrefetchScheduler(days)
+            _scheduler.start()
+        return _scheduler
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS,
+                        help="Số ngày tải tối thiểu cần giữ nóng (nguồn đã tải sâu hơn giữ độ sâu đó)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    scheduler = PrefetchScheduler(args.days)
+    scheduler.start()
+    try:
+        while scheduler.is_alive():
+            scheduler.join(3600)
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()
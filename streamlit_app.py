@@ -2,8 +2,12 @@ import streamlit as st
 import pandas as pd
 import logic
 import data_fetcher
-import concurrent.futures
-from datetime import datetime, timedelta
+import matrix_engine
+import analysis
+import draw_columns
+import grid_search
+import prefetch
+import threading
 import importlib
 importlib.reload(data_fetcher)
 
@@ -146,6 +150,10 @@ st.markdown("""
         font-size: 14px;
     }
     
+    .cell-out {
+        opacity: 0.35;
+    }
+    
     .day-header {
         background-color: #17a2b8;
         color: white;
@@ -191,77 +199,48 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- QUẢN LÝ DỮ LIỆU ---
-@st.cache_data(ttl=1800)
+# Cache trên đĩa (analysis.cached_*): mọi tiến trình server dùng chung một bản dữ liệu
 def get_master_data(num_days):
-    # Tải song song tất cả các nguồn
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        f_dt = executor.submit(data_fetcher.fetch_dien_toan, num_days)
-        f_tt = executor.submit(data_fetcher.fetch_than_tai, num_days)
-        f_mb = executor.submit(data_fetcher.fetch_xsmb_full, num_days)
-        
-        dt = f_dt.result()
-        tt = f_tt.result()
-        mb_db, mb_g1, mb_g7, mb_g6 = f_mb.result()
-
-    # Xử lý khớp ngày (Quan trọng để không bị lệch)
-    df_dt = pd.DataFrame(dt)
-    df_tt = pd.DataFrame(tt)
-    
-    xsmb_rows = []
-    limit = min(len(dt), len(mb_db), len(mb_g1), len(mb_g7), len(mb_g6))
-    for i in range(limit):
-        # Extract last 2 digits from each G7 number
-        g7_2so_list = [num[-2:] for num in mb_g7[i]] if mb_g7[i] else []
-        g6_2so_list = [num[-2:] for num in mb_g6[i]] if mb_g6[i] else []
-        
-        # Extract last 3 digits (for 3D)
-        g7_3so_list = [num[-3:] for num in mb_g7[i] if len(num) >= 3] if mb_g7[i] else []
-        g6_3so_list = [num[-3:] for num in mb_g6[i] if len(num) >= 3] if mb_g6[i] else []
-        
-        xsmb_rows.append({
-            "date": dt[i]["date"], # Dùng ngày của Điện Toán làm chuẩn
-            "xsmb_full": mb_db[i],
-            "xsmb_2so": mb_db[i][-2:],
-            "xsmb_3so": mb_db[i][-3:] if len(mb_db[i]) >= 3 else "",
-            "g1_full": mb_g1[i],
-            "g1_2so": mb_g1[i][-2:],
-            "g1_3so": mb_g1[i][-3:] if len(mb_g1[i]) >= 3 else "",
-            "g7_list": mb_g7[i],  # List of 4 full numbers
-            "g7_2so": g7_2so_list,  # List of 4 last-2-digits
-            "g7_3so": g7_3so_list,
-            "g6_list": mb_g6[i],
-            "g6_2so": g6_2so_list,
-            "g6_3so": g6_3so_list
-        })
-    df_xsmb = pd.DataFrame(xsmb_rows)
+    # Tải song song tất cả các nguồn và gộp theo ngày
+    return analysis.master_table(analysis.cached_master_data(num_days))
 
-    # Gộp thành bảng tổng (Master Table)
-    if not df_dt.empty and not df_xsmb.empty:
-        df = pd.merge(df_dt, df_tt, on="date", how="left")
-        df = pd.merge(df, df_xsmb, on="date", how="left")
-        return df
-    return pd.DataFrame()
+@st.cache_resource
+def get_matrix_states():
+    # Trạng thái ma trận tăng dần theo cấu hình, dùng chung cho mọi phiên
+    return {'lock': threading.Lock(), 'states': {}, 'generation': None}
 
 # --- SIDEBAR ---
 with st.sidebar:
     st.title("🐔 SIÊU GÀ TOOL")
     st.caption("Version: Matrix View")
-    days_fetch = st.number_input("Số ngày tải:", 30, 365, 60, step=10)
+    # Lịch sử nhiều năm: chạy `python backfill.py --days N` trước để đọc từ draw store
+    days_fetch = st.number_input("Số ngày tải:", 30, 3650, 60, step=10)
+    # Làm nóng cache sau mỗi kỳ quay (một luồng nền cho cả tiến trình; làm mới
+    # mỗi nguồn ở độ sâu đang lưu trong cache nên không cần báo số ngày đang chọn)
+    prefetch.start()
     days_show = st.slider("Hiển thị:", 10, 100, 20)
     max_cols = st.slider("Số cột tối đa:", 10, 30, 20)
     st.session_state['max_cols'] = max_cols
+    reload_sources = {"Tất cả": None, "XSMB / Điện Toán / Thần Tài": "master",
+                      "Miền Nam": "Miền Nam", "Miền Trung": "Miền Trung"}
+    reload_choice = st.selectbox("Nguồn tải lại:", list(reload_sources), key="reload_source")
     if st.button("🔄 Tải lại dữ liệu", type="primary"):
-        st.cache_data.clear()
+        # Chỉ xóa cache của nguồn đã chọn
+        analysis.invalidate_data(reload_sources[reload_choice])
+        get_matrix_states.clear()
         st.rerun()
 
-@st.cache_data(ttl=1800)
 def get_station_data(station_name: str, total_days: int):
-    return data_fetcher.fetch_station_data(station_name, total_days)
+    return analysis.cached_station_data(station_name, total_days)
 
-@st.cache_data(ttl=1800)
 def get_all_stations(region: str):
+    # Chỉ đọc lịch quay cố định, không cần cache
     return data_fetcher.get_all_stations_in_region(region)
 
+def get_region_data(region: str, total_days: int):
+    # Tải đồng thời toàn bộ đài trong miền trên một event loop
+    return analysis.cached_region_data(region, total_days)
+
 # --- LOAD DATA ---
 try:
     with st.spinner("🚀 Đang tải dữ liệu đa luồng..."):
@@ -280,7 +259,7 @@ st.title("🎯 DÀN NUÔI (MATRIX)")
 st.divider()
 
 # TABS
-tab_2d, tab_3d = st.tabs(["2D (Nhị Hợp)", "3D (Tam Hợp)"])
+tab_2d, tab_3d, tab_grid = st.tabs(["2D (Nhị Hợp)", "3D (Tam Hợp)", "🧪 Dò tham số"])
 
 def render_matrix_view(mode_3d=False):
     # Row 1: Nguồn và Miền
@@ -294,23 +273,16 @@ def render_matrix_view(mode_3d=False):
         c3, c4, c5 = st.columns([1.5, 1.5, 1.5])
         
         # Filter options for 3D mode (G7 is only 2 digits in MB)
-        mb_options = ["XSMB (ĐB)", "Giải Nhất", "Giải 6"] if mode_3d else ["XSMB (ĐB)", "Giải Nhất", "Giải 7", "Giải 6"]
-        comp_mode = c3.selectbox("So với:", mb_options, key=f"comp_{mode_3d}")
+        comp_mode = c3.selectbox("So với:", analysis.prize_options(region, mode_3d), key=f"comp_{mode_3d}")
         
         check_range = c4.slider("Khung nuôi (ngày):", 1, 20, 7, key=f"range_{mode_3d}")
-        backtest_mode = c5.selectbox("Backtest:", ["Hiện tại", "Lùi 1 ngày", "Lùi 2 ngày", "Lùi 3 ngày", "Lùi 4 ngày", "Lùi 5 ngày"], key=f"back_{mode_3d}")
+        backtest_mode = c5.selectbox("Backtest:", ["Hiện tại", "Lùi 1 ngày", "Lùi 2 ngày", "Lùi 3 ngày", "Lùi 4 ngày", "Lùi 5 ngày", "Quét tất cả"], key=f"back_{mode_3d}")
         
         # Xác định cột so sánh
-        suffix = "_3so" if mode_3d else "_2so"
-        if "ĐB" in comp_mode:
-            col_comp = f"xsmb{suffix}"
-        elif "Nhất" in comp_mode:
-            col_comp = f"g1{suffix}"
-        elif "Giải 7" in comp_mode:
-            col_comp = f"g7{suffix}"
-        else:  # Giải 6
-            col_comp = f"g6{suffix}"
+        col_comp = analysis.comp_column(region, comp_mode, mode_3d)
+        prize = comp_mode
         selected_station = None
+        selected_day = analysis.ALL
         
     else:
         # Miền Nam/Trung: Hệ thống mới với Thứ/Đài/Giải
@@ -337,232 +309,94 @@ def render_matrix_view(mode_3d=False):
         
         # Dropdown Giải
         # Filter options for 3D mode (G8 is only 2 digits in MN/MT)
-        mn_options = ["ĐB", "G1", "G7"] if mode_3d else ["ĐB", "G1", "G8", "G7"]
-        prize_mode = c5.selectbox("Giải:", mn_options, key=f"prz_{mode_3d}")
+        prize_mode = c5.selectbox("Giải:", analysis.prize_options(region, mode_3d), key=f"prz_{mode_3d}")
         
         # Khung nuôi và Backtest
         check_range = c6.slider("Khung:", 1, 20, 7, key=f"range_{mode_3d}")
-        backtest_mode = c7.selectbox("Backtest:", ["Hiện tại", "Lùi 1", "Lùi 2", "Lùi 3", "Lùi 4", "Lùi 5"], key=f"back_{mode_3d}")
+        backtest_mode = c7.selectbox("Backtest:", ["Hiện tại", "Lùi 1", "Lùi 2", "Lùi 3", "Lùi 4", "Lùi 5", "Quét tất cả"], key=f"back_{mode_3d}")
         
         # Xác định cột so sánh
-        suffix = "_3so" if mode_3d else "_2so"
-        if prize_mode == "ĐB":
-            col_comp = f"db{suffix}"
-        elif prize_mode == "G1":
-            col_comp = f"g1{suffix}"
-        elif prize_mode == "G8":
-            col_comp = f"g8{suffix}"
-        else:  # G7
-            col_comp = f"g7{suffix}"
+        col_comp = analysis.comp_column(region, prize_mode, mode_3d)
+        prize = prize_mode
 
     # Tự động phân tích
     backtest_offset = 0
-    if backtest_mode != "Hiện tại":
+    sweep_mode = backtest_mode == "Quét tất cả"
+    if backtest_mode != "Hiện tại" and not sweep_mode:
         backtest_offset = int(backtest_mode.split()[1])
 
     if backtest_offset > 0:
         st.info(f"🔍 Backtest: Từ {backtest_offset} ngày trước")
 
     # === LOAD DỮ LIỆU ===
-    df_display = None
-    df_check_source = None
+    region_data = None
 
-    if region == "Miền Bắc":
-        # Sử dụng dữ liệu df_full đã load sẵn từ trước
-        df_display = df_full
-        df_check_source = df_full
-    else:
+    if region != "Miền Bắc":
         # Load dữ liệu từ API
         if selected_station == "Tất cả":
             # Load tất cả các đài trong MIỀN (để có full data cho check liên tục)
             all_stations = get_all_stations(region)
             
             with st.spinner(f"🔄 Đang tải dữ liệu toàn bộ {region} ({len(all_stations)} đài)..."):
-                all_station_data = []
-                # Tải song song (dùng cache)
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    future_to_station = {executor.submit(get_station_data, s, days_fetch): s for s in all_stations}
-                    for future in concurrent.futures.as_completed(future_to_station):
-                        station_name = future_to_station[future]
-                        try:
-                            data = future.result()
-                            # Thêm tên đài vào mỗi dòng dữ liệu
-                            for item in data:
-                                item['station'] = station_name
-                            all_station_data.extend(data)
-                        except Exception as exc:
-                            st.error(f"Lỗi tải đài {station_name}: {exc}")
-                
-                if not all_station_data:
+                # Tải đồng thời (dùng cache)
+                region_data = get_region_data(region, days_fetch)
+                if not len(region_data):
                     st.error("⚠️ Không thể tải dữ liệu")
                     st.stop()
-                
-                # Chuyển đổi sang DataFrame và gom nhóm theo ngày
-                df_temp = pd.DataFrame(all_station_data)
-                
-                # Gom nhóm theo ngày (Master Data cho Verification)
-                grouped_data = []
-                for date, group in df_temp.groupby('date'):
-                    day_results = []
-                    for _, row in group.iterrows():
-                        val = row.get(col_comp, "")
-                        if val:
-                            day_results.append({'station': row['station'], 'val': val})
-                    
-                    if day_results:
-                        grouped_data.append({'date': date, 'results': day_results})
-                
-                if not grouped_data:
-                    st.warning(f"⚠️ Không tìm thấy dữ liệu so sánh ({col_comp}) cho {region}")
-                    st.stop()
-
-                df_check_source = pd.DataFrame(grouped_data)
-                
-                # QUAN TRỌNG: Chuyển date string sang datetime để sort đúng
-                if 'date' in df_check_source.columns:
-                    df_check_source['date_obj'] = pd.to_datetime(df_check_source['date'], format='%d/%m/%Y')
-                    df_check_source = df_check_source.sort_values('date_obj', ascending=False)
-                    df_check_source = df_check_source.drop(columns=['date_obj'])  # Xóa cột tạm
-                else:
-                    st.error("Lỗi cấu trúc dữ liệu")
-                    st.stop()
-                
-                # Filter cho hiển thị (chỉ lấy những ngày đúng Thứ đã chọn)
-                if selected_day == "Tất cả":
-                    # Hiển thị tất cả các ngày
-                    df_display = df_check_source.copy()
-                else:
-                    WEEKDAY_MAP = {
-                        "Thứ 2": 0, "Thứ 3": 1, "Thứ 4": 2, "Thứ 5": 3, "Thứ 6": 4, "Thứ 7": 5, "Chủ Nhật": 6
-                    }
-                    target_weekday = WEEKDAY_MAP.get(selected_day)
-                    
-                    def is_target_day(date_str):
-                        try:
-                            return datetime.strptime(date_str, "%d/%m/%Y").weekday() == target_weekday
-                        except:
-                            return False
-                    
-                    df_display = df_check_source[df_check_source['date'].apply(is_target_day)].copy()
-                
         else:
             # Load dữ liệu cho đài đã chọn
             with st.spinner(f"🔄 Đang tải dữ liệu {selected_station}..."):
-                station_data = get_station_data(selected_station, total_days=days_fetch)
+                station_data = get_station_data(selected_station, days_fetch)
                 
                 if not station_data:
                     st.error(f"⚠️ Không thể tải dữ liệu cho {selected_station}")
                     st.stop()
-                
-                # Chuyển đổi sang DataFrame
-                df_temp = pd.DataFrame(station_data)
-                df_temp['results'] = df_temp.apply(lambda x: [{'station': selected_station, 'val': x.get(col_comp, "")}], axis=1)
-                df_display = df_temp[['date', 'results']]
-                df_check_source = df_display # Với 1 đài thì nguồn check cũng là chính nó
-
-    # Gán lại vào df_region để tương thích code phía dưới (df_region đóng vai trò là df_display)
-    df_region = df_display
+                region_data = draw_columns.from_station_records({selected_station: station_data})
 
+    # Dòng hiển thị (df_region) + nguồn kiểm tra; Miền Bắc dùng df_full đã load sẵn
+    view = analysis.make_view(region, src_mode, mode_3d, prize, df_full, region_data,
+                              station=selected_station or analysis.ALL, day=selected_day,
+                              max_cols=st.session_state.get('max_cols', 20))
+    if view is None:
+        st.warning(f"⚠️ Không tìm thấy dữ liệu so sánh ({col_comp}) cho {region}")
+        st.stop()
+    df_region = view.df_region
 
-    all_days_data = []
-    start_idx = backtest_offset
-    end_idx = min(backtest_offset + 20, len(df_region))
-
-    # Tạo lookup dictionary cho df_full để tra cứu nhanh theo ngày
-    df_full_lookup = df_full.set_index('date') if not df_full.empty else pd.DataFrame()
-
-    for i in range(start_idx, end_idx):
-        row = df_region.iloc[i]
-        date_val = row['date']
-        
-        # Xác định dòng dữ liệu nguồn (Source Row)
-        # Nếu là Miền Bắc thì chính là row hiện tại
-        # Nếu là Miền Nam/Trung thì phải tìm ngày tương ứng trong df_full
-        row_src = None
-        if region == "Miền Bắc":
-            row_src = row
-        else:
-            if date_val in df_full_lookup.index:
-                row_src = df_full_lookup.loc[date_val]
-                # Xử lý trường hợp trùng ngày (nếu có)
-                if isinstance(row_src, pd.DataFrame):
-                    row_src = row_src.iloc[0]
-        
-        if row_src is None:
-            continue
+    WINDOW_ROWS = analysis.WINDOW_ROWS  # Số dàn (dòng) hiển thị
 
-        src_str = ""
-        if src_mode == "Thần Tài": 
-            tt_val = row_src.get('tt_number', '')
-            src_str = str(tt_val)
-        elif src_mode == "Điện Toán": 
-            val = row_src.get('dt_numbers', [])
-            if isinstance(val, list):
-                 src_str = "".join(val)
-            else:
-                 src_str = str(val) if pd.notna(val) else ""
-        else:
-            tt_raw = row_src.get('tt_number', '')
-            tt_part = str(tt_raw)
-            dt_raw = row_src.get('dt_numbers', [])
-            if isinstance(dt_raw, list):
-                dt_part = "".join(dt_raw)
-            else:
-                dt_part = str(dt_raw) if pd.notna(dt_raw) else ""
-            src_str = (tt_part if tt_part and tt_part != "nan" else "") + (dt_part if dt_part and dt_part != "nan" else "")
-        
-        if not src_str or src_str == "nan": 
-            continue
-        
-        digits = set(src_str)
-        if mode_3d:
-            # Tam hợp: 3 digits
-            combos = sorted({a+b+c for a in digits for b in digits for c in digits})
-        else:
-            # Nhị hợp: 2 digits
-            combos = sorted({a+b for a in digits for b in digits})
-        
-        # Store results for this date (for comparison later)
-        # If Miền Bắc: result is in row[col_comp]
-        # If Miền Nam/Trung: result is in row['results'] (list of dicts)
-        
-        date_results = []
-        if region == "Miền Bắc":
-            val = row.get(col_comp, "")
-            # Handle G7/G6 (list of numbers) vs ĐB/G1 (single value)
-            if col_comp in ["g7_2so", "g6_2so", "g7_3so", "g6_3so"] and isinstance(val, list):
-                for g_num in val:
-                    if g_num and g_num != "nan":
-                        date_results.append({'station': 'XSMB', 'val': g_num})
-            else:
-                val_str = str(val)
-                if val_str and val_str != "nan":
-                    date_results.append({'station': 'XSMB', 'val': val_str})
-        else:
-            # row['results'] is already a list of dicts {station, val}
-            res_list = row.get('results', [])
-            if isinstance(res_list, list):
-                date_results = res_list
-                
-        all_days_data.append({
-            'date': row['date'], 
-            'source': src_str, 
-            'combos': combos, 
-            'index': i,
-            'results': date_results
-        })
+    # === MA TRẬN TĂNG DẦN (dùng chung cho Bảng, Thống kê, Dàn Chưa Ra, Chu kỳ) ===
+    # Trạng thái giữ qua các lần rerun: kỳ quay mới chỉ thêm 1 dàn + 1 đường chéo ô kiểm tra.
+    # Backtest và Khung nuôi chỉ cắt cửa sổ / tra tổng tích lũy, không tính lại ma trận.
+    # Lưu cả vào cache đĩa: khởi động lại app chỉ cần thêm các kỳ mới.
+    # Tiến trình khác "Tải lại dữ liệu" thì data_generation đổi: bỏ hết trạng thái cũ
+    generation = analysis.data_generation()
+    state_key = (mode_3d, src_mode, region, prize, selected_station, selected_day, days_fetch, generation)
+    matrix_states = get_matrix_states()
+    with matrix_states['lock']:
+        if matrix_states['generation'] != generation:
+            matrix_states['states'].clear()
+            matrix_states['generation'] = generation
+        previous = matrix_states['states'].get(state_key) or analysis.load_state(state_key)
+        signature = previous.signature() if previous is not None else None
+        state = analysis.update_state(view, previous)
+        matrix_states['states'][state_key] = state
+        if state is not previous or state.signature() != signature:
+            analysis.save_state(state_key, state)
+        all_days_data, matrix = state.window(backtest_offset, WINDOW_ROWS, limit=len(df_region),
+                                             index_cutoff=not view.date_mode)
+        if sweep_mode:
+            full_days_data, full_matrix = state.full(limit=len(df_region))
+    window = matrix_engine.window_counts(matrix)
 
     if not all_days_data:
         st.warning("⚠️ Không có dữ liệu")
     else:
+
         st.markdown("### 📋 Bảng Theo Dõi")
         
         # Giới hạn số cột tối đa để tránh vỡ khung trên mobile
         MAX_COLS = st.session_state.get('max_cols', 20)
         
-        # Lookup for verification
-        check_source_lookup = df_check_source.set_index('date') if df_check_source is not None and not df_check_source.empty else pd.DataFrame()
-        
         # Tạo bảng HTML dạng tam giác
         table_html = "<div class='table-wrapper'>"
         table_html += "<table class='tracking-table'><thead><tr>"
@@ -574,9 +408,12 @@ def render_matrix_view(mode_3d=False):
             table_html += f"<th>N{k}</th>"
         table_html += "</tr></thead><tbody>"
         
+        # Ô ngoài khung nuôi (N > Khung) hiển thị mờ
+        out_cls = " cell-out"
+        
         # Mỗi dòng = 1 dàn (1 ngày)
         for row_idx, day_data in enumerate(all_days_data):
-            date, source, combos, i = day_data['date'], day_data['source'], day_data['combos'], day_data['index']
+            date, source = day_data['date'], day_data['source']
             
             table_html += "<tr>"
             # Cột Ngày
@@ -592,61 +429,12 @@ def render_matrix_view(mode_3d=False):
                 if k > num_cols_this_row:
                     # Ô trống (ngoài tam giác)
                     table_html += "<td style='background-color:#f8f9fa;border:none;'></td>"
-                else:
-                    check_results = []
-                    
-                    if selected_station == "Tất cả" and region != "Miền Bắc":
-                        # Continuous Check: Date + k days
-                        try:
-                            current_date_obj = datetime.strptime(date, "%d/%m/%Y")
-                            check_date_obj = current_date_obj + timedelta(days=k)
-                            check_date_str = check_date_obj.strftime("%d/%m/%Y")
-                            
-                            if check_date_str in check_source_lookup.index:
-                                check_row = check_source_lookup.loc[check_date_str]
-                                if isinstance(check_row, pd.DataFrame):
-                                    check_row = check_row.iloc[0]
-                                    
-                                res_list = check_row.get('results', [])
-                                if isinstance(res_list, list):
-                                    check_results = res_list
-                        except:
-                            pass
-                    else:
-                        # Index-based check (Next Draw)
-                        check_idx = i - k
-                        if check_idx >= 0 and check_idx < len(df_region):
-                            check_row = df_region.iloc[check_idx]
-                            
-                            if region == "Miền Bắc":
-                                val = check_row.get(col_comp, "")
-                                if col_comp in ["g7_2so", "g6_2so", "g7_3so", "g6_3so"] and isinstance(val, list):
-                                    for g_num in val:
-                                        if g_num and g_num != "nan":
-                                            check_results.append({'station': 'XSMB', 'val': g_num})
-                                else:
-                                    val_str = str(val)
-                                    if val_str and val_str != "nan":
-                                        check_results.append({'station': 'XSMB', 'val': val_str})
-                            else:
-                                res_list = check_row.get('results', [])
-                                if isinstance(res_list, list):
-                                    check_results = res_list
-                    
-                    # Kiểm tra xem CÓ SỐ NÀO trong dàn này trúng không
-                    is_hit = False
-                    for res in check_results:
-                        if res['val'] in combos:
-                            is_hit = True
-                            break
-                    
-                    # Render cell
-                    if is_hit:
-                        table_html += "<td class='cell-hit'>✓</td>"
-                    elif check_results:  # Có dữ liệu nhưng không trúng
-                        table_html += "<td class='cell-miss'>−</td>"
-                    else:  # Không có dữ liệu
-                        table_html += "<td>−</td>"
+                elif matrix.hit[row_idx, k - 1]:
+                    table_html += f"<td class='cell-hit{out_cls if k > check_range else ''}'>✓</td>"
+                elif matrix.has_data[row_idx, k - 1]:  # Có dữ liệu nhưng không trúng
+                    table_html += f"<td class='cell-miss{out_cls if k > check_range else ''}'>−</td>"
+                else:  # Không có dữ liệu
+                    table_html += "<td>−</td>"
             
             table_html += "</tr>"
         
@@ -656,134 +444,55 @@ def render_matrix_view(mode_3d=False):
         # Divider sau bảng
         st.markdown("---")
         st.subheader("📊 Thống kê")
-        total_days, total_checks, total_hits = len(all_days_data), 0, 0
-        for row_idx, day_data in enumerate(all_days_data):
-            combos, i, date = day_data['combos'], day_data['index'], day_data['date']
-            for k in range(1, row_idx + 2):
-                is_valid_check = False
-                check_results = []
-                
-                if selected_station == "Tất cả" and region != "Miền Bắc":
-                    try:
-                        current_date_obj = datetime.strptime(date, "%d/%m/%Y")
-                        check_date_obj = current_date_obj + timedelta(days=k)
-                        check_date_str = check_date_obj.strftime("%d/%m/%Y")
-                        
-                        if check_date_str in check_source_lookup.index:
-                             check_row = check_source_lookup.loc[check_date_str]
-                             if isinstance(check_row, pd.DataFrame): check_row = check_row.iloc[0]
-                             res_list = check_row.get('results', [])
-                             if isinstance(res_list, list):
-                                 check_results = res_list
-                             is_valid_check = True
-                    except:
-                        pass
-                else:
-                    idx = i - k
-                    if idx >= 0 and idx >= backtest_offset:
-                        is_valid_check = True
-                        check_row = df_region.iloc[idx]
-                        if region == "Miền Bắc":
-                            val = check_row.get(col_comp, "")
-                            if col_comp in ["g7_2so", "g6_2so", "g7_3so", "g6_3so"] and isinstance(val, list):
-                                for g_num in val:
-                                    if g_num and g_num != "nan":
-                                        check_results.append({'station': 'XSMB', 'val': g_num})
-                            else:
-                                val_str = str(val)
-                                if val_str and val_str != "nan":
-                                    check_results.append({'station': 'XSMB', 'val': val_str})
-                        else:
-                            res_list = check_row.get('results', [])
-                            if isinstance(res_list, list):
-                                check_results = res_list
-
-                if is_valid_check:
-                    total_checks += 1
-                    is_hit = False
-                    for res in check_results:
-                        if res['val'] in combos:
-                            is_hit = True
-                            break
-                    if is_hit:
-                        total_hits += 1
-        
-        hit_rate = round(total_hits / total_checks * 100, 1) if total_checks > 0 else 0
+        stats = matrix_engine.summarize_window(window, check_range)
+        total_days, total_checks, total_hits = stats['total_days'], stats['total_checks'], stats['total_hits']
+        hit_rate = stats['hit_rate']
         col_s1, col_s2, col_s3, col_s4 = st.columns(4)
         col_s1.metric("Tổng ngày", total_days)
         col_s2.metric("Tổng kiểm tra", total_checks)
         col_s3.metric("Đã trúng", total_hits)
         col_s4.metric("Tỷ lệ", f"{hit_rate}%")
         
-        # === TỔNG HỢP DÀN CHƯA RA ===
-        st.markdown("---")
-        st.subheader("🎯 Tổng hợp Dàn Chưa Ra")
-        
-        pending_by_date = []
+        # Kết quả theo khung nuôi: trúng trong khung / trượt khung / đang nuôi
+        col_k1, col_k2, col_k3, col_k4 = st.columns(4)
+        col_k1.metric("Trúng trong khung", stats['hit_days'])
+        col_k2.metric("Trượt khung", stats['expired_days'])
+        col_k3.metric("Đang nuôi", stats['feeding_days'])
+        col_k4.metric(f"Tỷ lệ khung {check_range} ngày", f"{stats['window_rate']}%")
         
-        for row_idx, day_data in enumerate(all_days_data):
-            combos = day_data['combos']
-            date = day_data['date']
-            i = day_data['index']
-            num_cols_this_row = row_idx + 1
-            hit_numbers = set()
+        # === QUÉT BACKTEST: mọi mốc lùi trong 1 lần tính ===
+        if sweep_mode:
+            st.markdown("---")
+            st.subheader("📈 Quét Backtest (mọi mốc lùi)")
+            sweep = matrix_engine.sweep_offsets(full_matrix, [d['index'] for d in full_days_data],
+                                                window=WINDOW_ROWS, index_cutoff=not view.date_mode)
+            df_sweep = sweep.summary()
+            df_sweep.insert(1, 'date', df_region['date'].iloc[df_sweep['offset']].to_numpy())
+            df_sweep = df_sweep[df_sweep['checks'] > 0]
             
-            # Kiểm tra xem có số nào trong dàn đã trúng chưa (chỉ xét dữ liệu lịch sử)
-            for k in range(1, num_cols_this_row + 1):
-                check_results = []
-                
-                if selected_station == "Tất cả" and region != "Miền Bắc":
-                    try:
-                        current_date_obj = datetime.strptime(date, "%d/%m/%Y")
-                        check_date_obj = current_date_obj + timedelta(days=k)
-                        check_date_str = check_date_obj.strftime("%d/%m/%Y")
-                        
-                        if check_date_str in check_source_lookup.index:
-                             check_row = check_source_lookup.loc[check_date_str]
-                             if isinstance(check_row, pd.DataFrame): check_row = check_row.iloc[0]
-                             res_list = check_row.get('results', [])
-                             if isinstance(res_list, list):
-                                 check_results = res_list
-                    except:
-                        pass
-                else:
-                    idx = i - k
-                    if idx >= 0 and idx >= backtest_offset:
-                        check_row = df_region.iloc[idx]
-                        if region == "Miền Bắc":
-                            val = check_row.get(col_comp, "")
-                            if col_comp in ["g7_2so", "g6_2so", "g7_3so", "g6_3so"] and isinstance(val, list):
-                                for g_num in val:
-                                    if g_num and g_num != "nan":
-                                        check_results.append({'station': 'XSMB', 'val': g_num})
-                            else:
-                                val_str = str(val)
-                                if val_str and val_str != "nan":
-                                    check_results.append({'station': 'XSMB', 'val': val_str})
-                        else:
-                            res_list = check_row.get('results', [])
-                            if isinstance(res_list, list):
-                                check_results = res_list
+            if df_sweep.empty:
+                st.warning("⚠️ Không đủ dữ liệu để quét")
+            else:
+                best = df_sweep.loc[df_sweep['hit_rate'].idxmax()]
+                col_w1, col_w2, col_w3 = st.columns(3)
+                col_w1.metric("Số mốc lùi", len(df_sweep))
+                col_w2.metric("Tỷ lệ TB", f"{round(df_sweep['hits'].sum() / df_sweep['checks'].sum() * 100, 1)}%")
+                col_w3.metric("Cao nhất", f"{best['hit_rate']}%", f"Lùi {best['offset']}")
                 
-                for res in check_results:
-                    if res['val'] in combos:
-                        hit_numbers.add(res['val'])
-            
-            # Nếu CHƯA có số nào trúng (hit_numbers rỗng) thì dàn này chưa ra
-            if not hit_numbers:
-                try:
-                    date_obj = datetime.strptime(date, "%d/%m/%Y")
-                    weekday_names = ["Thứ 2", "Thứ 3", "Thứ 4", "Thứ 5", "Thứ 6", "Thứ 7", "Chủ Nhật"]
-                    weekday = weekday_names[date_obj.weekday()]
-                except:
-                    weekday = ""
+                st.line_chart(df_sweep.set_index('offset')['hit_rate'])
+                st.dataframe(df_sweep.rename(columns={
+                    'offset': 'Lùi', 'date': 'Ngày', 'checks': 'Kiểm tra', 'hits': 'Trúng', 'hit_rate': 'Tỷ lệ (%)'
+                }), use_container_width=True, hide_index=True)
                 
-                pending_by_date.append({
-                    'Ngày': f"{weekday} {date}" if weekday else date,
-                    'Dàn số': ', '.join(sorted(combos)),
-                    'Số lượng': len(combos),
-                    'combos': combos  # Giữ lại để phân tích tần suất
-                })
+                st.markdown("**Tỷ lệ trúng (%) theo mốc lùi × cột N:**")
+                df_rate = sweep.rate_by_column().loc[df_sweep['offset']].dropna(axis=1, how='all')
+                st.dataframe(df_rate, use_container_width=True)
+        
+        # === TỔNG HỢP DÀN CHƯA RA ===
+        st.markdown("---")
+        st.subheader("🎯 Tổng hợp Dàn Chưa Ra")
+        
+        pending_by_date = analysis.pending_table(all_days_data, window, check_range)
         
         if pending_by_date:
             # Hiển thị bảng theo ngày
@@ -836,147 +545,17 @@ def render_matrix_view(mode_3d=False):
             col_p1.metric("Số ngày có dàn chưa ra", total_days_pending)
             col_p2.metric("Tổng số unique trong các dàn", total_unique_numbers)
         else:
-            st.success("✅ Tất cả các dàn đều đã ra (có ít nhất 1 số trúng)!")
+            st.success(f"✅ Tất cả các dàn đều đã ra trong khung {check_range} ngày (có ít nhất 1 số trúng)!")
         
         # === PHÂN TÍCH CHU KỲ & NHẬN ĐỊNH ===
         st.markdown("---")
         st.subheader("🔮 Phân tích Chu kỳ & Nhận định")
         st.caption("Dựa trên dữ liệu bảng theo dõi")
         
-        # Thu thập dữ liệu chu kỳ cho mỗi dàn
-        cycle_analysis = []
-        
-        for row_idx, day_data in enumerate(all_days_data):
-            combos = day_data['combos']
-            date = day_data['date']
-            i = day_data['index']
-            
-            # Phân tích dữ liệu từ bảng theo dõi
-            num_cols_this_row = row_idx + 1
-            hits = []  # Vị trí các lần trúng (1, 2, 3...)
-            misses = []  # Vị trí các lần không trúng
-            
-            for k in range(1, num_cols_this_row + 1):
-                check_results = []
-                
-                if selected_station == "Tất cả" and region != "Miền Bắc":
-                    # Use date-based check for All Stations
-                    try:
-                        current_date_obj = datetime.strptime(date, "%d/%m/%Y")
-                        check_date_obj = current_date_obj + timedelta(days=k)
-                        check_date_str = check_date_obj.strftime("%d/%m/%Y")
-                        
-                        if check_date_str in check_source_lookup.index:
-                             check_row = check_source_lookup.loc[check_date_str]
-                             if isinstance(check_row, pd.DataFrame): check_row = check_row.iloc[0]
-                             res_list = check_row.get('results', [])
-                             if isinstance(res_list, list):
-                                 check_results = res_list
-                    except:
-                        pass
-                else:
-                    # Use index-based check for single station/Miền Bắc
-                    idx = i - k
-                    if idx >= 0 and idx >= backtest_offset:
-                        check_row = df_region.iloc[idx]
-                        if region == "Miền Bắc":
-                            val = check_row.get(col_comp, "")
-                            if col_comp in ["g7_2so", "g6_2so", "g7_3so", "g6_3so"] and isinstance(val, list):
-                                for g_num in val:
-                                    if g_num and g_num != "nan":
-                                        check_results.append({'station': 'XSMB', 'val': g_num})
-                            else:
-                                val_str = str(val)
-                                if val_str and val_str != "nan":
-                                    check_results.append({'station': 'XSMB', 'val': val_str})
-                        else:
-                            res_list = check_row.get('results', [])
-                            if isinstance(res_list, list):
-                                check_results = res_list
-                
-                # Check if any result matches
-                is_hit = False
-                for res in check_results:
-                    if res['val'] in combos:
-                        is_hit = True
-                        break
-                
-                if is_hit:
-                    hits.append(k)
-                elif check_results:  # Only count as miss if there was data to check
-                    misses.append(k)
-            
-            # Tính toán chu kỳ và nhận định
-            total_checks = len(hits) + len(misses)
-            hit_count = len(hits)
-            miss_count = len(misses)
-            
-            if total_checks == 0:
-                status = "🆕 Mới tạo - Chưa có dữ liệu"
-                avg_cycle_display = "N/A"
-                last_hit_display = "N/A"
-                priority = 2
-                overdue = 0
-            elif hit_count == 0:
-                # Chưa ra lần nào
-                status = f"🔥 Chưa ra ({total_checks} ngày kiểm tra) - Ưu tiên cao"
-                avg_cycle_display = "Chưa ra"
-                last_hit_display = "Chưa bao giờ"
-                priority = 0
-                overdue = total_checks
-            else:
-                # Đã ra ít nhất 1 lần
-                # Tính chu kỳ giữa các lần trúng
-                if len(hits) > 1:
-                    cycles = [hits[j-1] - hits[j] for j in range(1, len(hits))]
-                    avg_cycle = round(sum(cycles) / len(cycles), 1)
-                else:
-                    avg_cycle = hits[0]
-                
-                avg_cycle_display = f"{avg_cycle} ngày"
-                last_hit_display = f"N{hits[0]}"
-                
-                # Nhận định dựa trên chu kỳ
-                days_since_last = hits[0] - 1  # Số ngày từ lần trúng cuối
-                
-                if days_since_last == 0:
-                    status = "✅ Vừa trúng hôm qua"
-                    priority = 2
-                    overdue = 0
-                elif days_since_last < avg_cycle:
-                    remaining = round(avg_cycle - days_since_last)
-                    status = f"⏳ Trong chu kỳ (còn ~{remaining} ngày)"
-                    priority = 2
-                    overdue = 0
-                else:
-                    overdue_days = days_since_last - avg_cycle
-                    if overdue_days > avg_cycle * 0.5:
-                        status = f"⚠️ Quá chu kỳ {round(overdue_days)} ngày - Ưu tiên cao"
-                        priority = 1
-                        overdue = overdue_days
-                    else:
-                        status = f"📍 Quá chu kỳ {round(overdue_days)} ngày"
-                        priority = 1
-                        overdue = overdue_days
-            
-            cycle_analysis.append({
-                'Ngày': date,
-                'Dàn': ', '.join(sorted(combos)),
-                'Chu kỳ TB': avg_cycle_display,
-                'Lần cuối ra': last_hit_display,
-                'Đã kiểm tra': total_checks,
-                'Trúng/Trượt': f"{hit_count}/{miss_count}",
-                'Nhận định': status,
-                # Thêm các trường ẩn để sắp xếp
-                '_sort_priority': priority,
-                '_overdue_days': overdue,
-                '_total_checks': total_checks
-            })
+        # Thu thập dữ liệu chu kỳ cho mỗi dàn (đã sắp xếp theo mức ưu tiên)
+        cycle_analysis = analysis.cycle_table(all_days_data, matrix)
         
         if cycle_analysis:
-            # Sắp xếp: Ưu tiên chưa ra (nhiều ngày nhất), sau đó quá chu kỳ nhiều nhất, sau đó trong chu kỳ
-            cycle_analysis.sort(key=lambda x: (x['_sort_priority'], -x['_overdue_days'], -x['_total_checks']))
-            
             # Loại bỏ các trường ẩn trước khi hiển thị
             cycle_analysis_display = [{k: v for k, v in item.items() if not k.startswith('_')} for item in cycle_analysis]
             
@@ -988,7 +567,7 @@ def render_matrix_view(mode_3d=False):
             st.markdown("**💡 Gợi ý ưu tiên theo dõi:**")
             
             # Lọc các dàn ưu tiên cao
-            priority_sets = [item for item in cycle_analysis if "Ưu tiên cao" in item['Nhận định'] or "Chưa ra lần nào" in item['Nhận định']]
+            priority_sets = [item for item in cycle_analysis if analysis.is_priority(item['Nhận định'])]
             
             if priority_sets:
                 st.info(f"Có **{len(priority_sets)}** dàn cần ưu tiên theo dõi (quá hạn hoặc chưa ra lần nào)")
@@ -1043,6 +622,49 @@ def render_matrix_view(mode_3d=False):
         else:
             pass  # Không có dữ liệu để phân tích chu kỳ
 
+def render_grid_search():
+    # Dò mọi tổ hợp Nguồn × Giải × 2D/3D × Đài, chạy nền trên process pool
+    st.markdown("### 🧪 Dò tham số")
+    st.caption("Chạy mọi tổ hợp Nguồn × Giải × 2D/3D × Đài trên tất cả nhân CPU, xếp hạng theo tỷ lệ trúng")
+    
+    grid_job = st.session_state.get('grid_job')
+    running = grid_job is not None and not grid_job.done()
+    if st.button("▶️ Chạy dò tham số", disabled=running, key="grid_run"):
+        # Không chặn luồng của Streamlit: chỉ gửi job rồi trả về ngay
+        grid_job = grid_search.start_grid(days_fetch, df_full=df_full, max_cols=st.session_state.get('max_cols', 20))
+        st.session_state['grid_job'] = grid_job
+        running = True
+    
+    if grid_job is None:
+        return
+    if running:
+        st.info("⏳ Đang dò tham số... Bấm cập nhật để xem kết quả")
+        st.button("🔄 Cập nhật", key="grid_refresh")
+        return
+    if grid_job.exception() is not None:
+        st.error(f"Lỗi: {grid_job.exception()}")
+        return
+    
+    df_grid = grid_job.result()
+    if df_grid.empty:
+        st.warning("⚠️ Không có dữ liệu")
+        return
+    
+    best = df_grid.iloc[0]
+    col_g1, col_g2, col_g3 = st.columns(3)
+    col_g1.metric("Số tổ hợp", len(df_grid))
+    col_g2.metric("Tốt nhất", f"{best['sweep_hit_rate']}%")
+    col_g3.metric("Hiện tại", f"{best['hit_rate']}%")
+    st.dataframe(df_grid.assign(mode_3d=df_grid['mode_3d'].map({False: "2D", True: "3D"})).rename(columns={
+        'rank': 'Hạng', 'region': 'Miền', 'station': 'Đài', 'src_mode': 'Nguồn', 'prize': 'Giải', 'mode_3d': 'Loại',
+        'rows': 'Số dàn', 'checks': 'Kiểm tra', 'hits': 'Trúng', 'hit_rate': 'Tỷ lệ (%)',
+        'sweep_offsets': 'Số mốc lùi', 'sweep_checks': 'Kiểm tra (quét)', 'sweep_hits': 'Trúng (quét)',
+        'sweep_hit_rate': 'Tỷ lệ quét (%)', 'pending': 'Chưa ra', 'priority': 'Ưu tiên', 'avg_cycle': 'Chu kỳ TB'
+    }), use_container_width=True, hide_index=True)
+
+with tab_grid:
+    render_grid_search()
+
 with tab_2d:
     render_matrix_view(mode_3d=False)
 
@@ -0,0 +1,173 @@
+"""
+Generate synthetic draw histories for load and scale testing (no network).
+
+Usage:
+    python synth_data.py --years 10                     # kích thước + thời gian sinh 10 năm, mọi đài
+    python synth_data.py --years 10 --regions mn --seed 7
+
+Trong Python:
+    df_full = analysis.master_table(synth_data.master_data(3650))
+    region_data = synth_data.region_data("Miền Nam", 520)
+    synth_data.install()   # app / CLI / API đọc dữ liệu giả thay cho các trang thật
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import analysis
+import data_fetcher
+import draw_columns
+
+# === DỮ LIỆU GIẢ LẬP ===
+# Cùng định dạng với fetch_station_data / fetch_dien_toan / fetch_than_tai /
+# fetch_xsmb (số dạng chuỗi, ngày 'dd/mm/YYYY', mới -> cũ), theo đúng
+# lịch quay LICH_QUAY_NAM / LICH_QUAY_TRUNG; Điện Toán, Thần Tài, XSMB quay mỗi ngày.
+# Mỗi kỳ có RNG riêng theo (seed, nguồn, ngày): lịch sử N kỳ luôn là phần đầu của
+# lịch sử M > N kỳ, giống dữ liệu thật khi cắt theo độ sâu.
+
+# Số chữ số và số lượng số mỗi giải của đài Miền Nam/Trung
+STATION_LAYOUT = {
+    "db": (6, 1), "g1": (5, 1), "g2": (5, 1), "g3": (5, 2), "g4": (5, 7),
+    "g5": (4, 1), "g6": (4, 3), "g7": (3, 1), "g8": (2, 1),
+}
+# XSMB: ĐB, G1 (5 chữ số), G6 (3 số x 3 chữ số), G7 (4 số x 2 chữ số)
+XSMB_LAYOUT = {"db": (5, 1), "g1": (5, 1), "g6": (3, 3), "g7": (2, 4)}
+
+
+def _newest(station: str) -> date:
+    """Date of the station's last draw with results out by now ("" = Miền Bắc / daily sources)."""
+    return data_fetcher.last_result_time(station).date()
+
+
+def _rng(seed: int, source: str, day: date) -> random.Random:
+    return random.Random(f"{seed}|{source}|{day.isoformat()}")
+
+
+def _number(rng: random.Random, digits: int) -> str:
+    return f"{rng.randrange(10 ** digits):0{digits}d}"
+
+
+def _draw_dates(weekdays: set, num_days: int, end: date) -> List[date]:
+    """Newest `num_days` dates on or before `end` falling on `weekdays` (Mon=0)."""
+    dates, day = [], end
+    while len(dates) < num_days and weekdays:
+        if day.weekday() in weekdays:
+            dates.append(day)
+        day -= timedelta(days=1)
+    return dates
+
+
+def draws_in(station: str, span_days: int, end: Optional[date] = None) -> int:
+    """Number of draws of a station in the `span_days` calendar days up to `end` ("" = daily sources)."""
+    weekdays = data_fetcher._station_draw_weekdays(station) if station else set(range(7))
+    end = end or _newest(station)
+    return sum((end - timedelta(days=i)).weekday() in weekdays for i in range(span_days))
+
+
+def station_draws(station: str, num_days: int, end: Optional[date] = None, seed: int = 0) -> List[Dict]:
+    """
+    Synthetic draws of a Miền Nam/Trung station, fetch_station_data shape.
+
+    Args:
+        station: Station name (its weekdays come from LICH_QUAY_*)
+        num_days: Number of draws
+        end: Newest possible date (default: the last draw whose results are out)
+        seed: Dataset seed
+
+    Returns:
+        Draws newest first
+    """
+    draws = []
+    for day in _draw_dates(data_fetcher._station_draw_weekdays(station), num_days, end or _newest(station)):
+        rng = _rng(seed, station, day)
+        draw = {"date": day.strftime("%d/%m/%Y")}
+        for prize, (digits, count) in STATION_LAYOUT.items():
+            draw[prize] = ",".join(_number(rng, digits) for _ in range(count))
+        for prize in ("db", "g1", "g8", "g7"):
+            draw[f"{prize}_2so"] = draw[prize][-2:]
+        draws.append(draw)
+    return draws
+
+
+def dien_toan(num_days: int, end: Optional[date] = None, seed: int = 0) -> List[Dict]:
+    """Synthetic Điện Toán 123 draws, fetch_dien_toan shape."""
+    draws = []
+    for day in _draw_dates(set(range(7)), num_days, end or _newest("")):
+        rng = _rng(seed, "dien_toan", day)
+        draws.append({"date": day.strftime("%d/%m/%Y"), "dt_numbers": [_number(rng, d) for d in (1, 2, 3)]})
+    return draws
+
+
+def than_tai(num_days: int, end: Optional[date] = None, seed: int = 0) -> List[Dict]:
+    """Synthetic Thần Tài draws, fetch_than_tai shape."""
+    return [{"date": day.strftime("%d/%m/%Y"), "tt_number": _number(_rng(seed, "than_tai", day), 4)}
+            for day in _draw_dates(set(range(7)), num_days, end or _newest(""))]
+
+
+def xsmb(num_days: int, end: Optional[date] = None, seed: int = 0) -> List[Dict]:
+    """Synthetic Miền Bắc draws, fetch_xsmb shape (ĐB, G1, G6 list, G7 list)."""
+    draws = []
+    for day in _draw_dates(set(range(7)), num_days, end or _newest("")):
+        rng = _rng(seed, "xsmb", day)
+        numbers = {prize: [_number(rng, digits) for _ in range(count)]
+                   for prize, (digits, count) in XSMB_LAYOUT.items()}
+        draws.append({"date": day.strftime("%d/%m/%Y"), "db": numbers["db"][0], "g1": numbers["g1"][0],
+                      "g6": numbers["g6"], "g7": numbers["g7"]})
+    return draws
+
+
+def master_data(num_days: int, end: Optional[date] = None, seed: int = 0) -> draw_columns.DrawColumns:
+    """Synthetic master columns, analysis.load_master_data shape."""
+    return draw_columns.from_master(dien_toan(num_days, end, seed), than_tai(num_days, end, seed),
+                                    xsmb(num_days, end, seed))
+
+
+def region_data(region: str, num_days: int, end: Optional[date] = None,
+                seed: int = 0) -> draw_columns.DrawColumns:
+    """Synthetic draws of every station of a region, analysis.load_region_data shape."""
+    stations = [] if region == "Miền Bắc" else data_fetcher.get_all_stations_in_region(region)
+    return draw_columns.from_station_records({s: station_draws(s, num_days, end, seed) for s in stations})
+
+
+def install(end: Optional[date] = None, seed: int = 0) -> None:
+    """
+    Replace the data_fetcher fetch functions with the generator for this process.
+
+    Everything built on them (analysis loaders, disk cache, prefetch, app,
+    CLI, API server) then runs on synthetic data of any depth. Point
+    DISK_CACHE_DIR at a scratch directory so real cached data is not mixed in.
+    """
+    data_fetcher.fetch_station_data = lambda station_name, total_days=60: station_draws(
+        station_name, total_days, end, seed)
+    data_fetcher.fetch_dien_toan = lambda total_days: dien_toan(total_days, end, seed)
+    data_fetcher.fetch_than_tai = lambda total_days: than_tai(total_days, end, seed)
+    # fetch_xsmb_full đọc qua fetch_xsmb
+    data_fetcher.fetch_xsmb = lambda total_days: xsmb(total_days, end, seed)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=float, default=10, help="Số năm lịch sử")
+    parser.add_argument("--regions", nargs="+", choices=["mb", "mn", "mt"], default=["mb", "mn", "mt"])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    num_days = int(args.years * 365)
+    for alias in args.regions:
+        region = analysis.REGION_ALIASES[alias]
+        t0 = time.perf_counter()
+        if region == "Miền Bắc":
+            columns = master_data(num_days, seed=args.seed)
+            records = len(columns)
+        else:
+            data = {s: station_draws(s, draws_in(s, num_days), seed=args.seed)
+                    for s in data_fetcher.get_all_stations_in_region(region)}
+            records, columns = sum(len(d) for d in data.values()), draw_columns.from_station_records(data)
+        elapsed = time.perf_counter() - t0
+        print(f"{region}: {records} draws in {elapsed:.2f}s, columnar {columns.nbytes / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()